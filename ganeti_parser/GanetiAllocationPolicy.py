@@ -1,5 +1,5 @@
 #!/usr/bin/python3
-from typing import List
+from typing import List, Tuple
 
 class GanetiAllocationPolicy:
 
@@ -16,4 +16,9 @@ class GanetiAllocationPolicy:
         self.min_max_ispec = min_max_ispec
         self.disk_templates = disk_templates
         self.vcpu_ratio = vcpu_ratio
-        self.spindle_ratio = spindle_ratio
\ No newline at end of file
+        self.spindle_ratio = spindle_ratio
+
+    # standard instance spec of the policy as (memory, vCPUs, disk, spindles), the disk size is per disk
+    def get_standard_ispec(self) -> Tuple[int, int, int, int]:
+        memory_size, cpu_count, disk_size, disk_count, nic_count, spindle_use = [int(value) for value in self.ispec.split(",")]
+        return (memory_size, cpu_count, disk_size * disk_count, spindle_use)
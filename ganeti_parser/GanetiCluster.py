@@ -1,390 +1,918 @@
 #!/usr/bin/python3
-from typing import List, Tuple
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Set, Tuple
 
 from tabulate import tabulate
 
 from ganeti_parser.GanetiNodeGroup import GanetiNodeGroup
 from ganeti_parser.GanetiNode import GanetiNode
-from ganeti_parser.GanetiInstance import GanetiInstance
+from ganeti_parser.GanetiInstance import GanetiInstance, EXCLUSIVE_STORAGE_DISK_TEMPLATES, SHARED_DISK_TEMPLATES
 from ganeti_parser.GanetiAllocationPolicy import GanetiAllocationPolicy
+from ganeti_parser.GanetiNodeLedger import GanetiNodeLedger
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.GanetiEvacuationError import GanetiEvacuationError
+from ganeti_parser.GanetiProfiler import GanetiProfiler
+from ganeti_parser.placement import FirstFitPlacement, PlacementStrategy
+from ganeti_parser.evacuation import plan_evacuation
 
-class GanetiCluster:
-    node_groups: List[GanetiNodeGroup] = []
-    nodes: List[GanetiNode] = []
-    instances: List[GanetiInstance] = []
-    policies: List[GanetiAllocationPolicy] = []
-    allocation_tag: str = None
+# NumPy is optional, it is only used to speed up the Fail-N-1 calculation of large clusters. It is imported on
+# first use only, importing it takes longer than most runs which never get there.
+_numpy = False
+
+
+def _import_numpy():
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = None
+    return _numpy
+
+
+# insert an item into a list at the given position (appended without one)
+def _insert_at(items: list, position: int, item):
+    if position is None:
+        items.append(item)
+    else:
+        items.insert(position, item)
+
+
+# remove an item from a list, returns its former position
+def _remove_from(items: list, item) -> int:
+    position = items.index(item)
+    del items[position]
+    return position
 
-    def __init__(self, allocation_tag: str = None):
-        self.allocation_tag = allocation_tag
+
+class GanetiCluster:
+    node_groups: List[GanetiNodeGroup]
+    nodes: List[GanetiNode]
+    instances: List[GanetiInstance]
+    policies: List[GanetiAllocationPolicy]
+    # cluster tags and the prefixes of exclusion tags (instances sharing an exclusion tag must not share a primary node)
+    tags: List[str]
+    allocation_tags: List[str]
+    _exclusion_prefixes: Tuple[str, ...]
+    reporter: GanetiReporter
+    profiler: GanetiProfiler
+    placement: PlacementStrategy
+    evacuation_order: str
+    keep_redundancy: bool
+    ledger: Dict[str, GanetiNodeLedger]
+    # lookup indexes, kept in sync by the add_* methods, remove_node() and _set_instance_nodes()
+    nodes_by_name: Dict[str, GanetiNode]
+    node_groups_by_uuid: Dict[str, GanetiNodeGroup]
+    nodes_by_group: Dict[str, List[GanetiNode]]
+    policies_by_owner: Dict[str, GanetiAllocationPolicy]
+    instances_by_pnode: Dict[str, List[GanetiInstance]]
+    instances_by_snode: Dict[str, List[GanetiInstance]]
+    # number of primary instances per node (by name) carrying a tag (by tag)
+    tags_by_node: Dict[str, Dict[str, int]]
+    # nodes of a node group (by uuid) which may hold instances of a disk template, built on first use and
+    # dropped whenever nodes or policies are added or removed
+    _eligible_nodes: Dict[Tuple[str, str], List[GanetiNode]]
+    # position of every instance (by name) in the cluster state file
+    _instance_positions: Dict[str, int]
+    # names of the nodes which are currently being drained (never used as a target for instances)
+    _draining: Set[str]
+    # undo journal of all changes made since the outermost begin() and the journal positions of all open transactions
+    _journal: List[Tuple]
+    _savepoints: List[int]
+
+    def __init__(self, allocation_tags: List[str] = None, reporter: GanetiReporter = None, placement: PlacementStrategy = None, evacuation_order: str = "file", profiler: GanetiProfiler = None):
+        self.node_groups = []
+        self.nodes = []
+        self.instances = []
+        self.policies = []
+        self.tags = []
+        self.set_allocation_tags(allocation_tags if allocation_tags else [])
+        self.reporter = reporter if reporter else GanetiReporter()
+        self.profiler = profiler
+        self.placement = placement if placement else FirstFitPlacement()
+        self.evacuation_order = evacuation_order
+        # only place instances where every single node failure can still be survived (N+1), like Ganeti's allocator
+        self.keep_redundancy = False
+        self.ledger = {}
+        self.nodes_by_name = {}
+        self.node_groups_by_uuid = {}
+        self.nodes_by_group = {}
+        self.policies_by_owner = {}
+        self.instances_by_pnode = {}
+        self.instances_by_snode = {}
+        self.tags_by_node = {}
+        self._eligible_nodes = {}
+        self._instance_positions = {}
+        self._draining = set()
+        self._journal = []
+        self._savepoints = []
+        # without a profiler the hot methods are not wrapped at all
+        if profiler:
+            profiler.instrument(self)
+
+    # retrieve the resource ledger of a given node name (created on first use)
+    def _get_ledger(self, node_name: str) -> GanetiNodeLedger:
+        ledger = self.ledger.get(node_name)
+        if ledger is None:
+            ledger = GanetiNodeLedger()
+            self.ledger[node_name] = ledger
+        return ledger
+
+    # account for the resources of a GanetiInstance on its current primary/secondary nodes
+    def _ledger_add_instance(self, instance: GanetiInstance):
+        if instance.pnode:
+            self._get_ledger(instance.pnode).add_primary(instance)
+            self.placement.node_changed(instance.pnode)
+        if instance.snodes:
+            self._get_ledger(instance.snodes).add_secondary(instance)
+            self.placement.node_changed(instance.snodes)
+
+    # release the resources of a GanetiInstance from its current primary/secondary nodes
+    def _ledger_remove_instance(self, instance: GanetiInstance):
+        if instance.pnode:
+            self._get_ledger(instance.pnode).remove_primary(instance)
+            self.placement.node_changed(instance.pnode)
+        if instance.snodes:
+            self._get_ledger(instance.snodes).remove_secondary(instance)
+            self.placement.node_changed(instance.snodes)
+
+    # register a GanetiInstance in the pnode/snode and tag indexes (at the given positions when undoing a move)
+    def _index_instance(self, instance: GanetiInstance, positions: Tuple[int, int] = (None, None)):
+        pnode_position, snode_position = positions
+        _insert_at(self.instances_by_pnode.setdefault(instance.pnode, []), pnode_position, instance)
+        if instance.snodes:
+            _insert_at(self.instances_by_snode.setdefault(instance.snodes, []), snode_position, instance)
+        # all tags are counted, so the exclusion tag prefixes can still change after the instances have been added
+        node_tags = self.tags_by_node.setdefault(instance.pnode, {})
+        for tag in instance.tags:
+            if tag:
+                node_tags[tag] = node_tags.get(tag, 0) + 1
+
+    # drop a GanetiInstance from the pnode/snode and tag indexes, returns its former positions
+    def _unindex_instance(self, instance: GanetiInstance) -> Tuple[int, int]:
+        pnode_position = _remove_from(self.instances_by_pnode[instance.pnode], instance)
+        snode_position = None
+        if instance.snodes:
+            snode_position = _remove_from(self.instances_by_snode[instance.snodes], instance)
+        node_tags = self.tags_by_node[instance.pnode]
+        for tag in instance.tags:
+            if tag:
+                if node_tags[tag] == 1:
+                    del node_tags[tag]
+                else:
+                    node_tags[tag] -= 1
+        return (pnode_position, snode_position)
+
+    # move a GanetiInstance to new primary/secondary nodes while keeping the resource ledger and indexes in sync
+    def _set_instance_nodes(self, instance: GanetiInstance, pnode: str, snodes: str):
+        old_pnode, old_snodes = instance.pnode, instance.snodes
+        positions = self._apply_instance_nodes(instance, pnode, snodes)
+        self._record("move_instance", instance, old_pnode, old_snodes, positions)
+
+    # (returns the former positions of the instance in the pnode/snode indexes)
+    def _apply_instance_nodes(
+        self, instance: GanetiInstance, pnode: str, snodes: str, positions: Tuple[int, int] = (None, None)
+    ) -> Tuple[int, int]:
+        self._ledger_remove_instance(instance)
+        old_positions = self._unindex_instance(instance)
+        instance.pnode = pnode
+        instance.snodes = snodes
+        self._ledger_add_instance(instance)
+        self._index_instance(instance, positions)
+        return old_positions
+
+    # add a GanetiNode to the node list and indexes (at the given positions when restoring a removed node)
+    def _register_node(self, node: GanetiNode, position: int = None, group_position: int = None):
+        group_nodes = self.nodes_by_group.setdefault(node.group_uuid, [])
+        if position is None:
+            self.nodes.append(node)
+            group_nodes.append(node)
+        else:
+            self.nodes.insert(position, node)
+            group_nodes.insert(group_position, node)
+        self.nodes_by_name.setdefault(node.name, node)
+        self.nodes_by_name.setdefault(node.shortname, node)
+        self._eligible_nodes.clear()
+        self.placement.reset()
+
+    # drop a GanetiNode from the node list and indexes, returns its former positions
+    def _unregister_node(self, node: GanetiNode) -> Tuple[int, int]:
+        position = self.nodes.index(node)
+        group_nodes = self.nodes_by_group[node.group_uuid]
+        group_position = group_nodes.index(node)
+        del self.nodes[position]
+        del group_nodes[group_position]
+        for key in (node.name, node.shortname):
+            if self.nodes_by_name.get(key) is node:
+                del self.nodes_by_name[key]
+        self._eligible_nodes.clear()
+        self.placement.reset()
+        return (position, group_position)
+
+    # add a GanetiInstance to the instance list, resource ledger and indexes
+    def _register_instance(self, instance: GanetiInstance):
+        self._instance_positions[instance.name] = len(self.instances)
+        self.instances.append(instance)
+        self._ledger_add_instance(instance)
+        self._index_instance(instance)
+
+    def _unregister_instance(self, instance: GanetiInstance):
+        del self._instance_positions[instance.name]
+        # rollbacks remove added instances in reverse order, so this is usually the last one
+        if self.instances and self.instances[-1] is instance:
+            self.instances.pop()
+        else:
+            self.instances.remove(instance)
+        self._ledger_remove_instance(instance)
+        self._unindex_instance(instance)
+
+    # remember how to undo a change (only while a transaction is open)
+    def _record(self, *change):
+        if self._savepoints:
+            self._journal.append(change)
+
+    def _undo(self, change: Tuple):
+        kind = change[0]
+        if kind == "move_instance":
+            _, instance, pnode, snodes, positions = change
+            self._apply_instance_nodes(instance, pnode, snodes, positions)
+        elif kind == "remove_node":
+            _, node, position, group_position = change
+            self._register_node(node, position, group_position)
+        elif kind == "add_node":
+            self._unregister_node(change[1])
+        elif kind == "add_instance":
+            self._unregister_instance(change[1])
+        elif kind == "update_policy":
+            _, policy, vcpu_ratio, spindle_ratio = change
+            policy.vcpu_ratio = vcpu_ratio
+            policy.spindle_ratio = spindle_ratio
+            self.placement.reset()
 
     # retrieve a GanetiNodeGroup object the given GanetiInstance object belongs to
     def _get_node_group_from_instance(self, instance: GanetiInstance) -> GanetiNodeGroup:
-        group_uuid = None
-        for node in self.nodes:
-            if node.name == instance.pnode:
-                group_uuid = node.group_uuid
-        for node_group in self.node_groups:
-            if node_group.uuid == group_uuid:
-                return node_group
+        node = self.nodes_by_name.get(instance.pnode)
+        if node:
+            return self.node_groups_by_uuid.get(node.group_uuid)
+        return None
 
     # retrieve all memory occupied by primary instances on a given GanetiNode
     def _get_node_used_memory(self, node: GanetiNode) -> int:
-        memory_used = 0
-        for instance in self.instances:
-            if instance.pnode == node.name:
-                memory_used += instance.memory_size
-        return memory_used
+        return self._get_ledger(node.name).primary_memory
 
     # retrieve all disk space occupied by primary and secondary instances on a given GanetiNode
     def _get_node_used_disk(self, node: GanetiNode) -> int:
-        disk_used = 0
-        for instance in self.instances:
-            if instance.pnode == node.name or instance.snodes == node.name:
-                disk_used += instance.disk_size
-        return disk_used
+        return self._get_ledger(node.name).used_disk()
+
+    # capacity of a given GanetiNode as seen by the capacity checks (memory, disk, vCPUs, spindles)
+    def _get_node_capacity(self, node: GanetiNode) -> Tuple[float, float, float, float]:
+        return (
+            node.total_memory,
+            node.total_disk,
+            node.total_cpus * self._get_cpu_ratio_by_node(node),
+            node.spindles * self._get_spindle_ratio_by_node(node)
+        )
+
+    # resources in use on a given GanetiNode as seen by the capacity checks (memory, disk, vCPUs, spindles)
+    def _get_node_usage(self, node: GanetiNode) -> Tuple[int, int, int, int]:
+        ledger = self._get_ledger(node.name)
+        return (ledger.primary_memory, ledger.used_disk(), ledger.used_vcpus(), ledger.used_spindles())
+
+    # utilization of a given GanetiNode and the additional utilization the given GanetiInstance would cause
+    # on it as a new primary/secondary (both as fractions of the node's capacity)
+    def _get_node_utilization(self, node: GanetiNode, instance: GanetiInstance, primary: bool) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+        capacity = self._get_node_capacity(node)
+        usage = self._get_node_usage(node)
+        # memory is only accounted for on the primary node
+        demand = (instance.memory_size if primary else 0, instance.local_disk_size(), instance.vcpus, instance.spindles)
+        return (
+            tuple(used / total if total > 0 else 1.0 for used, total in zip(usage, capacity)),
+            tuple(needed / total if total > 0 else 0.0 for needed, total in zip(demand, capacity))
+        )
 
     # determine if a given GanetiNode has enough unallocated memory to run the given GanetiInstance
     def _node_has_enough_memory(self, node: GanetiNode, new_instance: GanetiInstance) -> bool:
         memory_used = self._get_node_used_memory(node)
         if memory_used + new_instance.memory_size > node.total_memory:
-            print("  {}*** Not enough memory for {} on {} ({}MB already used on node, {}MB total available){}".format(
-                "\033[91m", new_instance.name, node.name, memory_used, node.total_memory, "\033[0m"
-            ))
+            self.reporter.trace(
+                "memory_check", "  *** Not enough memory for {instance} on {node} ({used}MB already used on node, {total}MB total available)",
+                GanetiReporter.RED, instance=new_instance.name, node=node.name, used=memory_used, total=node.total_memory, ok=False
+            )
             return False
-        print("  {}*** {} has enough memory left ({}MB already used on node, {}MB total available){}".format(
-            "\033[92m", node.name, memory_used, node.total_memory, "\033[0m"
-        ))
+        self.reporter.trace(
+            "memory_check", "  *** {node} has enough memory left ({used}MB already used on node, {total}MB total available)",
+            GanetiReporter.GREEN, instance=new_instance.name, node=node.name, used=memory_used, total=node.total_memory, ok=True
+        )
         return True
 
     # determine if a given GanetiNode has enough unallocated disk space to run the given GanetiInstance
     def _node_has_enough_disk(self, node: GanetiNode, new_instance: GanetiInstance) -> bool:
         disk_used = self._get_node_used_disk(node)
-        if disk_used + new_instance.disk_size > node.total_disk:
-            print("  {}*** Not enough disk for {} on {} ({}MB already used on node, {}MB total available){}".format(
-                "\033[91m", new_instance.name, node.name, disk_used, node.total_disk, "\033[0m"
-            ))
+        if disk_used + new_instance.local_disk_size() > node.total_disk:
+            self.reporter.trace(
+                "disk_check", "  *** Not enough disk for {instance} on {node} ({used}MB already used on node, {total}MB total available)",
+                GanetiReporter.RED, instance=new_instance.name, node=node.name, used=disk_used, total=node.total_disk, ok=False
+            )
             return False
-        print("  {}*** {} has enough disk left ({}MB already used on node, {}MB total available){}".format(
-            "\033[92m", node.name, disk_used, node.total_disk, "\033[0m"
-        ))
+        self.reporter.trace(
+            "disk_check", "  *** {node} has enough disk left ({used}MB already used on node, {total}MB total available)",
+            GanetiReporter.GREEN, instance=new_instance.name, node=node.name, used=disk_used, total=node.total_disk, ok=True
+        )
         return True
 
     # get the CPU ratio for a given GanetiNode
     def _get_cpu_ratio_by_node(self, node: GanetiNode) -> float:
         vcpu_ratio = 0.0
 
-        for group in self.node_groups:
-            if group.uuid == node.group_uuid:
-                for policy in self.policies:
-                    if policy.owner == group.name:
-                        return policy.vcpu_ratio
+        group = self.node_groups_by_uuid.get(node.group_uuid)
+        if group:
+            policy = self.policies_by_owner.get(group.name)
+            if policy:
+                return policy.vcpu_ratio
         return vcpu_ratio
 
     # determine if a given GanetiNode has enough unallocated vCPUs to run the given GanetiInstance
     def _node_has_enough_cpus(self, node: GanetiNode, new_instance: GanetiInstance) -> bool:
-        cpus_used = 0
+        cpus_used = self._get_ledger(node.name).used_vcpus()
         vcpu_ratio = self._get_cpu_ratio_by_node(node)
-        for instance in self.instances:
-            if instance.pnode == node.name or instance.snodes == node.name:
-                cpus_used += instance.vcpus
         if cpus_used + new_instance.vcpus > ( node.total_cpus * vcpu_ratio ):
-            print("  {}*** Not enough CPUs for {} on {} ({} already used on node, {} total available){}".format(
-                "\033[91m", new_instance.name, node.name, cpus_used, node.total_cpus * vcpu_ratio, "\033[0m"
-            ))
+            self.reporter.trace(
+                "cpus_check", "  *** Not enough CPUs for {instance} on {node} ({used} already used on node, {total} total available)",
+                GanetiReporter.RED, instance=new_instance.name, node=node.name, used=cpus_used, total=node.total_cpus * vcpu_ratio, ok=False
+            )
             return False
-        print("  {}*** {} has enough CPUs left ({} already used on node, {} total available){}".format(
-            "\033[92m", node.name, cpus_used, node.total_cpus * vcpu_ratio, "\033[0m"
-        ))
+        self.reporter.trace(
+            "cpus_check", "  *** {node} has enough CPUs left ({used} already used on node, {total} total available)",
+            GanetiReporter.GREEN, instance=new_instance.name, node=node.name, used=cpus_used, total=node.total_cpus * vcpu_ratio, ok=True
+        )
         return True
     
     # get the spindle ratio for a given GanetiNode
     def _get_spindle_ratio_by_node(self, node: GanetiNode) -> float:
         spindle_ratio = 0.0
-
-        for group in self.node_groups:
-            if group.uuid == node.group_uuid:
-                for policy in self.policies:
-                    if policy.owner == group.name:
-                        return policy.spindle_ratio
+        # with exclusive storage every spindle belongs to the disks of a single instance, it can not be over-subscribed
+        if node.exclusive_storage == "Y":
+            return 1.0
+
+        group = self.node_groups_by_uuid.get(node.group_uuid)
+        if group:
+            policy = self.policies_by_owner.get(group.name)
+            if policy:
+                return policy.spindle_ratio
         return spindle_ratio
 
     # determine if a given GanetiNode has enough unallocated spindles to run the given GanetiInstance
     def _node_has_enough_spindles(self, node: GanetiNode, new_instance: GanetiInstance) -> bool:
-        spindles_used = 0
+        spindles_used = self._get_ledger(node.name).used_spindles()
         spindle_ratio = self._get_spindle_ratio_by_node(node)
-        for instance in self.instances:
-            if instance.pnode == node.name or instance.snodes == node.name:
-                spindles_used += instance.spindles
         if spindles_used + new_instance.spindles > ( node.spindles * spindle_ratio ):
-            print("  {}*** Not enough spindles for {} on {} ({} already used on node, {} total available){}".format(
-                "\033[91m", new_instance.name, node.name, spindles_used, node.spindles * spindle_ratio, "\033[0m"
-            ))
+            self.reporter.trace(
+                "spindles_check", "  *** Not enough spindles for {instance} on {node} ({used} already used on node, {total} total available)",
+                GanetiReporter.RED, instance=new_instance.name, node=node.name, used=spindles_used, total=node.spindles * spindle_ratio, ok=False
+            )
             return False
-        print("  {}*** {} has enough spindles left ({} already used on node, {} total available){}".format(
-            "\033[92m", node.name, spindles_used, node.spindles * spindle_ratio, "\033[0m"
-        ))
+        self.reporter.trace(
+            "spindles_check", "  *** {node} has enough spindles left ({used} already used on node, {total} total available)",
+            GanetiReporter.GREEN, instance=new_instance.name, node=node.name, used=spindles_used, total=node.spindles * spindle_ratio, ok=True
+        )
         return True
 
     # determine if a given GanetiNode already holds a primary instance with the given instance tag
     def _is_this_instance_tag_already_on_this_node(self, tag: str, node: GanetiNode) -> bool:
-        for instance in self.instances:
-            if instance.pnode == node.name and tag in instance.tags:
-                print("  {}*** Tag {} already present on primary instance on {}".format(
-                    "\033[91m", tag, node.name, "\033[0m"
-                ))
-                return True
+        if self.tags_by_node.get(node.name, {}).get(tag):
+            self.reporter.trace(
+                "tag_check", "  *** Tag {tag} already present on primary instance on {node}",
+                GanetiReporter.RED, tag=tag, node=node.name, ok=False
+            )
+            return True
         return False
 
-    # determine if allocation tags need to be checked (is it set on the cluster? is it set on the instance?)
+    # determine if allocation tags need to be checked (are exclusion tag prefixes set on the cluster? is one of them set on the instance?)
     def _node_has_no_conflicting_migration_tags(self, node: GanetiNode, new_instance: GanetiInstance) -> bool:
-        if not self.allocation_tag:
+        if not self._exclusion_prefixes:
             return True
 
         for tag in new_instance.tags:
-            if tag.startswith("{}:".format(self.allocation_tag)):
-                return not self._is_this_instance_tag_already_on_this_node(tag, node)
-        else:
+            if tag.startswith(self._exclusion_prefixes) and self._is_this_instance_tag_already_on_this_node(tag, node):
+                return False
+        return True
+
+
+    # determine if a given GanetiNode can still take over the instances of any single failing node (N+1) after becoming the
+    # primary of the given GanetiInstance (pnode_name is None) or its secondary for the given primary node
+    def _node_keeps_redundancy(self, node: GanetiNode, instance: GanetiInstance, pnode_name: str = None) -> bool:
+        ledger = self._get_ledger(node.name)
+        memory_capacity, _, cpu_capacity, spindle_capacity = self._get_node_capacity(node)
+        load = [ledger.primary_memory, ledger.primary_vcpus, ledger.primary_spindles]
+        demand = (instance.memory_size, instance.vcpus, instance.spindles)
+        failovers = (ledger.failover_memory, ledger.failover_vcpus, ledger.failover_spindles)
+        for resource, failover in enumerate(failovers):
+            if pnode_name is None:
+                # the instance runs on this node in any case, the worst single failure stays the same
+                load[resource] += demand[resource] + max(failover.values(), default=0)
+            else:
+                load[resource] += failover.get(pnode_name, 0) + demand[resource]
+        if any(used > capacity for used, capacity in zip(load, (memory_capacity, cpu_capacity, spindle_capacity))):
+            self.reporter.trace(
+                "redundancy_check", "  *** {node} could not survive a node failure with {instance}", GanetiReporter.RED,
+                instance=instance.name, node=node.name, ok=False
+            )
+            return False
+        return True
+
+    # N+1 checks of a new primary node: the node itself and (unless it gets a new secondary as well) the instance's
+    # current secondary node if the new primary fails
+    def _primary_keeps_redundancy(self, node: GanetiNode, instance: GanetiInstance, keep_secondary: bool = True) -> bool:
+        if not self._node_keeps_redundancy(node, instance):
+            return False
+        return not keep_secondary or not instance.snodes or \
+            self._node_keeps_redundancy(self.get_node_by_name(instance.snodes), instance, node.name)
+
+    # determine if a given GanetiNode passes all checks to become the new primary of the given GanetiInstance (with its
+    # current secondary node unless keep_secondary is False)
+    def _node_accepts_primary(self, node: GanetiNode, instance: GanetiInstance, keep_secondary: bool = True) -> bool:
+        return self._node_has_enough_memory(node, instance) and \
+            self._node_has_enough_disk(node, instance) and \
+            self._node_has_enough_cpus(node, instance) and \
+            self._node_has_enough_spindles(node, instance) and \
+            self._node_has_no_conflicting_migration_tags(node, instance) and \
+            (not self.keep_redundancy or self._primary_keeps_redundancy(node, instance, keep_secondary))
+
+    # determine if a given GanetiNode passes all checks to become the new secondary of the given GanetiInstance
+    def _node_accepts_secondary(self, node: GanetiNode, instance: GanetiInstance) -> bool:
+        return self._node_has_enough_memory(node, instance) and \
+            self._node_has_enough_disk(node, instance) and \
+            self._node_has_enough_cpus(node, instance) and \
+            self._node_has_enough_spindles(node, instance) and \
+            (not self.keep_redundancy or self._node_keeps_redundancy(node, instance, instance.pnode))
+
+    # determine if the allocation policy of a node group allows instances of the given disk template (an empty
+    # list of disk templates allows all of them)
+    def _group_allows_disk_template(self, node_group: GanetiNodeGroup, disk_template: str) -> bool:
+        policy = self.policies_by_owner.get(node_group.name, self.policies_by_owner.get(""))
+        if not policy or not any(policy.disk_templates):
             return True
-            
-    # go through all nodes and find one that is able to accept the given GanetiInstance as a new primary
+        return disk_template in policy.disk_templates
+
+    # determine if the storage of a given GanetiNode can hold disks of the given disk template
+    def _node_supports_disk_template(self, node: GanetiNode, disk_template: str) -> bool:
+        return node.exclusive_storage != "Y" or disk_template in EXCLUSIVE_STORAGE_DISK_TEMPLATES
+
+    # all nodes of a node group (in node group order) which may hold instances of the given disk template, the
+    # candidate searches only run their checks on these (the list is shared, do not modify it)
+    def _get_eligible_nodes(self, node_group: GanetiNodeGroup, disk_template: str) -> List[GanetiNode]:
+        key = (node_group.uuid, disk_template)
+        nodes = self._eligible_nodes.get(key)
+        if nodes is None:
+            if self._group_allows_disk_template(node_group, disk_template):
+                nodes = [node for node in self.nodes_by_group.get(node_group.uuid, []) if self._node_supports_disk_template(node, disk_template)]
+            else:
+                nodes = []
+            self._eligible_nodes[key] = nodes
+        return nodes
+
+    # go through all nodes (in the order preferred by the placement strategy) and find one that is able to accept the given GanetiInstance as a new primary
     def _find_new_primary_for_instance(self, instance: GanetiInstance, illegal_nodes: List[GanetiNode]) -> GanetiNode:
         node_group = self._get_node_group_from_instance(instance)
-        nodes = self.get_nodes_by_group(node_group)
-        for node in nodes:
-            if node not in illegal_nodes and \
-                self._node_has_enough_memory(node, instance) and \
-                self._node_has_enough_disk(node, instance) and \
-                self._node_has_enough_cpus(node, instance) and \
-                self._node_has_enough_spindles(node, instance) and \
-                self._node_has_no_conflicting_migration_tags(node, instance):
+        excluded = {node.name for node in illegal_nodes}
+        for node in self.placement.candidates(self, node_group, instance, True, excluded):
+            if self._node_accepts_primary(node, instance):
                 return node
         return None
 
-    # go through all nodes and find one that is able to accept the given GanetiInstance as a new secondary
+    # go through all nodes (in the order preferred by the placement strategy) and find one that is able to accept the given GanetiInstance as a new secondary
     def _find_new_secondary_for_instance(self, instance: GanetiInstance, illegal_nodes: List[GanetiNode]) -> GanetiNode:
         node_group = self._get_node_group_from_instance(instance)
-        nodes = self.get_nodes_by_group(node_group)
-        for node in nodes:
-            if node not in illegal_nodes and \
-                self._node_has_enough_memory(node, instance) and \
-                self._node_has_enough_disk(node, instance) and \
-                self._node_has_enough_cpus(node, instance) and \
-                self._node_has_enough_spindles(node, instance):
+        excluded = {node.name for node in illegal_nodes}
+        for node in self.placement.candidates(self, node_group, instance, False, excluded):
+            if self._node_accepts_secondary(node, instance):
                 return node
         return None
 
+    # go through all nodes (in the order preferred by the placement strategy) and find a new primary together with a new
+    # secondary for the given GanetiInstance, for when N+1 redundancy can not be kept with its current secondary node
+    # (e.g. because that node can already not survive a node failure)
+    def _find_new_nodes_for_instance(self, instance: GanetiInstance, illegal_nodes: List[GanetiNode]) -> Tuple[GanetiNode, GanetiNode]:
+        node_group = self._get_node_group_from_instance(instance)
+        excluded = {node.name for node in illegal_nodes}
+        old_pnode = instance.pnode
+        for node in self.placement.candidates(self, node_group, instance, True, excluded):
+            if not self._node_accepts_primary(node, instance, keep_secondary=False):
+                continue
+            # the secondary checks look at the load the secondary takes over when the (new) primary fails
+            instance.pnode = node.name
+            try:
+                new_secondary = self._find_new_secondary_for_instance(instance, illegal_nodes + [node])
+            finally:
+                instance.pnode = old_pnode
+            if new_secondary:
+                return (node, new_secondary)
+        return None
+
     # swap primary/secondary *if* there is enough capacity on the secondary
     def _failover_instance(self, instance: GanetiInstance) -> bool:
         old_primary = instance.pnode
         old_secondary = instance.snodes
-        instance.pnode = old_secondary
-        instance.snodes = old_primary
+        self._set_instance_nodes(instance, old_secondary, old_primary)
 
         new_primary = self.get_node_by_name(instance.pnode)
         memory_used = self._get_node_used_memory(new_primary)
         if memory_used > new_primary.total_memory:
-            instance.pnode = old_primary
-            instance.snodes = old_secondary
-            print("  {}*** Instance failover failed (not enough resources on target){}".format(
-                "\033[91m","\033[0m"
-            ))
+            self._set_instance_nodes(instance, old_primary, old_secondary)
+            self.reporter.decision(
+                "failover", "  *** Instance failover failed (not enough resources on target)",
+                GanetiReporter.RED, instance=instance.name, node=old_secondary, ok=False
+            )
             return False
 
-        print("  {}*** Instance failover performed{}".format(
-            "\033[93m","\033[0m"
-        ))
+        self.reporter.decision(
+            "failover", "  *** Instance failover performed",
+            GanetiReporter.YELLOW, instance=instance.name, node=instance.pnode, ok=True
+        )
         return True
 
-    # try to move a given GanetiInstance away from the given node
-    def _evacuate_instance(self, node_name: str, instance: GanetiInstance):
+    # try to move a given GanetiInstance away from the given node (returns True if a failover was necessary)
+    # instances without a secondary node (non-mirrored and shared storage disk templates) can only get a new primary
+    # node: plain and file disks are copied there, shared storage is reachable from every node of the node group
+    def _evacuate_instance(self, node_name: str, instance: GanetiInstance) -> bool:
         pnode = self.get_node_by_name(instance.pnode)
-        snode = self.get_node_by_name(instance.snodes)
+        illegal_nodes = [pnode, self.get_node_by_name(instance.snodes)] if instance.snodes else [pnode]
         if instance.pnode == node_name:
-            print("** Looking for a new primary node for {} (CPU: {}, Memory: {}MB, Disk: {}MB)".format(instance.name, instance.vcpus, instance.memory_size, instance.disk_size))
-            new_node = self._find_new_primary_for_instance(instance, [pnode, snode])
+            self.reporter.decision(
+                "search_primary", "** Looking for a new primary node for {instance} (CPU: {vcpus}, Memory: {memory}MB, Disk: {disk}MB)",
+                instance=instance.name, vcpus=instance.vcpus, memory=instance.memory_size, disk=instance.disk_size
+            )
+            new_node = self._find_new_primary_for_instance(instance, illegal_nodes)
+            new_nodes = None
+            if not new_node and self.keep_redundancy and instance.snodes:
+                new_nodes = self._find_new_nodes_for_instance(instance, illegal_nodes)
             if new_node:
-                instance.pnode = new_node.name
+                self._set_instance_nodes(instance, new_node.name, instance.snodes)
+            elif new_nodes:
+                self.reporter.decision(
+                    "search_primary", "  *** Moving {instance} to a new primary and secondary node to keep N+1 redundancy",
+                    GanetiReporter.YELLOW, instance=instance.name, node=new_nodes[0].name, ok=True
+                )
+                self._set_instance_nodes(instance, new_nodes[0].name, new_nodes[1].name)
             else:
-                if not self._failover_instance(instance):
-                    raise Exception("Unable to find new primary node for {}".format(instance.name))
+                # failing over onto a node which is drained as well would not help
+                if not instance.snodes or instance.snodes in self._draining or not self._failover_instance(instance):
+                    raise GanetiEvacuationError("Unable to find new primary node for {}".format(instance.name), instance.name)
+                return True
         elif instance.snodes == node_name:
-            print("** Looking for a new secondary node for {} (CPU: {}, Memory: {}MB, Disk: {}MB)".format(instance.name, instance.vcpus, instance.memory_size, instance.disk_size))
-            new_node = self._find_new_secondary_for_instance(instance, [pnode, snode])
+            self.reporter.decision(
+                "search_secondary", "** Looking for a new secondary node for {instance} (CPU: {vcpus}, Memory: {memory}MB, Disk: {disk}MB)",
+                instance=instance.name, vcpus=instance.vcpus, memory=instance.memory_size, disk=instance.disk_size
+            )
+            new_node = self._find_new_secondary_for_instance(instance, illegal_nodes)
             if new_node:
-                instance.snodes = new_node.name
+                self._set_instance_nodes(instance, instance.pnode, new_node.name)
             else:
-                raise Exception("Unable to find new secondary node for {}".format(instance.name))
+                raise GanetiEvacuationError("Unable to find new secondary node for {}".format(instance.name), instance.name)
+        return False
 
     def _count_primary_instances(self, node: GanetiNode) -> int:
-        counter = 0
-        for instance in self.instances:
-            if instance.pnode == node.name:
-                counter += 1
-        return counter
+        return self._get_ledger(node.name).primary_instances
 
     def _count_secondary_instances(self, node: GanetiNode) -> int:
-        counter = 0
-        for instance in self.instances:
-            if instance.snodes == node.name:
-                counter += 1
-        return counter
+        return self._get_ledger(node.name).secondary_instances
 
     def _get_memory_used_percentage(self, node: GanetiNode) -> int:
-        memory_sum = 0
-        for instance in self.instances:
-            if instance.pnode == node.name:
-                memory_sum += instance.memory_size
-
+        memory_sum = self._get_ledger(node.name).primary_memory
         return int(memory_sum / node.total_memory * 100)
 
     def _get_disk_used_percentage(self, node: GanetiNode) -> int:
-        disk_sum = 0
-        for instance in self.instances:
-            if instance.pnode == node.name or instance.snodes == node.name:
-                disk_sum += instance.disk_size
+        disk_sum = self._get_ledger(node.name).used_disk()
         return int(disk_sum / node.total_disk * 100)
 
     def _get_cpu_used_percentage(self, node: GanetiNode) -> int:
-        cpu_sum = 0
+        cpu_sum = self._get_ledger(node.name).primary_vcpus
         vcpu_ratio = self._get_cpu_ratio_by_node(node)
         allowed_virtual_cpus = node.total_cpus * vcpu_ratio
-        for instance in self.instances:
-            if instance.pnode == node.name:
-                cpu_sum += instance.vcpus
         return int(cpu_sum / allowed_virtual_cpus * 100)
 
     def _get_spindles_used_percentage(self, node: GanetiNode) -> int:
-        spindles_sum = 0
+        spindles_sum = self._get_ledger(node.name).primary_spindles
         spindles_ratio = self._get_spindle_ratio_by_node(node)
         allowed_spindles = node.spindles * spindles_ratio
-        for instance in self.instances:
-            if instance.pnode == node.name:
-                spindles_sum += instance.spindles
         return int(spindles_sum / allowed_spindles * 100)
 
     def _get_max_failn1_memory_used_percentage(self, node: GanetiNode) -> Tuple[str, int]:
-        memory_sum = 0
+        ledger = self._get_ledger(node.name)
+        memory_sum = ledger.primary_memory
         memory_sum_by_node = {}
         for secondary_node in self.nodes:
             if secondary_node.name != node.name:
-                memory_sum_by_node[secondary_node.name] = 0
-
-        # get memory for primary and secondary instances
-        for instance in self.instances:
-            if instance.pnode == node.name:
-                memory_sum += instance.memory_size
-            elif instance.snodes == node.name:
-                memory_sum_by_node[instance.pnode] += instance.memory_size
-        
+                memory_sum_by_node[secondary_node.name] = ledger.failover_memory.get(secondary_node.name, 0)
+
         node_with_largest_memory_amount_on_nodefail = max(memory_sum_by_node, key=memory_sum_by_node.get)
         failn1_memory_sum = memory_sum + memory_sum_by_node[node_with_largest_memory_amount_on_nodefail]
 
         return (node_with_largest_memory_amount_on_nodefail, int(failn1_memory_sum / node.total_memory * 100))
     
     def _get_max_failn1_cpu_used_percentage(self, node: GanetiNode) -> Tuple[str, int]:
-        cpu_sum = 0
+        ledger = self._get_ledger(node.name)
+        cpu_sum = ledger.primary_vcpus
         cpu_sum_by_node = {}
         for secondary_node in self.nodes:
             if secondary_node.name != node.name:
-                cpu_sum_by_node[secondary_node.name] = 0
+                cpu_sum_by_node[secondary_node.name] = ledger.failover_vcpus.get(secondary_node.name, 0)
 
         vcpu_ratio = self._get_cpu_ratio_by_node(node)
         allowed_virtual_cpus = node.total_cpus * vcpu_ratio
 
-        # get CPU for primary and secondary instances
-        for instance in self.instances:
-            if instance.pnode == node.name:
-                cpu_sum += instance.vcpus
-            elif instance.snodes == node.name:
-                cpu_sum_by_node[instance.pnode] += instance.vcpus
-        
         node_with_largest_vcpu_count_on_nodefail = max(cpu_sum_by_node, key=cpu_sum_by_node.get)
         failn1_vcpu_sum = cpu_sum + cpu_sum_by_node[node_with_largest_vcpu_count_on_nodefail]
 
         return (node_with_largest_vcpu_count_on_nodefail, int(failn1_vcpu_sum / allowed_virtual_cpus * 100))
 
     def _get_max_failn1_spindles_used_percentage(self, node: GanetiNode) -> Tuple[str, int]:
-        spindles_sum = 0
+        ledger = self._get_ledger(node.name)
+        spindles_sum = ledger.primary_spindles
         spindles_sum_by_node = {}
         for secondary_node in self.nodes:
             if secondary_node.name != node.name:
-                spindles_sum_by_node[secondary_node.name] = 0
+                spindles_sum_by_node[secondary_node.name] = ledger.failover_spindles.get(secondary_node.name, 0)
 
         spindle_ratio = self._get_spindle_ratio_by_node(node)
         allowed_spindles = node.spindles * spindle_ratio
 
-        # get spindles for primary and secondary instances
-        for instance in self.instances:
-            if instance.pnode == node.name:
-                spindles_sum += instance.spindles
-            elif instance.snodes == node.name:
-                spindles_sum_by_node[instance.pnode] += instance.spindles
-        
         node_with_largest_spindle_count_on_nodefail = max(spindles_sum_by_node, key=spindles_sum_by_node.get)
         failn1_spindles_sum = spindles_sum + spindles_sum_by_node[node_with_largest_spindle_count_on_nodefail]
 
         return (node_with_largest_spindle_count_on_nodefail, int(failn1_spindles_sum / allowed_spindles * 100))
 
+    # compute the worst case Fail-N-1 usage of all nodes at once (node name -> (memory, CPU, spindles) as (by node, percentage))
+    def _get_max_failn1_used_percentages(self) -> Dict[str, Tuple[Tuple[str, int], Tuple[str, int], Tuple[str, int]]]:
+        numpy = _import_numpy() if len(self.nodes) >= 2 else None
+        if numpy is None:
+            failn1 = {}
+            for node in self.nodes:
+                failn1[node.name] = (
+                    self._get_max_failn1_memory_used_percentage(node),
+                    self._get_max_failn1_cpu_used_percentage(node),
+                    self._get_max_failn1_spindles_used_percentage(node)
+                )
+            return failn1
+
+        names = [node.name for node in self.nodes]
+        positions = {name: position for position, name in enumerate(names)}
+
+        # resources[r, s, p]: amount of resource r node s has to take over if its primary peer node p fails
+        resources = numpy.zeros((3, len(names), len(names)), dtype=numpy.int64)
+        for secondary_position, name in enumerate(names):
+            ledger = self._get_ledger(name)
+            for resource, failover in enumerate((ledger.failover_memory, ledger.failover_vcpus, ledger.failover_spindles)):
+                for pnode, amount in failover.items():
+                    primary_position = positions.get(pnode)
+                    if primary_position is not None:
+                        resources[resource, secondary_position, primary_position] = amount
+
+        # a node can not fail over to itself (argmax picks the first maximum, just like max() on the pure Python path)
+        diagonal = numpy.arange(len(names))
+        resources[:, diagonal, diagonal] = -1
+        worst_positions = resources.argmax(axis=2)
+        worst_amounts = numpy.take_along_axis(resources, worst_positions[:, :, numpy.newaxis], axis=2)[:, :, 0]
+
+        failn1 = {}
+        for position, node in enumerate(self.nodes):
+            ledger = self._get_ledger(node.name)
+            allowed_virtual_cpus = node.total_cpus * self._get_cpu_ratio_by_node(node)
+            allowed_spindles = node.spindles * self._get_spindle_ratio_by_node(node)
+            failn1_memory_sum = ledger.primary_memory + int(worst_amounts[0, position])
+            failn1_vcpu_sum = ledger.primary_vcpus + int(worst_amounts[1, position])
+            failn1_spindles_sum = ledger.primary_spindles + int(worst_amounts[2, position])
+            failn1[node.name] = (
+                (names[worst_positions[0, position]], int(failn1_memory_sum / node.total_memory * 100)),
+                (names[worst_positions[1, position]], int(failn1_vcpu_sum / allowed_virtual_cpus * 100)),
+                (names[worst_positions[2, position]], int(failn1_spindles_sum / allowed_spindles * 100))
+            )
+        return failn1
+
     # public methods
 
+    # set the prefixes of exclusion tags (e.g. "a" for instance tags like "a:webserver")
+    def set_allocation_tags(self, allocation_tags: List[str]):
+        self.allocation_tags = list(allocation_tags)
+        self._exclusion_prefixes = tuple("{}:".format(prefix) for prefix in allocation_tags)
+
     # add elements to the cluster
+    def add_cluster_tag(self, tag):
+        self.tags.append(tag)
+
     def add_node_group(self, name, uuid, policy, tags, networks):
         new_node_group = GanetiNodeGroup(name, uuid, policy, tags, networks)
         self.node_groups.append(new_node_group)
+        self.node_groups_by_uuid.setdefault(uuid, new_node_group)
 
     def add_node(self, name, total_memory, used_memory, free_memory, total_disk, free_disk, total_cpus, status, group_uuid, spindles, tags, exclusive_storage, free_spindles, node_cpus, cpu_speed):
         new_node = GanetiNode(name, total_memory, used_memory, free_memory, total_disk, free_disk, total_cpus, status, group_uuid, spindles, tags, exclusive_storage, free_spindles, node_cpus, cpu_speed)
-        self.nodes.append(new_node)
+        self._register_node(new_node)
+        self._record("add_node", new_node)
+
+    # add a new GanetiNode without instances with the given hardware (memory as reported by `hscan`, like the parser
+    # the reserved 4096MB are taken off)
+    def add_empty_node(self, name: str, node_group: GanetiNodeGroup, memory: int, disk: int, cpus: int, spindles: int = 1, tags: List[str] = None):
+        if name in self.nodes_by_name:
+            raise Exception("Node {} already exists".format(name))
+        self.add_node(
+            name, memory - 4096, 0, memory - 4096, disk, disk, cpus, "N", node_group.uuid, spindles, tags if tags else [], "N", spindles, cpus, "1.0"
+        )
 
     def add_instance(self, name, memory_size, disk_size, vcpus, status, auto_balance, pnode, snodes, disk_template, tags, spindles, total_spindles, forthcoming):
         new_instance = GanetiInstance(name, memory_size, disk_size, vcpus, status, auto_balance, pnode, snodes, disk_template, tags, spindles, total_spindles, forthcoming)
-        self.instances.append(new_instance)
+        self._register_instance(new_instance)
+        self._record("add_instance", new_instance)
 
     def add_policy(self, owner, ispec, min_max_ispec, disk_templates, vcpu_ratio, spindle_ratio):
         new_policy = GanetiAllocationPolicy(owner, ispec, min_max_ispec, disk_templates, vcpu_ratio, spindle_ratio)
         self.policies.append(new_policy)
+        self.policies_by_owner.setdefault(owner, new_policy)
+        self._eligible_nodes.clear()
+        self.placement.reset()
+
+    # change the over-subscription ratios of an allocation policy (owner is a node group name, "" for the cluster policy)
+    def update_policy(self, owner: str, vcpu_ratio: float = None, spindle_ratio: float = None):
+        policy = self.policies_by_owner.get(owner)
+        if not policy:
+            raise Exception("Policy {} not found".format(owner))
+        self._record("update_policy", policy, policy.vcpu_ratio, policy.spindle_ratio)
+        if vcpu_ratio is not None:
+            policy.vcpu_ratio = vcpu_ratio
+        if spindle_ratio is not None:
+            policy.spindle_ratio = spindle_ratio
+        self.placement.reset()
 
     def get_nodes_by_group(self, group: GanetiNodeGroup) -> List[GanetiNode]:
-        filtered_nodes: List[GanetiNode] = []
-        for node in self.nodes:
-            if node.group_uuid == group.uuid:
-                filtered_nodes.append(node)
-        return filtered_nodes
+        return list(self.nodes_by_group.get(group.uuid, []))
     
     def get_instances_by_nodes(self, nodes: List[GanetiNode]) -> List[GanetiInstance]:
         filtered_instances: List[GanetiInstance] = []
-        for instance in self.instances:
-            for node in nodes:
-                if instance.pnode == node.name:
-                    filtered_instances.append(instance)
+        for node in nodes:
+            filtered_instances.extend(self.instances_by_pnode.get(node.name, []))
         return filtered_instances
 
     # retrieve a GanetiNode object through its node name
     def get_node_by_name(self, node_name) -> GanetiNode:
-        for node in self.nodes:
-            if (node_name == node.name) or (node_name == node.shortname):
-                return node
+        node = self.nodes_by_name.get(node_name)
+        if node:
+            return node
         raise Exception("Node {} not found".format(node_name))
 
-    # try to remove a node from the cluster by moving away all instances
-    def remove_node(self, node_name: str):
-        node_to_remove = self.get_node_by_name(node_name)
-
-        if node_name == node_to_remove.shortname:
-            node_name = node_to_remove.name
-
-        for instance in self.instances:
-            self._evacuate_instance(node_name, instance)
-
-        # Double-tap - find instances which swapped primary/secondary during the first run
-        for instance in self.instances:
-            self._evacuate_instance(node_name, instance)
-
-        self.nodes.remove(node_to_remove)
+    # silence the reporter for trial changes (simulations, searches, probes), yields the reporter in use before
+    @contextmanager
+    def silenced(self) -> Iterator[GanetiReporter]:
+        reporter = self.reporter
+        self.reporter = GanetiReporter(level=GanetiReporter.SILENT)
+        try:
+            yield reporter
+        finally:
+            self.reporter = reporter
+
+    # transactions: changes made after begin() are journaled and can be undone with rollback() or kept with commit()
+    # (transactions can be nested, only the changes made since the matching begin() are affected)
+    def begin(self):
+        self._savepoints.append(len(self._journal))
+
+    def commit(self):
+        self._savepoints.pop()
+        if not self._savepoints:
+            self._journal = []
+
+    def rollback(self):
+        savepoint = self._savepoints.pop()
+        while len(self._journal) > savepoint:
+            self._undo(self._journal.pop())
+
+    # all instances moved since the outermost begin() as (instance, old pnode, old snodes), in the order of their first move
+    def get_moved_instances(self) -> List[Tuple[GanetiInstance, str, str]]:
+        original_nodes: Dict[str, Tuple[GanetiInstance, str, str]] = {}
+        for change in self._journal:
+            if change[0] == "move_instance" and change[1].name not in original_nodes:
+                original_nodes[change[1].name] = change[1:4]
+        return [
+            (instance, pnode, snodes) for instance, pnode, snodes in original_nodes.values()
+            if (instance.pnode, instance.snodes) != (pnode, snodes)
+        ]
+
+    # every instance move since the outermost begin() as (instance name, new pnode, new snodes), in the order they were made
+    def get_instance_moves(self) -> List[Tuple[str, str, str]]:
+        moves = []
+        # the journal only knows the nodes before each move, the new ones are those before the next move (or the current ones)
+        following: Dict[str, Tuple[str, str]] = {}
+        for change in reversed(self._journal):
+            if change[0] == "move_instance":
+                _, instance, pnode, snodes, _ = change
+                moves.append((instance.name,) + following.get(instance.name, (instance.pnode, instance.snodes)))
+                following[instance.name] = (pnode, snodes)
+        moves.reverse()
+        return moves
+
+    # try to remove a node from the cluster by moving away all instances (returns the number of failovers performed)
+    # the cluster is left untouched if the node can not be removed
+    def remove_node(self, node_name: str) -> int:
+        return self.remove_nodes([node_name])
+
+    # try to remove several nodes at once, none of them is used as a target for the instances of the others
+    # (returns the number of failovers performed, the cluster is left untouched if any node can not be removed)
+    def remove_nodes(self, node_names: List[str]) -> int:
+        # (the same node might be given by its name and short name)
+        nodes_to_remove = list({node.name: node for node in map(self.get_node_by_name, node_names)}.values())
+        failovers = 0
+
+        previously_draining = self._draining
+        self._draining = previously_draining | {node.name for node in nodes_to_remove}
+        self.begin()
+        try:
+            for node_to_remove in nodes_to_remove:
+                node_name = node_to_remove.name
+                # only the instances on this node are visited (in the configured evacuation order)
+                for instance in plan_evacuation(self, node_name, self.evacuation_order):
+                    if self._evacuate_instance(node_name, instance):
+                        failovers += 1
+                        # the failover turned this node into the instance's secondary, so move that away right away
+                        self._evacuate_instance(node_name, instance)
+        except:
+            self.rollback()
+            raise
+        finally:
+            self._draining = previously_draining
+
+        self._drop_nodes(nodes_to_remove)
+        self.commit()
+
+        return failovers
+
+    # drop removed (and evacuated) nodes from the node lists and indexes
+    def _drop_nodes(self, nodes: List[GanetiNode]):
+        for node in nodes:
+            position, group_position = self._unregister_node(node)
+            self._record("remove_node", node, position, group_position)
+
+    # apply the outcome of a node removal which has been simulated on another copy of this cluster (e.g. in a
+    # worker process): replay the instance moves (see get_instance_moves()) and drop the removed nodes
+    def apply_removal(self, node_names: List[str], moves: List[Tuple[str, str, str]]):
+        instances_by_name = {instance.name: instance for instance in self.instances}
+        for instance_name, pnode, snodes in moves:
+            self._set_instance_nodes(instances_by_name[instance_name], pnode, snodes)
+        self._drop_nodes([self.get_node_by_name(node_name) for node_name in node_names])
+
+    # usage figures of a single node as shown by dump_cluster(): node group, node, primary and secondary instances,
+    # memory, disk, CPU and spindle usage (percent) and the worst case Fail-N-1 usage (percent, failed node) of
+    # memory, CPUs and spindles
+    def _get_node_usage_row(self, node_group: GanetiNodeGroup, node: GanetiNode, failn1: Dict) -> tuple:
+        (failn1_mem_node, failn1_mem_percentage), (failn1_cpu_node, failn1_cpu_percentage), (failn1_spindle_node, failn1_spindle_percentage) = failn1[node.name]
+        return (
+            node_group.name,
+            node.name,
+            self._count_primary_instances(node),
+            self._count_secondary_instances(node),
+            self._get_memory_used_percentage(node),
+            self._get_disk_used_percentage(node),
+            self._get_cpu_used_percentage(node),
+            self._get_spindles_used_percentage(node),
+            failn1_mem_percentage, failn1_mem_node,
+            failn1_cpu_percentage, failn1_cpu_node,
+            failn1_spindle_percentage, failn1_spindle_node
+        )
+
+    # summed up usage and capacity (memory, disk, CPUs, spindles) of all nodes of a node group (the same figures as the
+    # node percentages: memory, CPUs and spindles of the primary instances, disk of all instances) together with the
+    # worst case Fail-N-1 usage (percent) of memory, CPUs and spindles of any of its nodes
+    def _get_node_group_usage(self, node_group: GanetiNodeGroup, failn1: Dict) -> Tuple[List[float], List[float], List[int]]:
+        usage = [0.0, 0.0, 0.0, 0.0]
+        capacity = [0.0, 0.0, 0.0, 0.0]
+        worst_failn1 = [0, 0, 0]
+        for node in self.get_nodes_by_group(node_group):
+            ledger = self._get_ledger(node.name)
+            for resource, (used, total) in enumerate(zip(
+                (ledger.primary_memory, ledger.used_disk(), ledger.primary_vcpus, ledger.primary_spindles), self._get_node_capacity(node)
+            )):
+                usage[resource] += used
+                capacity[resource] += total
+            worst_failn1 = [max(worst, percentage) for worst, (_, percentage) in zip(worst_failn1, failn1[node.name])]
+        return usage, capacity, worst_failn1
+
+    # disk space and number of the instances of a node group which keep their disks in shared storage (accounted for
+    # once per node group, it is not part of the disk usage of any node)
+    def _get_shared_disk_usage(self, node_group: GanetiNodeGroup) -> Tuple[int, int]:
+        instances = [
+            instance for instance in self.get_instances_by_nodes(self.get_nodes_by_group(node_group))
+            if instance.disk_template in SHARED_DISK_TEMPLATES
+        ]
+        return (sum(instance.disk_size for instance in instances), len(instances))
+
+    # usage figures of all nodes (in node group order), computed one node at a time
+    def iter_node_usage(self, failn1: Dict = None) -> Iterator[tuple]:
+        failn1 = failn1 if failn1 is not None else self._get_max_failn1_used_percentages()
+        for node_group in self.node_groups:
+            for node in self.get_nodes_by_group(node_group):
+                yield self._get_node_usage_row(node_group, node, failn1)
 
     # print out the current cluster state (with usage percentages)
     def dump_cluster(self):
+        failn1 = self._get_max_failn1_used_percentages()
         for node_group in self.node_groups:
             print("\nNode-Group: {}".format(node_group.name))
             lines = []
@@ -398,22 +926,21 @@ class GanetiCluster:
                 "Spindles"
             ])
             for node in self.get_nodes_by_group(node_group):
+                _, _, primary_instances, secondary_instances, memory_percentage, disk_percentage, cpu_percentage, spindles_percentage, \
+                    failn1_mem_percentage, failn1_mem_node, failn1_cpu_percentage, failn1_cpu_node, failn1_spindle_percentage, failn1_spindle_node = \
+                    self._get_node_usage_row(node_group, node, failn1)
 
                 lines.append([
                     node.name.split(".")[0],
-                    self._count_primary_instances(node),
-                    self._count_secondary_instances(node),
-                    "{}%".format(self._get_memory_used_percentage(node)),
-                    "{}%".format(self._get_disk_used_percentage(node)),
-                    "{}%".format(self._get_cpu_used_percentage(node)),
-                    "{}%".format(self._get_spindles_used_percentage(node))
+                    primary_instances,
+                    secondary_instances,
+                    "{}%".format(memory_percentage),
+                    "{}%".format(disk_percentage),
+                    "{}%".format(cpu_percentage),
+                    "{}%".format(spindles_percentage)
                     ]
                 )
 
-                failn1_mem_node, failn1_mem_percentage = self._get_max_failn1_memory_used_percentage(node)
-                failn1_cpu_node, failn1_cpu_percentage = self._get_max_failn1_cpu_used_percentage(node)
-                failn1_spindle_node, failn1_spindle_percentage = self._get_max_failn1_spindles_used_percentage(node)
-
                 lines.append([
                     "* simulate Fail-N-1",
                     "",
@@ -430,3 +957,7 @@ class GanetiCluster:
             print()
             print(tabulate(lines, headers="firstrow", tablefmt="github"))
             print()
+            shared_disk, shared_instances = self._get_shared_disk_usage(node_group)
+            if shared_instances:
+                print("Shared storage: {}MB used by {} instances".format(shared_disk, shared_instances))
+                print()
@@ -0,0 +1,8 @@
+#!/usr/bin/python3
+
+class GanetiEvacuationError(Exception):
+    instance_name: str
+
+    def __init__(self, message: str, instance_name: str):
+        super().__init__(message)
+        self.instance_name = instance_name
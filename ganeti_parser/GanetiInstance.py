@@ -1,20 +1,33 @@
 #!/usr/bin/python3
 from typing import List
 
+# disk templates which keep a copy of the disks on a secondary node
+MIRRORED_DISK_TEMPLATES = ["drbd"]
+# disk templates which keep the disks in storage shared by the nodes of a node group (instances move without copying them)
+SHARED_DISK_TEMPLATES = ["sharedfile", "gluster", "rbd", "ext", "blockdev"]
+# disk templates which can be used on nodes with exclusive storage
+EXCLUSIVE_STORAGE_DISK_TEMPLATES = ["diskless", "plain", "drbd", "ext"]
+
 class GanetiInstance:
-    name = ""
-    memory_size = 0
-    disk_size = 0
-    vcpus = 0
-    status = ""
-    auto_balance = ""
-    pnode = ""
-    snodes = ""
-    disk_template = ""
-    tags: List[str] = []
-    spindles = 0
-    total_spindles = 0
-    forthcoming = ""
+    # large clusters hold thousands of instances, so keep them free of a per-object __dict__
+    __slots__ = (
+        "name", "memory_size", "disk_size", "vcpus", "status", "auto_balance", "pnode", "snodes",
+        "disk_template", "tags", "spindles", "total_spindles", "forthcoming"
+    )
+
+    name: str
+    memory_size: int
+    disk_size: int
+    vcpus: int
+    status: str
+    auto_balance: str
+    pnode: str
+    snodes: str
+    disk_template: str
+    tags: List[str]
+    spindles: int
+    total_spindles: str
+    forthcoming: str
 
     def __init__(self, name, memory_size, disk_size, vcpus, status, auto_balance, pnode, snodes, disk_template, tags, spindles, total_spindles, forthcoming):
         self.name = name
@@ -31,5 +44,13 @@ class GanetiInstance:
         self.total_spindles = total_spindles
         self.forthcoming = forthcoming
 
+    # whether the instance has a secondary node which takes over when its primary node fails
+    def is_mirrored(self) -> bool:
+        return self.disk_template in MIRRORED_DISK_TEMPLATES
+
+    # disk space the instance takes from the local storage of each of its nodes (shared storage is not part of it)
+    def local_disk_size(self) -> int:
+        return 0 if self.disk_template in SHARED_DISK_TEMPLATES else self.disk_size
+
     def __eq__(self, other):
         return self.name == other.name
\ No newline at end of file
@@ -1,28 +1,34 @@
 #!/usr/bin/python3
 from typing import List
 import re
+import sys
 
 class GanetiNode:
-    name = ""
-    shortname = ""
-    total_memory = 0
-    used_memory = 0
-    free_memory = 0
-    total_disk = 0
-    free_disk = 0
-    total_cpus = 0
-    status = ""
-    group_uuid = ""
-    spindles = 0
-    tags: List[str] = []
-    exclusive_storage = ""
-    free_spindles = 0
-    node_cpus = 0
-    cpu_speed = ""
+    __slots__ = (
+        "name", "shortname", "total_memory", "used_memory", "free_memory", "total_disk", "free_disk", "total_cpus",
+        "status", "group_uuid", "spindles", "tags", "exclusive_storage", "free_spindles", "node_cpus", "cpu_speed"
+    )
+
+    name: str
+    shortname: str
+    total_memory: int
+    used_memory: int
+    free_memory: int
+    total_disk: int
+    free_disk: int
+    total_cpus: int
+    status: str
+    group_uuid: str
+    spindles: int
+    tags: List[str]
+    exclusive_storage: str
+    free_spindles: int
+    node_cpus: int
+    cpu_speed: str
 
     def __init__(self, name, total_memory, used_memory, free_memory, total_disk, free_disk, total_cpus, status, group_uuid, spindles, tags, exclusive_storage, free_spindles, node_cpus, cpu_speed):
         self.name = name
-        self.shortname = re.sub(r'\..*', '', name)
+        self.shortname = sys.intern(re.sub(r'\..*', '', name))
         self.total_memory = total_memory
         self.used_memory = used_memory
         self.free_memory = free_memory
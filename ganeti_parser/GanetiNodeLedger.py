@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+from typing import Dict
+
+from ganeti_parser.GanetiInstance import GanetiInstance
+
+class GanetiNodeLedger:
+    primary_instances: int
+    secondary_instances: int
+    primary_memory: int
+    secondary_memory: int
+    primary_disk: int
+    secondary_disk: int
+    primary_vcpus: int
+    secondary_vcpus: int
+    primary_spindles: int
+    secondary_spindles: int
+    # resources this node would have to take over if a given primary node fails (keyed by primary node name)
+    failover_memory: Dict[str, int]
+    failover_vcpus: Dict[str, int]
+    failover_spindles: Dict[str, int]
+
+    def __init__(self):
+        self.primary_instances = 0
+        self.secondary_instances = 0
+        self.primary_memory = 0
+        self.secondary_memory = 0
+        self.primary_disk = 0
+        self.secondary_disk = 0
+        self.primary_vcpus = 0
+        self.secondary_vcpus = 0
+        self.primary_spindles = 0
+        self.secondary_spindles = 0
+        self.failover_memory = {}
+        self.failover_vcpus = {}
+        self.failover_spindles = {}
+
+    # account for a GanetiInstance which uses this node as its primary
+    def add_primary(self, instance: GanetiInstance):
+        self.primary_instances += 1
+        self.primary_memory += instance.memory_size
+        self.primary_disk += instance.local_disk_size()
+        self.primary_vcpus += instance.vcpus
+        self.primary_spindles += instance.spindles
+
+    def remove_primary(self, instance: GanetiInstance):
+        self.primary_instances -= 1
+        self.primary_memory -= instance.memory_size
+        self.primary_disk -= instance.local_disk_size()
+        self.primary_vcpus -= instance.vcpus
+        self.primary_spindles -= instance.spindles
+
+    # account for a GanetiInstance which uses this node as its secondary
+    def add_secondary(self, instance: GanetiInstance):
+        self.secondary_instances += 1
+        self.secondary_memory += instance.memory_size
+        self.secondary_disk += instance.local_disk_size()
+        self.secondary_vcpus += instance.vcpus
+        self.secondary_spindles += instance.spindles
+        self.failover_memory[instance.pnode] = self.failover_memory.get(instance.pnode, 0) + instance.memory_size
+        self.failover_vcpus[instance.pnode] = self.failover_vcpus.get(instance.pnode, 0) + instance.vcpus
+        self.failover_spindles[instance.pnode] = self.failover_spindles.get(instance.pnode, 0) + instance.spindles
+
+    def remove_secondary(self, instance: GanetiInstance):
+        self.secondary_instances -= 1
+        self.secondary_memory -= instance.memory_size
+        self.secondary_disk -= instance.local_disk_size()
+        self.secondary_vcpus -= instance.vcpus
+        self.secondary_spindles -= instance.spindles
+        self.failover_memory[instance.pnode] -= instance.memory_size
+        self.failover_vcpus[instance.pnode] -= instance.vcpus
+        self.failover_spindles[instance.pnode] -= instance.spindles
+
+    # disk space occupied by primary and secondary instances
+    def used_disk(self) -> int:
+        return self.primary_disk + self.secondary_disk
+
+    # vCPUs of primary and secondary instances (this is what the capacity checks compare against)
+    def used_vcpus(self) -> int:
+        return self.primary_vcpus + self.secondary_vcpus
+
+    # spindles of primary and secondary instances (this is what the capacity checks compare against)
+    def used_spindles(self) -> int:
+        return self.primary_spindles + self.secondary_spindles
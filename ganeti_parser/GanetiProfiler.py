@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+import cProfile
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, TextIO
+
+from tabulate import tabulate
+
+# Opt-in instrumentation of GanetiCluster: instrument() replaces the hot methods of a single cluster object
+# with wrappers counting calls and wall time, so a cluster without a profiler runs the plain class methods
+# without any overhead. Times are inclusive (a candidate search contains the capacity checks it runs).
+# method name: phase
+PROFILED_METHODS: Dict[str, str] = {
+    "_register_node": "index build",
+    "_register_instance": "index build",
+    "get_node_by_name": "lookup",
+    "_find_new_primary_for_instance": "candidate search",
+    "_find_new_secondary_for_instance": "candidate search",
+    "_node_has_enough_memory": "memory check",
+    "_node_has_enough_disk": "disk check",
+    "_node_has_enough_cpus": "cpu check",
+    "_node_has_enough_spindles": "spindle check",
+    "_node_has_no_conflicting_migration_tags": "tag check",
+    "_node_keeps_redundancy": "redundancy check",
+    "_failover_instance": "failover",
+    "_evacuate_instance": "evacuation",
+    "dump_cluster": "output",
+}
+
+# check method name: resource (a False result counts as a rejected candidate node)
+PROFILED_CHECKS: Dict[str, str] = {
+    "_node_has_enough_memory": "memory",
+    "_node_has_enough_disk": "disk",
+    "_node_has_enough_cpus": "cpu",
+    "_node_has_enough_spindles": "spindles",
+    "_node_has_no_conflicting_migration_tags": "tags",
+    "_node_keeps_redundancy": "redundancy",
+}
+
+
+class GanetiProfiler:
+    calls: Dict[str, int]
+    seconds: Dict[str, float]
+    rejections: Dict[str, int]
+    profile: cProfile.Profile
+    profile_output: str
+
+    def __init__(self, profile_output: str = None):
+        self.calls = {}
+        self.seconds = {}
+        self.rejections = {}
+        self.profile_output = profile_output
+        self.profile = None
+        if profile_output:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def record(self, phase: str, elapsed: float):
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + elapsed
+
+    def reject(self, resource: str):
+        self.rejections[resource] = self.rejections.get(resource, 0) + 1
+
+    # time a block of code outside of GanetiCluster (e.g. parsing the data file or printing tables)
+    @contextmanager
+    def phase(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    def _wrap(self, method, phase: str, resource: str = None):
+        perf_counter = time.perf_counter
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self.record(phase, perf_counter() - start)
+            if resource and not result:
+                self.reject(resource)
+            return result
+        return wrapper
+
+    # replace the profiled methods of the given cluster object (the class itself is left untouched), log
+    # messages written by the cluster's reporter count as output as well
+    def instrument(self, cluster):
+        for name, phase in PROFILED_METHODS.items():
+            setattr(cluster, name, self._wrap(getattr(cluster, name), phase, PROFILED_CHECKS.get(name)))
+        cluster.reporter._emit = self._wrap(cluster.reporter._emit, "output")
+
+    # stop the cProfile profiler (if any) and write its statistics (readable with the pstats module)
+    def stop(self):
+        if self.profile:
+            self.profile.disable()
+            self.profile.dump_stats(self.profile_output)
+            self.profile = None
+
+    def summary(self) -> List[List]:
+        lines = [["Phase", "Calls", "Total time", "Per call"]]
+        for phase in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            lines.append([phase, self.calls[phase], "{:.4f}s".format(self.seconds[phase]), "{:.1f}µs".format(self.seconds[phase] / self.calls[phase] * 1000000)])
+        return lines
+
+    # the tables go to stderr by default, so they never end up in machine readable output on stdout
+    def print_summary(self, stream: TextIO = None):
+        stream = stream if stream else sys.stderr
+        print(file=stream)
+        print(tabulate(self.summary(), headers="firstrow", tablefmt="github"), file=stream)
+        if self.rejections:
+            lines = [["Resource", "Rejected candidates"]]
+            for resource in PROFILED_CHECKS.values():
+                if resource in self.rejections:
+                    lines.append([resource, self.rejections[resource]])
+            print(file=stream)
+            print(tabulate(lines, headers="firstrow", tablefmt="github"), file=stream)
+        print(file=stream)
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+import json
+import sys
+from typing import TextIO
+
+class GanetiReporter:
+    # verbosity levels (every level includes the ones below it)
+    SILENT = 0
+    SUMMARY = 1
+    DECISION = 2
+    TRACE = 3
+
+    LEVELS = {
+        "silent": SILENT,
+        "summary": SUMMARY,
+        "decision": DECISION,
+        "trace": TRACE,
+    }
+    LEVEL_NAMES = {
+        SILENT: "silent",
+        SUMMARY: "summary",
+        DECISION: "decision",
+        TRACE: "trace",
+    }
+
+    RED = "\033[91m"
+    GREEN = "\033[92m"
+    YELLOW = "\033[93m"
+    RESET = "\033[0m"
+
+    level: int
+    json_lines: bool
+    stream: TextIO
+
+    # stream defaults to whatever sys.stdout is at the time of writing (so redirecting stdout works)
+    def __init__(self, level: int = TRACE, json_lines: bool = False, stream: TextIO = None):
+        self.level = level
+        self.json_lines = json_lines
+        self.stream = stream
+
+    def enabled(self, level: int) -> bool:
+        return level <= self.level
+
+    # messages are format strings which only get rendered (with the given fields) if the level is enabled
+    def summary(self, event: str, message: str, color: str = None, **fields):
+        if self.level >= self.SUMMARY:
+            self._emit(self.SUMMARY, event, message, color, fields)
+
+    def decision(self, event: str, message: str, color: str = None, **fields):
+        if self.level >= self.DECISION:
+            self._emit(self.DECISION, event, message, color, fields)
+
+    def trace(self, event: str, message: str, color: str = None, **fields):
+        if self.level >= self.TRACE:
+            self._emit(self.TRACE, event, message, color, fields)
+
+    # print an empty line for readability (human readable output only)
+    def newline(self, level: int = SUMMARY):
+        if self.level >= level and not self.json_lines:
+            self._write("\n")
+
+    def _emit(self, level: int, event: str, message: str, color: str, fields: dict):
+        if self.json_lines:
+            record = {"level": self.LEVEL_NAMES[level], "event": event}
+            record.update(fields)
+            self._write(json.dumps(record) + "\n")
+            return
+
+        text = message.format(**fields)
+        if color:
+            # keep the indentation outside of the coloured part
+            stripped = text.lstrip(" ")
+            text = "{}{}{}{}".format(text[:len(text) - len(stripped)], color, stripped, self.RESET)
+        self._write(text + "\n")
+
+    def _write(self, text: str):
+        stream = self.stream if self.stream else sys.stdout
+        stream.write(text)
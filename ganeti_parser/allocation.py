@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+from typing import Dict, List, Set, Tuple
+
+from ganeti_parser.GanetiInstance import GanetiInstance, MIRRORED_DISK_TEMPLATES
+from ganeti_parser.GanetiNodeGroup import GanetiNodeGroup
+
+# resources checked (in this order) when looking for a node, used to tell why the allocation stopped
+ALLOCATION_RESOURCES = ["memory", "disk", "cpu", "spindles"]
+
+
+class GanetiAllocationResult:
+    node_group: str
+    ispec: Tuple[int, int, int, int]
+    disk_template: str
+    allocated: int
+    limiting_resource: str
+    primaries: Dict[str, int]
+
+    def __init__(self, node_group, ispec, disk_template, allocated, limiting_resource, primaries):
+        self.node_group = node_group
+        self.ispec = ispec
+        self.disk_template = disk_template
+        self.allocated = allocated
+        self.limiting_resource = limiting_resource
+        self.primaries = primaries
+
+
+# parse an instance spec given as "memory,vcpus,disk[,spindles]"
+def parse_ispec(value: str) -> Tuple[int, int, int, int]:
+    fields = [int(field) for field in value.split(",")]
+    if len(fields) not in (3, 4):
+        raise Exception("Invalid instance spec {}, expected memory,vcpus,disk[,spindles]".format(value))
+    return tuple(fields) if len(fields) == 4 else (fields[0], fields[1], fields[2], 1)
+
+
+# the standard instance spec of the node group's policy (or of the cluster policy if the group has none)
+def get_policy_ispec(cluster, node_group: GanetiNodeGroup) -> Tuple[int, int, int, int]:
+    policy = cluster.policies_by_owner.get(node_group.name, cluster.policies_by_owner.get(""))
+    if not policy:
+        raise Exception("No allocation policy found for node group {}".format(node_group.name))
+    return policy.get_standard_ispec()
+
+
+# the resource which rejected most of the given nodes for the given instance
+def _limiting_resource(cluster, nodes, instance: GanetiInstance) -> str:
+    checks = [cluster._node_has_enough_memory, cluster._node_has_enough_disk, cluster._node_has_enough_cpus, cluster._node_has_enough_spindles]
+    rejections = [0] * len(checks)
+    for node in nodes:
+        for resource, check in enumerate(checks):
+            if not check(node, instance):
+                rejections[resource] += 1
+                break
+    if not any(rejections):
+        return "nodes"
+    return ALLOCATION_RESOURCES[rejections.index(max(rejections))]
+
+
+# first node of the group (in the order preferred by the placement strategy) accepting the instance, together
+# with the names of the candidates rejected on the way
+def _place_instance(cluster, node_group: GanetiNodeGroup, instance: GanetiInstance, primary: bool, excluded: Set[str]):
+    accepts = cluster._node_accepts_primary if primary else cluster._node_accepts_secondary
+    rejected = set()
+    for node in cluster.placement.candidates(cluster, node_group, instance, primary, excluded):
+        if accepts(node, instance):
+            return node, rejected
+        rejected.add(node.name)
+    return None, rejected
+
+
+# first primary node (in the order preferred by the placement strategy) accepting the instance for which a
+# secondary node is found too, as (primary, secondary, None), or (None, None, last primary tried) if there is no
+# such pair. The names of the nodes rejected as primary (and as secondary, unless whether a node is accepted
+# depends on the primary) are added to the given sets.
+def _place_mirrored_instance(cluster, node_group: GanetiNodeGroup, instance: GanetiInstance, primary_rejected: Set[str], secondary_rejected: Set[str]):
+    placement = (None, None, None)
+    rejected = set()
+    for pnode in cluster.placement.candidates(cluster, node_group, instance, True, primary_rejected):
+        if not cluster._node_accepts_primary(pnode, instance):
+            rejected.add(pnode.name)
+            continue
+        instance.pnode = pnode.name
+        snode, secondaries = _place_instance(cluster, node_group, instance, False, secondary_rejected | {pnode.name})
+        # whether a node keeps N+1 redundancy as a secondary depends on the primary node
+        if not cluster.keep_redundancy:
+            secondary_rejected |= secondaries
+        if snode:
+            placement = (pnode, snode, None)
+            break
+        placement = (None, None, pnode)
+    primary_rejected |= rejected
+    return placement
+
+
+# Simulate allocating new instances of the given spec (memory, vCPUs, disk, spindles) in a node group until no
+# more primary (and secondary) node can be found, like `hspace` does. The instances are really added to the
+# cluster (so every placement sees the resources of the ones before) and rolled back at the end, unless
+# keep_instances is set (they are then part of the caller's transaction). Resources are only ever added during
+# the simulation, so a node which rejected the spec once is never offered again. Only nodes which may hold the
+# disk template are considered (the limiting resource is "disk_template" if there are none).
+def simulate_allocation(cluster, node_group: GanetiNodeGroup, ispec: Tuple[int, int, int, int], disk_template: str = "drbd",
+                        max_instances: int = None, keep_instances: bool = False) -> GanetiAllocationResult:
+    memory_size, vcpus, disk_size, spindles = ispec
+    mirrored = disk_template in MIRRORED_DISK_TEMPLATES
+    primaries: Dict[str, int] = {}
+    allocated = 0
+    limiting_resource = None
+    eligible_nodes = cluster._get_eligible_nodes(node_group, disk_template)
+    if not eligible_nodes and cluster.get_nodes_by_group(node_group):
+        return GanetiAllocationResult(node_group.name, ispec, disk_template, 0, "disk_template", {})
+    nodes = [node for node in eligible_nodes if node.name not in cluster._draining]
+    primary_rejected = set()
+    secondary_rejected = set()
+
+    with cluster.silenced():
+        cluster.begin()
+        try:
+            while max_instances is None or allocated < max_instances:
+                instance = GanetiInstance(
+                    "simulated-{}-{}".format(node_group.name, allocated), memory_size, disk_size, vcpus,
+                    "running", "Y", "", "", disk_template, [], spindles, "-", "N"
+                )
+                if mirrored:
+                    pnode, snode, last_primary = _place_mirrored_instance(cluster, node_group, instance, primary_rejected, secondary_rejected)
+                else:
+                    pnode, rejected = _place_instance(cluster, node_group, instance, True, primary_rejected)
+                    primary_rejected |= rejected
+                    snode, last_primary = None, None
+                if not pnode:
+                    # without a secondary for any primary, the last primary tried is not a candidate for its secondary
+                    candidates = nodes if last_primary is None else [node for node in nodes if node is not last_primary]
+                    limiting_resource = _limiting_resource(cluster, candidates, instance)
+                    break
+
+                cluster.add_instance(
+                    instance.name, memory_size, disk_size, vcpus, "running", "Y", pnode.name, snode.name if snode else "",
+                    disk_template, [], spindles, "-", "N"
+                )
+                primaries[pnode.name] = primaries.get(pnode.name, 0) + 1
+                allocated += 1
+        finally:
+            if keep_instances:
+                cluster.commit()
+            else:
+                cluster.rollback()
+
+    return GanetiAllocationResult(node_group.name, ispec, disk_template, allocated, limiting_resource, primaries)
+
+
+# simulate the allocation in every node group, either with the given instance spec or the group's policy spec
+def simulate_allocations(cluster, ispec: Tuple[int, int, int, int] = None, disk_template: str = "drbd",
+                         max_instances: int = None) -> List[GanetiAllocationResult]:
+    results = []
+    for node_group in cluster.node_groups:
+        group_ispec = ispec if ispec else get_policy_ispec(cluster, node_group)
+        results.append(simulate_allocation(cluster, node_group, group_ispec, disk_template, max_instances))
+    return results
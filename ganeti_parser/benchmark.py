@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from typing import Dict, List, Tuple
+
+from ganeti_parser.generator import generate_datafile
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.parser import parse_datafile
+from ganeti_parser.sweep import remove_each_node
+
+BENCHMARK_VERSION = 1
+
+# name: (node groups, nodes per group, instances per node)
+BENCHMARK_SIZES: Dict[str, Tuple[int, int, int]] = {
+    "small": (1, 10, 8),
+    "medium": (2, 50, 10),
+    "large": (4, 100, 12),
+}
+
+BENCHMARK_PHASES = ["parse", "dump", "evacuate", "sweep"]
+
+# a phase is reported as a regression if it is this much slower than in the baseline
+REGRESSION_THRESHOLD = 0.2
+
+
+# run a phase `repeat` times and keep the fastest run (the least disturbed by the rest of the system)
+def _time_phase(function, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# benchmark a single cluster size (runs in a fresh process, so the peak memory is not influenced by other sizes)
+def _benchmark_size(filename: str, repeat: int, processes: int, connection):
+    reporter = GanetiReporter(level=GanetiReporter.SILENT)
+
+    tracemalloc.start()
+    cluster = parse_datafile(filename, reporter=reporter)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    first_node = cluster.get_nodes_by_group(cluster.node_groups[0])[0].name
+
+    def parse():
+        parse_datafile(filename, reporter=reporter)
+
+    def dump():
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            cluster.dump_cluster()
+
+    def evacuate():
+        cluster.begin()
+        try:
+            cluster.remove_node(first_node)
+        finally:
+            cluster.rollback()
+
+    def sweep():
+        remove_each_node(cluster, processes=processes)
+
+    operations = {"parse": len(cluster.instances), "dump": len(cluster.nodes), "evacuate": 1, "sweep": len(cluster.nodes)}
+    functions = {"parse": parse, "dump": dump, "evacuate": evacuate, "sweep": sweep}
+
+    phases = {}
+    for phase in BENCHMARK_PHASES:
+        seconds = _time_phase(functions[phase], repeat)
+        phases[phase] = {"seconds": seconds, "ops_per_sec": operations[phase] / seconds if seconds else 0.0, "operations": operations[phase]}
+
+    connection.send({
+        "nodes": len(cluster.nodes),
+        "instances": len(cluster.instances),
+        "peak_memory": peak_memory,
+        "phases": phases,
+    })
+    connection.close()
+
+
+# Time parsing, dumping, a single node evacuation and a full removal sweep on synthetic clusters of the given
+# sizes. Every size is generated into a temporary file and benchmarked in its own (forked) process.
+def run_benchmark(sizes: List[str] = None, repeat: int = 3, processes: int = None, seed: int = 0) -> dict:
+    context = multiprocessing.get_context("fork")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes if sizes else list(BENCHMARK_SIZES):
+            groups, nodes_per_group, instances_per_node = BENCHMARK_SIZES[size]
+            filename = os.path.join(directory, "{}.data".format(size))
+            generate_datafile(filename, groups=groups, nodes_per_group=nodes_per_group, instances_per_node=instances_per_node, seed=seed)
+
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_benchmark_size, args=(filename, repeat, processes, sender))
+            process.start()
+            sender.close()
+            try:
+                results[size] = receiver.recv()
+            except EOFError:
+                raise Exception("Benchmark of size {} failed".format(size))
+            finally:
+                process.join()
+
+    return {"version": BENCHMARK_VERSION, "repeat": repeat, "seed": seed, "results": results}
+
+
+def write_baseline(filename: str, benchmark: dict):
+    with open(filename, "w") as file:
+        json.dump(benchmark, file, indent=2, sort_keys=True)
+
+
+def load_baseline(filename: str) -> dict:
+    with open(filename) as file:
+        baseline = json.load(file)
+    if baseline.get("version") != BENCHMARK_VERSION:
+        raise Exception("Benchmark baseline {} has version {}, expected {}".format(filename, baseline.get("version"), BENCHMARK_VERSION))
+    return baseline
+
+
+# compare a benchmark against a baseline, returns (size, phase, baseline seconds, seconds, ratio, regression) for
+# every phase that was measured in both runs
+def compare_benchmark(benchmark: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> List[Tuple[str, str, float, float, float, bool]]:
+    comparison = []
+    for size, result in benchmark["results"].items():
+        if size not in baseline["results"]:
+            continue
+        for phase in BENCHMARK_PHASES:
+            before = baseline["results"][size]["phases"].get(phase)
+            after = result["phases"].get(phase)
+            if not before or not after or not before["seconds"]:
+                continue
+            ratio = after["seconds"] / before["seconds"]
+            comparison.append((size, phase, before["seconds"], after["seconds"], ratio, ratio > 1.0 + threshold))
+    return comparison
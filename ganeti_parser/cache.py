@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+import hashlib
+import os
+import pickle
+from array import array
+from contextlib import nullcontext
+from sys import intern
+from typing import Dict, List
+
+from ganeti_parser.GanetiCluster import GanetiCluster
+from ganeti_parser.GanetiInstance import GanetiInstance
+from ganeti_parser.GanetiNodeLedger import GanetiNodeLedger
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.GanetiProfiler import GanetiProfiler
+from ganeti_parser.parser import PARSER_VERSION, parse_datafile
+
+# bump this whenever the layout of the cache files changes
+CACHE_FORMAT_VERSION = 3
+
+# columns of the cached elements, in the order the add_* methods of GanetiCluster expect them
+NODE_GROUP_COLUMNS = ["name", "uuid", "policy", "tags", "networks"]
+NODE_COLUMNS = ["name", "total_memory", "used_memory", "free_memory", "total_disk", "free_disk", "total_cpus", "status", "group_uuid", "spindles", "tags", "exclusive_storage", "free_spindles", "node_cpus", "cpu_speed"]
+INSTANCE_COLUMNS = ["name", "memory_size", "disk_size", "vcpus", "status", "auto_balance", "pnode", "snodes", "disk_template", "tags", "spindles", "total_spindles", "forthcoming"]
+POLICY_COLUMNS = ["owner", "ispec", "min_max_ispec", "disk_templates", "vcpu_ratio", "spindle_ratio"]
+LEDGER_COLUMNS = ["primary_instances", "secondary_instances", "primary_memory", "secondary_memory", "primary_disk", "secondary_disk", "primary_vcpus", "secondary_vcpus", "primary_spindles", "secondary_spindles"]
+LEDGER_FAILOVER_COLUMNS = ["failover_memory", "failover_vcpus", "failover_spindles"]
+
+# numeric columns are stored as packed arrays instead of lists of Python objects
+INTEGER_COLUMNS = {"total_memory", "used_memory", "free_memory", "total_disk", "free_disk", "total_cpus", "spindles", "free_spindles", "node_cpus", "memory_size", "disk_size", "vcpus"} | set(LEDGER_COLUMNS)
+FLOAT_COLUMNS = {"vcpu_ratio", "spindle_ratio"}
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "ganeti-instance-allocation-test")
+
+
+# the cache key covers the file content, its size and the versions of the parser and the cache format
+def cache_key(filename: str) -> str:
+    checksum = hashlib.sha256()
+    size = 0
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            checksum.update(chunk)
+            size += len(chunk)
+    return "{}-{}-p{}-c{}".format(checksum.hexdigest(), size, PARSER_VERSION, CACHE_FORMAT_VERSION)
+
+
+def _to_columns(elements: list, columns: List[str]) -> Dict[str, object]:
+    table = {}
+    for column in columns:
+        values = [getattr(element, column) for element in elements]
+        if column in INTEGER_COLUMNS:
+            table[column] = array("q", values)
+        elif column in FLOAT_COLUMNS:
+            table[column] = array("d", values)
+        else:
+            table[column] = values
+    return table
+
+
+def _from_columns(table: Dict[str, object], columns: List[str]):
+    return zip(*[table[column] for column in columns])
+
+
+# rebuild a freshly parsed GanetiCluster (node groups, nodes and policies go through the add_* methods, the
+# instances are restored in bulk together with their already computed resource ledger and indexes)
+def _restore_cluster(state: dict, reporter: GanetiReporter, profiler: GanetiProfiler = None) -> GanetiCluster:
+    cluster = GanetiCluster(allocation_tags=state["allocation_tags"], reporter=reporter, profiler=profiler)
+    for tag in state["tags"]:
+        cluster.add_cluster_tag(intern(tag))
+    for row in _from_columns(state["node_groups"], NODE_GROUP_COLUMNS):
+        cluster.add_node_group(*row)
+    for row in _from_columns(state["nodes"], NODE_COLUMNS):
+        name, total_memory, used_memory, free_memory, total_disk, free_disk, total_cpus, status, group_uuid, spindles, tags, exclusive_storage, free_spindles, node_cpus, cpu_speed = row
+        # total_memory has already been reduced by the parser
+        cluster.add_node(intern(name), total_memory, used_memory, free_memory, total_disk, free_disk, total_cpus, status, intern(group_uuid), spindles, tags, exclusive_storage, free_spindles, node_cpus, cpu_speed)
+    for row in _from_columns(state["policies"], POLICY_COLUMNS):
+        cluster.add_policy(*row)
+
+    with profiler.phase("index build") if profiler else nullcontext():
+        instances = [GanetiInstance(*row) for row in _from_columns(state["instances"], INSTANCE_COLUMNS)]
+        cluster.instances.extend(instances)
+        for position, instance in enumerate(instances):
+            cluster._instance_positions[instance.name] = position
+            instance.pnode = intern(instance.pnode)
+            instance.snodes = intern(instance.snodes)
+            cluster._index_instance(instance)
+
+        for row in _from_columns(state["ledger"], ["node"] + LEDGER_COLUMNS + LEDGER_FAILOVER_COLUMNS):
+            ledger = GanetiNodeLedger()
+            for column, value in zip(LEDGER_COLUMNS + LEDGER_FAILOVER_COLUMNS, row[1:]):
+                setattr(ledger, column, value)
+            cluster.ledger[intern(row[0])] = ledger
+    return cluster
+
+
+def _store_cluster(cluster: GanetiCluster, path: str):
+    state = {
+        "allocation_tags": cluster.allocation_tags,
+        "tags": cluster.tags,
+        "node_groups": _to_columns(cluster.node_groups, NODE_GROUP_COLUMNS),
+        "nodes": _to_columns(cluster.nodes, NODE_COLUMNS),
+        "instances": _to_columns(cluster.instances, INSTANCE_COLUMNS),
+        "policies": _to_columns(cluster.policies, POLICY_COLUMNS),
+        "ledger": _to_columns(cluster.ledger.values(), LEDGER_COLUMNS + LEDGER_FAILOVER_COLUMNS),
+    }
+    state["ledger"]["node"] = list(cluster.ledger.keys())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write to a temporary file first, concurrent runs must never see a half written cache file
+    temporary_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary_path, "wb") as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+
+
+# parse a data file, or load its parsed state from the cache if the very same file has been parsed before
+def load_datafile(filename: str, reporter: GanetiReporter = None, use_cache: bool = True, cache_dir: str = None, profiler: GanetiProfiler = None) -> GanetiCluster:
+    if not use_cache:
+        return parse_datafile(filename, reporter=reporter, profiler=profiler)
+
+    path = os.path.join(cache_dir if cache_dir else default_cache_dir(), "{}.cache".format(cache_key(filename)))
+    if os.path.exists(path):
+        state = None
+        try:
+            with open(path, "rb") as file:
+                state = pickle.load(file)
+        except Exception:
+            # broken or incompatible cache file, simply parse the data file again
+            pass
+        if state:
+            return _restore_cluster(state, reporter, profiler)
+
+    cluster = parse_datafile(filename, reporter=reporter, profiler=profiler)
+    try:
+        _store_cluster(cluster, path)
+    except OSError:
+        pass
+    return cluster
+
+
+# remove all cached states, returns the number of deleted files
+def clear_cache(cache_dir: str = None) -> int:
+    cache_dir = cache_dir if cache_dir else default_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for entry in os.listdir(cache_dir):
+        if entry.endswith(".cache") or entry.endswith(".tmp"):
+            os.remove(os.path.join(cache_dir, entry))
+            removed += 1
+    return removed
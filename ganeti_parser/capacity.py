@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+from typing import List, Tuple
+
+from ganeti_parser.GanetiNode import GanetiNode
+from ganeti_parser.GanetiNodeGroup import GanetiNodeGroup
+
+
+class GanetiCapacitySearchResult:
+    node_group: str
+    greedy_nodes: List[str]
+    best_nodes: List[str]
+    evaluations: int
+    complete: bool
+
+    def __init__(self, node_group, greedy_nodes, best_nodes, evaluations, complete):
+        self.node_group = node_group
+        self.greedy_nodes = greedy_nodes
+        self.best_nodes = best_nodes
+        self.evaluations = evaluations
+        self.complete = complete
+
+
+# optimistic upper bound of how many of the candidate nodes could still be removed: the remaining nodes must
+# at least offer enough aggregate capacity (per resource) for everything currently running in the group
+def _removal_bound(capacities: List[Tuple[float, ...]], kept_capacity: List[float], usage: List[float]) -> int:
+    bound = len(capacities)
+    for resource in range(len(usage)):
+        spare = kept_capacity[resource] - usage[resource]
+        removable = 0
+        for capacity in sorted(candidate[resource] for candidate in capacities):
+            if capacity > spare:
+                break
+            spare -= capacity
+            removable += 1
+        bound = min(bound, removable)
+    return bound
+
+
+# find the largest set of nodes that can be removed from a node group: a greedy pass first, followed by a
+# branch-and-bound search limited to max_evaluations simulated node removals
+def find_max_removable_nodes(cluster, node_group: GanetiNodeGroup, max_evaluations: int = 500) -> GanetiCapacitySearchResult:
+    nodes = cluster.get_nodes_by_group(node_group)
+    usage = [0.0, 0.0, 0.0, 0.0]
+    kept_capacity = [0.0, 0.0, 0.0, 0.0]
+    for node in nodes:
+        for resource, (used, capacity) in enumerate(zip(cluster._get_node_usage(node), cluster._get_node_capacity(node))):
+            usage[resource] += used
+            kept_capacity[resource] += capacity
+
+    # least utilized nodes are the most promising candidates
+    def utilization(node: GanetiNode) -> float:
+        return max(used / total if total > 0 else 1.0 for used, total in zip(cluster._get_node_usage(node), cluster._get_node_capacity(node)))
+    candidates = sorted(nodes, key=utilization)
+    capacities = [cluster._get_node_capacity(node) for node in candidates]
+
+    evaluations = 0
+
+    # removals build on top of each other, so every simulation only has to move the instances of one more node
+    def try_remove(node: GanetiNode) -> bool:
+        nonlocal evaluations
+        evaluations += 1
+        try:
+            cluster.remove_node(node.name)
+            return True
+        except Exception:
+            return False
+
+    with cluster.silenced():
+        greedy_nodes = []
+        cluster.begin()
+        for node in candidates:
+            if try_remove(node):
+                greedy_nodes.append(node.name)
+        cluster.rollback()
+
+        best_nodes = list(greedy_nodes)
+        complete = True
+
+        def search(index: int, removed: List[str], kept: List[float]):
+            nonlocal best_nodes, complete
+            if len(removed) > len(best_nodes):
+                best_nodes = list(removed)
+            if index == len(candidates):
+                return
+            if len(removed) + _removal_bound(capacities[index:], kept, usage) <= len(best_nodes):
+                return
+            if evaluations >= max_evaluations:
+                complete = False
+                return
+
+            node = candidates[index]
+            cluster.begin()
+            if try_remove(node):
+                search(index + 1, removed + [node.name], [total - capacity for total, capacity in zip(kept, capacities[index])])
+            cluster.rollback()
+            search(index + 1, removed, kept)
+
+        search(0, [], kept_capacity)
+
+    return GanetiCapacitySearchResult(node_group.name, greedy_nodes, best_nodes, evaluations, complete)
@@ -0,0 +1,308 @@
+#!/usr/bin/python3
+import io
+import json
+import os
+import signal
+import socketserver
+import sys
+import time
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from ganeti_parser.GanetiCluster import GanetiCluster
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.allocation import parse_ispec, simulate_allocations
+from ganeti_parser.output import OUTPUT_FORMATS, write_node_removal
+from ganeti_parser.parser import GROUPS, INSTANCES, NODES, POLICIES, TAGS, iter_sections, parse_data, parse_instance_fields, parse_node_fields
+from ganeti_parser.placement import PLACEMENT_STRATEGIES
+
+# content types of the answers per --format
+CONTENT_TYPES = {
+    "table": "text/plain; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "prometheus": "text/plain; version=0.0.4; charset=utf-8",
+}
+
+# sections which are cheap to diff line by line, a change anywhere else rebuilds the whole cluster
+INCREMENTAL_SECTIONS = (NODES, INSTANCES)
+
+
+# the lines of every section of a data file, keyed by their first field (the name of the group, node, instance, ...)
+def _read_sections(content: str) -> List[Dict[str, str]]:
+    sections = [{}, {}, {}, {}, {}]
+    for current_section, fields in iter_sections(io.StringIO(content)):
+        sections[current_section][fields[0]] = "|".join(fields)
+    return sections
+
+
+# Keeps a parsed cluster state in memory and brings it up to date when the data file changes. Changed, added
+# and removed node and instance lines are applied to the existing cluster (the instances of all other lines
+# keep their resource ledger and indexes), any other change parses the whole file again. Queries never change
+# the state: every one of them runs inside a transaction which is rolled back afterwards.
+class GanetiClusterDaemon:
+    filename: str
+    cluster: GanetiCluster
+    reporter: GanetiReporter
+    placement: str
+    evacuation_order: str
+    allocation_tags: List[str]
+    reloads: int
+    full_reloads: int
+
+    def __init__(self, filename: str, reporter: GanetiReporter = None, placement: str = "first-fit", evacuation_order: str = "file", allocation_tags: List[str] = None):
+        self.filename = filename
+        self.reporter = reporter if reporter else GanetiReporter()
+        self.placement = placement
+        self.evacuation_order = evacuation_order
+        self.allocation_tags = allocation_tags
+        self.cluster = None
+        self.reloads = 0
+        self.full_reloads = 0
+        self._sections = None
+        self._signature = None
+        self.check()
+
+    # modification time and size of the data file
+    def _stat(self) -> Tuple[int, int]:
+        stat = os.stat(self.filename)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    # reload the data file if it has changed since it was read last (returns whether it was reloaded)
+    def check(self) -> bool:
+        # the signature is taken before reading, a change while reading is picked up by the next check
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        with open(self.filename, "r") as file:
+            content = file.read()
+        self._signature = signature
+
+        start = time.perf_counter()
+        sections = _read_sections(content)
+        if self._sections is None or any(
+            list(sections[section].items()) != list(self._sections[section].items())
+            for section in (GROUPS, TAGS, POLICIES)
+        ):
+            self._load(content)
+            self.full_reloads += 1
+            kind = "full"
+        else:
+            self._apply_changes(sections)
+            kind = "incremental"
+        self._sections = sections
+        self.reloads += 1
+        self.reporter.summary(
+            "reload", "Loaded {filename} ({kind}, {seconds:.3f}s): {nodes} Nodes, {instances} Instances", filename=self.filename,
+            kind=kind, seconds=time.perf_counter() - start, nodes=len(self.cluster.nodes), instances=len(self.cluster.instances)
+        )
+        return True
+
+    def _load(self, content: str):
+        cluster = parse_data(io.StringIO(content), reporter=GanetiReporter(level=GanetiReporter.SILENT))
+        cluster.placement = PLACEMENT_STRATEGIES[self.placement]()
+        cluster.evacuation_order = self.evacuation_order
+        if self.allocation_tags is not None:
+            cluster.set_allocation_tags(self.allocation_tags)
+        self.cluster = cluster
+
+    # apply the changed node and instance lines to the loaded cluster
+    def _apply_changes(self, sections: List[Dict[str, str]]):
+        cluster = self.cluster
+        changes = {}
+        for section in INCREMENTAL_SECTIONS:
+            old_lines, new_lines = self._sections[section], sections[section]
+            removed = [name for name, line in old_lines.items() if new_lines.get(name) != line]
+            added = [line for name, line in new_lines.items() if old_lines.get(name) != line]
+            changes[section] = (removed, added)
+
+        removed_instances, added_instances = changes[INSTANCES]
+        removed_nodes, added_nodes = changes[NODES]
+        if removed_instances:
+            instances_by_name = {instance.name: instance for instance in cluster.instances}
+            for name in removed_instances:
+                cluster._unregister_instance(instances_by_name[name])
+        for name in removed_nodes:
+            cluster._unregister_node(cluster.nodes_by_name[name])
+        for line in added_nodes:
+            cluster.add_node(*parse_node_fields(line.split("|")))
+        for line in added_instances:
+            cluster.add_instance(*parse_instance_fields(line.split("|")))
+
+        # new and changed lines have been appended, restore the order of the file (the evacuation order depends on it)
+        if added_nodes:
+            positions = {name: position for position, name in enumerate(sections[NODES])}
+            cluster.nodes.sort(key=lambda node: positions[node.name])
+            for group_nodes in cluster.nodes_by_group.values():
+                group_nodes.sort(key=lambda node: positions[node.name])
+        if added_instances:
+            positions = {name: position for position, name in enumerate(sections[INSTANCES])}
+            touched_nodes = set()
+            for instance in cluster.instances[-len(added_instances):]:
+                touched_nodes.update((instance.pnode, instance.snodes))
+            cluster.instances.sort(key=lambda instance: positions[instance.name])
+            cluster._instance_positions = {instance.name: position for position, instance in enumerate(cluster.instances)}
+            for index in (cluster.instances_by_pnode, cluster.instances_by_snode):
+                for node_name in touched_nodes:
+                    if node_name in index:
+                        index[node_name].sort(key=lambda instance: positions[instance.name])
+        self.reporter.decision(
+            "reload", "Applied {nodes} changed node lines and {instances} changed instance lines",
+            nodes=len(set(removed_nodes) | {line.split("|")[0] for line in added_nodes}),
+            instances=len(set(removed_instances) | {line.split("|")[0] for line in added_instances})
+        )
+
+    # queries
+
+    def status(self) -> dict:
+        return {
+            "filename": self.filename,
+            "node_groups": len(self.cluster.node_groups),
+            "nodes": len(self.cluster.nodes),
+            "instances": len(self.cluster.instances),
+            "reloads": self.reloads,
+            "full_reloads": self.full_reloads,
+        }
+
+    def dump(self, output_format: str) -> str:
+        stream = io.StringIO()
+        if output_format == "table":
+            with redirect_stdout(stream):
+                self.cluster.dump_cluster()
+        else:
+            OUTPUT_FORMATS[output_format](stream).write_nodes(self.cluster)
+        return stream.getvalue()
+
+    def remove(self, node_names: List[str], output_format: str) -> str:
+        stream = io.StringIO()
+        self.cluster.begin()
+        try:
+            write_node_removal(OUTPUT_FORMATS[output_format](stream), self.cluster, node_names)
+        finally:
+            self.cluster.rollback()
+        return stream.getvalue()
+
+    def allocate(self, ispec: Tuple[int, int, int, int] = None, disk_template: str = "drbd", max_instances: int = None) -> List[dict]:
+        return [{
+            "node_group": result.node_group,
+            "ispec": list(result.ispec),
+            "disk_template": result.disk_template,
+            "allocated": result.allocated,
+            "limiting_resource": result.limiting_resource,
+            "primaries": result.primaries,
+        } for result in simulate_allocations(self.cluster, ispec, disk_template, max_instances)]
+
+
+# a query the client got wrong (a missing or malformed parameter, an unknown node, ...), answered with 400
+class _QueryError(Exception):
+    pass
+
+
+# parse an optional query parameter, a value which can not be parsed is a client error
+def _parse_parameter(query: Dict[str, str], name: str, parse):
+    if not query.get(name):
+        return None
+    try:
+        return parse(query[name])
+    except Exception as e:
+        raise _QueryError("Invalid parameter {}: {}".format(name, e))
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = "ganeti-parser"
+
+    def log_message(self, format, *args):
+        self.server.daemon.reporter.trace("request", "{request}", request=format % args)
+
+    def _respond(self, status: int, body: str, content_type: str = "application/json"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _answer(self, daemon: GanetiClusterDaemon, path: str, query: Dict[str, str]):
+        output_format = query.get("format", "jsonl")
+        if path in ("/dump", "/remove") and (output_format not in CONTENT_TYPES or (path == "/remove" and output_format == "table")):
+            raise _QueryError("Unsupported format {}".format(output_format))
+        if path == "/status":
+            self._respond(200, json.dumps(daemon.status()) + "\n")
+        elif path == "/dump":
+            self._respond(200, daemon.dump(output_format), CONTENT_TYPES[output_format])
+        elif path == "/remove":
+            if not query.get("nodes"):
+                raise _QueryError("Missing parameter nodes")
+            node_names = query["nodes"].split(",")
+            unknown_nodes = [node_name for node_name in node_names if node_name not in daemon.cluster.nodes_by_name]
+            if unknown_nodes:
+                raise _QueryError("Unknown nodes {}".format(", ".join(unknown_nodes)))
+            self._respond(200, daemon.remove(node_names, output_format), CONTENT_TYPES[output_format])
+        elif path == "/allocate":
+            ispec = _parse_parameter(query, "ispec", parse_ispec)
+            max_instances = _parse_parameter(query, "max_instances", int)
+            self._respond(200, json.dumps(daemon.allocate(ispec, query.get("disk_template", "drbd"), max_instances)) + "\n")
+        else:
+            self._respond(404, json.dumps({"error": "Unknown path {}".format(path)}) + "\n")
+
+    def do_GET(self):
+        daemon = self.server.daemon
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        start = time.perf_counter()
+        try:
+            # always answer from the current state of the data file
+            daemon.check()
+            self._answer(daemon, url.path, query)
+        except _QueryError as e:
+            self._respond(400, json.dumps({"error": str(e)}) + "\n")
+        except Exception as e:
+            self._respond(500, json.dumps({"error": str(e)}) + "\n")
+        daemon.reporter.decision("query", "Answered {path} in {seconds:.3f}s", path=url.path, seconds=time.perf_counter() - start)
+
+
+# the data file is checked for changes between requests as well, so a reload rarely delays an answer
+class _WatchingServer:
+    daemon: GanetiClusterDaemon
+
+    def service_actions(self):
+        try:
+            self.daemon.check()
+        except Exception as e:
+            self.daemon.reporter.summary("reload", "Failed to reload {filename}: {error}", filename=self.daemon.filename, error=str(e), ok=False)
+
+
+class _HTTPServer(_WatchingServer, HTTPServer):
+    pass
+
+
+class _UnixHTTPServer(_WatchingServer, socketserver.UnixStreamServer):
+    pass
+
+
+# Answer queries over HTTP until interrupted. listen is either "host:port" or "unix:/path/to/socket". Requests
+# are handled one at a time, the cluster state is never shared between threads.
+def serve(daemon: GanetiClusterDaemon, listen: str, watch_interval: float = 1.0):
+    if listen.startswith("unix:"):
+        path = listen[len("unix:"):]
+        if os.path.exists(path):
+            os.unlink(path)
+        server = _UnixHTTPServer(path, _RequestHandler)
+    else:
+        host, _, port = listen.rpartition(":")
+        server = _HTTPServer((host, int(port)), _RequestHandler)
+    server.daemon = daemon
+
+    # stop cleanly (and remove the socket) when terminated by a service manager
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    daemon.reporter.summary("listen", "Answering queries on {listen}", listen=listen)
+    try:
+        server.serve_forever(poll_interval=watch_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if listen.startswith("unix:"):
+            os.unlink(listen[len("unix:"):])
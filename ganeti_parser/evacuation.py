@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+from typing import Callable, Dict, List
+
+from ganeti_parser.GanetiInstance import GanetiInstance
+
+# Evacuation orders decide in which order the instances of a node are moved away. Moving the largest
+# instances first (first-fit-decreasing) usually packs tightly filled node groups better than the order of
+# the cluster state file.
+
+
+def _file_order(cluster, instances: List[GanetiInstance]) -> Callable[[GanetiInstance], tuple]:
+    return lambda instance: cluster._instance_positions[instance.name]
+
+
+def _memory_order(cluster, instances: List[GanetiInstance]) -> Callable[[GanetiInstance], tuple]:
+    return lambda instance: (-instance.memory_size, cluster._instance_positions[instance.name])
+
+
+def _disk_order(cluster, instances: List[GanetiInstance]) -> Callable[[GanetiInstance], tuple]:
+    return lambda instance: (-instance.local_disk_size(), cluster._instance_positions[instance.name])
+
+
+# dominant resource: the largest share of the node group's total capacity (memory, disk, vCPUs or spindles)
+# an instance occupies
+def _dominant_order(cluster, instances: List[GanetiInstance]) -> Callable[[GanetiInstance], tuple]:
+    totals = [0.0, 0.0, 0.0, 0.0]
+    if instances:
+        node_group = cluster._get_node_group_from_instance(instances[0])
+        for node in cluster.get_nodes_by_group(node_group):
+            for resource, capacity in enumerate(cluster._get_node_capacity(node)):
+                totals[resource] += capacity
+
+    def dominant_share(instance: GanetiInstance) -> float:
+        demand = (instance.memory_size, instance.local_disk_size(), instance.vcpus, instance.spindles)
+        return max(needed / total if total > 0 else 0.0 for needed, total in zip(demand, totals))
+
+    return lambda instance: (-dominant_share(instance), cluster._instance_positions[instance.name])
+
+
+EVACUATION_ORDERS: Dict[str, Callable] = {
+    "file": _file_order,
+    "memory": _memory_order,
+    "disk": _disk_order,
+    "dominant": _dominant_order,
+}
+
+
+# all instances using the given node as primary or secondary, in the given evacuation order
+def plan_evacuation(cluster, node_name: str, order: str = "file") -> List[GanetiInstance]:
+    instances = cluster.instances_by_pnode.get(node_name, []) + cluster.instances_by_snode.get(node_name, [])
+    return sorted(instances, key=EVACUATION_ORDERS[order](cluster, instances))
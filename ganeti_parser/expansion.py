@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+from typing import List, Set, Tuple
+
+from ganeti_parser.GanetiNodeGroup import GanetiNodeGroup
+from ganeti_parser.allocation import simulate_allocation
+from ganeti_parser.redundancy import verify_group_redundancy
+
+# upper limit of nodes which are added to a node group while searching
+DEFAULT_MAX_NEW_NODES = 64
+
+
+class GanetiExpansionResult:
+    node_group: str
+    profile: Tuple[int, int, int, int]
+    nodes_needed: int
+    probes: int
+    violations_before: int
+
+    def __init__(self, node_group, profile, nodes_needed, probes, violations_before):
+        self.node_group = node_group
+        self.profile = profile
+        self.nodes_needed = nodes_needed
+        self.probes = probes
+        self.violations_before = violations_before
+
+
+# parse a node hardware profile given as "memory,disk,cpus[,spindles]" (memory and disk in MB, like `hscan`)
+def parse_node_profile(value: str) -> Tuple[int, int, int, int]:
+    fields = [int(field) for field in value.split(",")]
+    if len(fields) not in (3, 4):
+        raise Exception("Invalid node profile {}, expected memory,disk,cpus[,spindles]".format(value))
+    return tuple(fields) if len(fields) == 4 else (fields[0], fields[1], fields[2], 1)
+
+
+# the hardware of the first node of a node group (the parser already took the reserved memory off)
+def get_group_node_profile(cluster, node_group: GanetiNodeGroup) -> Tuple[int, int, int, int]:
+    nodes = cluster.get_nodes_by_group(node_group)
+    if not nodes:
+        raise Exception("Node group {} has no nodes".format(node_group.name))
+    node = nodes[0]
+    return (node.total_memory + 4096, node.total_disk, node.total_cpus, node.spindles)
+
+
+def _add_planned_nodes(cluster, node_group: GanetiNodeGroup, profile: Tuple[int, int, int, int], count: int):
+    for number in range(1, count + 1):
+        cluster.add_empty_node("planned-{}-{}".format(node_group.name, number), node_group, *profile)
+
+
+def _violation_keys(cluster, node_group: GanetiNodeGroup, failures: int) -> Set[tuple]:
+    return {
+        (violation.failed_nodes, violation.node, violation.resource)
+        for violation in verify_group_redundancy(cluster, node_group, failures)
+    }
+
+
+# Find the smallest number of nodes of the given hardware profile which have to be added to a node group so
+# that the given nodes can be removed and/or the given number of instances of the given spec can be allocated
+# (see simulate_allocation()) without causing new N+k redundancy violations (violations which exist already
+# can not be fixed by adding empty nodes and are ignored). Instances are only placed where N+1 redundancy is
+# kept (GanetiCluster.keep_redundancy), otherwise they would fill up the existing nodes first; an instance whose
+# secondary node already violates N+1 gets a new secondary node together with its new primary. Every probe adds
+# the nodes to the same parsed state and is rolled back afterwards. The number is searched by doubling it until
+# a probe succeeds, followed by a binary search between the last failing and the first succeeding count, so only
+# a handful of probes is needed (placements are not strictly monotonic in the number of nodes, the result is the
+# smallest count found this way). nodes_needed is None if even max_new_nodes nodes are not enough.
+def plan_node_additions(cluster, node_group: GanetiNodeGroup, profile: Tuple[int, int, int, int], node_names: List[str] = None,
+                        ispec: Tuple[int, int, int, int] = None, disk_template: str = "drbd", instances: int = None,
+                        failures: int = 1, max_new_nodes: int = DEFAULT_MAX_NEW_NODES) -> GanetiExpansionResult:
+    if not node_names and not ispec:
+        raise Exception("Nothing to plan for, give nodes to remove or an instance spec to allocate")
+    if ispec and not instances:
+        raise Exception("Please give the number of instances to allocate")
+
+    reporter = cluster.reporter
+    baseline = _violation_keys(cluster, node_group, failures)
+    probes = 0
+
+    def probe(count: int) -> bool:
+        nonlocal probes
+        probes += 1
+        cluster.begin()
+        try:
+            _add_planned_nodes(cluster, node_group, profile, count)
+            if node_names:
+                cluster.remove_nodes(node_names)
+            if ispec and simulate_allocation(cluster, node_group, ispec, disk_template, instances, keep_instances=True).allocated < instances:
+                success = False
+            else:
+                success = _violation_keys(cluster, node_group, failures) <= baseline
+        except Exception:
+            success = False
+        finally:
+            cluster.rollback()
+        reporter.decision(
+            "probe", "Probe with {count} additional nodes in {node_group}: {status}", count=count, node_group=node_group.name,
+            status="ok" if success else "failed", ok=success
+        )
+        return success
+
+    keep_redundancy = cluster.keep_redundancy
+    cluster.keep_redundancy = True
+    try:
+        with cluster.silenced():
+            if probe(0):
+                return GanetiExpansionResult(node_group.name, profile, 0, probes, len(baseline))
+
+            failing, succeeding = 0, 1
+            while not probe(succeeding):
+                failing = succeeding
+                if succeeding == max_new_nodes:
+                    return GanetiExpansionResult(node_group.name, profile, None, probes, len(baseline))
+                succeeding = min(succeeding * 2, max_new_nodes)
+
+            while succeeding - failing > 1:
+                middle = (failing + succeeding) // 2
+                if probe(middle):
+                    succeeding = middle
+                else:
+                    failing = middle
+    finally:
+        cluster.keep_redundancy = keep_redundancy
+
+    return GanetiExpansionResult(node_group.name, profile, succeeding, probes, len(baseline))
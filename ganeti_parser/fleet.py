@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+import csv
+import json
+import multiprocessing
+import os
+from typing import List, TextIO, Tuple
+
+from ganeti_parser.cache import load_datafile
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.redundancy import verify_group_redundancy
+
+FLEET_COLUMNS = [
+    "scope", "cluster", "node_group", "nodes", "instances", "memory", "disk", "cpu", "spindles",
+    "failn1_memory", "failn1_cpu", "failn1_spindles", "violations"
+]
+
+
+class GanetiFleetCluster:
+    name: str
+    filename: str
+    error: str
+    # per node group: (name, nodes, instances, usage, capacity, worst Fail-N-1 usage, N+k violations)
+    node_groups: List[tuple]
+
+    def __init__(self, name, filename, error, node_groups):
+        self.name = name
+        self.filename = filename
+        self.error = error
+        self.node_groups = node_groups
+
+
+# Unique names of the clusters: the paths of their data files relative to the directory all of them are in.
+# For a flat directory this is the file name, for one directory per cluster (`hscan -L` always writes
+# LOCAL.data) the directory name is part of it.
+def get_cluster_names(filenames: List[str]) -> List[str]:
+    if not filenames:
+        return []
+    paths = [os.path.abspath(filename) for filename in filenames]
+    common_directory = os.path.commonpath([os.path.dirname(path) for path in paths])
+    return [os.path.relpath(path, common_directory) for path in paths]
+
+
+# usage and N+k redundancy of every node group of a single cluster (runs inside a worker process)
+def _analyse_cluster(task: Tuple[str, str, bool, int]) -> GanetiFleetCluster:
+    name, filename, use_cache, failures = task
+    try:
+        cluster = load_datafile(filename, reporter=GanetiReporter(level=GanetiReporter.SILENT), use_cache=use_cache)
+        failn1 = cluster._get_max_failn1_used_percentages()
+        node_groups = []
+        for node_group in cluster.node_groups:
+            nodes = cluster.get_nodes_by_group(node_group)
+            usage, capacity, worst_failn1 = cluster._get_node_group_usage(node_group, failn1)
+            node_groups.append((
+                node_group.name, len(nodes), len(cluster.get_instances_by_nodes(nodes)), usage, capacity, worst_failn1,
+                len(verify_group_redundancy(cluster, node_group, failures))
+            ))
+    except Exception as e:
+        # a single broken file should not hide the state of the rest of the fleet
+        return GanetiFleetCluster(name, filename, str(e), [])
+    return GanetiFleetCluster(name, filename, None, node_groups)
+
+
+# Parse and analyse the data files of many clusters in parallel (one task per file, results in file order).
+def analyse_fleet(filenames: List[str], processes: int = None, use_cache: bool = True, failures: int = 1) -> List[GanetiFleetCluster]:
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes=processes) as pool:
+        tasks = [(name, filename, use_cache, failures) for name, filename in zip(get_cluster_names(filenames), filenames)]
+        return pool.map(_analyse_cluster, tasks, chunksize=1)
+
+
+def _row(scope: str, cluster: str, node_group: str, node_groups: List[tuple]) -> tuple:
+    usage = [0.0, 0.0, 0.0, 0.0]
+    capacity = [0.0, 0.0, 0.0, 0.0]
+    worst_failn1 = [0, 0, 0]
+    for _, _, _, group_usage, group_capacity, group_failn1, _ in node_groups:
+        usage = [total + used for total, used in zip(usage, group_usage)]
+        capacity = [total + available for total, available in zip(capacity, group_capacity)]
+        worst_failn1 = [max(worst, percentage) for worst, percentage in zip(worst_failn1, group_failn1)]
+    return tuple(
+        [scope, cluster, node_group, sum(group[1] for group in node_groups), sum(group[2] for group in node_groups)] +
+        [int(used / total * 100) if total else 0 for used, total in zip(usage, capacity)] +
+        worst_failn1 + [sum(group[6] for group in node_groups)]
+    )
+
+
+# one row (FLEET_COLUMNS) per node group, per cluster (all of its node groups) and for the whole fleet; usage
+# percentages are aggregated over the capacity of all nodes, Fail-N-1 usage is the worst of any node
+def get_fleet_rows(clusters: List[GanetiFleetCluster]) -> List[tuple]:
+    rows = []
+    fleet_node_groups = []
+    for cluster in clusters:
+        for node_group in cluster.node_groups:
+            rows.append(_row("group", cluster.name, node_group[0], [node_group]))
+        if not cluster.error:
+            rows.append(_row("cluster", cluster.name, "", cluster.node_groups))
+        fleet_node_groups.extend(cluster.node_groups)
+    rows.append(_row("fleet", "", "", fleet_node_groups))
+    return rows
+
+
+def write_fleet_csv(stream: TextIO, rows: List[tuple]):
+    writer = csv.writer(stream)
+    writer.writerow(FLEET_COLUMNS)
+    writer.writerows(rows)
+
+
+def write_fleet_json(stream: TextIO, rows: List[tuple], clusters: List[GanetiFleetCluster]):
+    json.dump({
+        "rows": [dict(zip(FLEET_COLUMNS, row)) for row in rows],
+        "errors": {cluster.name: cluster.error for cluster in clusters if cluster.error},
+    }, stream, indent=2)
+    stream.write("\n")
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+import random
+from typing import List
+
+from ganeti_parser.GanetiInstance import MIRRORED_DISK_TEMPLATES
+
+# hardware of the generated nodes
+NODE_MEMORY = 262144
+NODE_DISK = 4194304
+NODE_CPUS = 32
+NODE_SPINDLES = 12
+
+
+# Write a synthetic cluster state file in the format of `hscan -L`. Every node group gets nodes_per_group
+# identical nodes and about instances_per_node primary instances per node. The instance sizes are chosen so
+# that the nodes end up filled to roughly `fill` (0.0 - 1.0) of their memory and disk. A share of tag_ratio
+# instances carries one of a few exclusion tags (`a:serviceN`).
+def generate_datafile(filename: str, groups: int = 1, nodes_per_group: int = 10, instances_per_node: int = 8,
+                      disk_templates: List[str] = None, tag_ratio: float = 0.1, fill: float = 0.6, seed: int = 0):
+    generator = random.Random(seed)
+    disk_templates = disk_templates if disk_templates else ["drbd"]
+
+    # the parser reserves 4096MB of every node's memory
+    average_memory = (NODE_MEMORY - 4096) * fill / instances_per_node
+    # mirrored instances occupy disk space on two nodes
+    average_disk = NODE_DISK * fill / instances_per_node / 2
+
+    group_lines = []
+    node_lines = []
+    instance_lines = []
+    policy_lines = ["|128,1,1024,1,1,1|128,1,1024,1,1,1;32768,8,1048576,16,8,12|{}|4.0|32.0".format(",".join(disk_templates))]
+
+    instance_counter = 0
+    for group_number in range(groups):
+        group_name = "group{:02d}".format(group_number) if group_number else "default"
+        group_uuid = "00000000-0000-4000-8000-{:012d}".format(group_number)
+        group_lines.append("{}|{}|preferred||".format(group_name, group_uuid))
+        policy_lines.append("{}|128,1,1024,1,1,1|128,1,1024,1,1,1;32768,8,1048576,16,8,12|{}|4.0|32.0".format(group_name, ",".join(disk_templates)))
+
+        node_names = []
+        for node_number in range(nodes_per_group):
+            node_name = "node-{:02d}-{:04d}.example.com".format(group_number, node_number)
+            node_names.append(node_name)
+            node_lines.append("{}|{}|4096|{}|{}|{}|{}|N|{}|{}||N|{}|{}|1.0".format(
+                node_name, NODE_MEMORY, NODE_MEMORY - 4096, NODE_DISK, NODE_DISK, NODE_CPUS, group_uuid, NODE_SPINDLES, NODE_SPINDLES, NODE_CPUS
+            ))
+
+        for _ in range(nodes_per_group * instances_per_node):
+            instance_counter += 1
+            disk_template = generator.choice(disk_templates)
+            if disk_template in MIRRORED_DISK_TEMPLATES and len(node_names) > 1:
+                pnode, snode = generator.sample(node_names, 2)
+            else:
+                pnode, snode = generator.choice(node_names), ""
+            memory = max(512, int(average_memory * generator.choice([0.5, 1.0, 1.5]) / 512) * 512)
+            disk = 0 if disk_template == "diskless" else max(1024, int(average_disk * generator.choice([0.5, 1.0, 1.5]) / 1024) * 1024)
+            tags = "a:service{}".format(generator.randint(1, 5)) if generator.random() < tag_ratio else ""
+            instance_lines.append("instance{:06d}.example.com|{}|{}|{}|running|Y|{}|{}|{}|{}|1|-|N".format(
+                instance_counter, memory, disk, generator.choice([1, 2, 4, 8]), pnode, snode, disk_template, tags
+            ))
+
+    # sections are separated by empty lines, the cluster tags section stays empty
+    with open(filename, "w") as file:
+        for section in [group_lines, node_lines, instance_lines, [], policy_lines]:
+            if section:
+                file.write("\n".join(section) + "\n")
+            if section is not policy_lines:
+                file.write("\n")
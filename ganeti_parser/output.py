@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+import csv
+import json
+from typing import Dict, Iterable, List, TextIO
+
+from ganeti_parser.GanetiEvacuationError import GanetiEvacuationError
+
+# Machine readable writers for the node usage figures of dump_cluster() and the results of node removals. Rows
+# are written one at a time as they are computed by GanetiCluster.iter_node_usage(), nothing is collected.
+
+# columns of GanetiCluster.iter_node_usage()
+NODE_USAGE_COLUMNS = [
+    "node_group", "node", "primary_instances", "secondary_instances", "memory", "disk", "cpu", "spindles",
+    "failn1_memory", "failn1_memory_by", "failn1_cpu", "failn1_cpu_by", "failn1_spindles", "failn1_spindles_by"
+]
+MOVE_COLUMNS = ["instance", "move", "old_pnode", "old_snode", "new_pnode", "new_snode"]
+REMOVAL_COLUMNS = ["nodes", "success", "failovers", "failed_instance", "error"]
+
+
+# kind of an instance move from the old to the new primary/secondary nodes
+def move_kind(old_pnode: str, old_snode: str, new_pnode: str, new_snode: str) -> str:
+    if (new_pnode, new_snode) == (old_snode, old_pnode):
+        return "failover"
+    if new_pnode != old_pnode and new_snode != old_snode:
+        return "primary+secondary"
+    return "primary" if new_pnode != old_pnode else "secondary"
+
+
+# move rows (MOVE_COLUMNS) of the instances moved since the outermost GanetiCluster.begin()
+def iter_moves(cluster) -> Iterable[tuple]:
+    for instance, old_pnode, old_snode in cluster.get_moved_instances():
+        yield (instance.name, move_kind(old_pnode, old_snode, instance.pnode, instance.snodes), old_pnode, old_snode, instance.pnode, instance.snodes)
+
+
+# remove the nodes and write the outcome, the instance moves and the resulting node usage (the caller has to wrap
+# this in a transaction, the moves are taken from its journal)
+def write_node_removal(writer, cluster, node_names: List[str]):
+    try:
+        failovers = cluster.remove_nodes(node_names)
+        writer.write_removal((",".join(node_names), True, failovers, None, None))
+    except GanetiEvacuationError as e:
+        writer.write_removal((",".join(node_names), False, None, e.instance_name, str(e)))
+    except Exception as e:
+        writer.write_removal((",".join(node_names), False, None, None, str(e)))
+    writer.write_moves(iter_moves(cluster))
+    writer.write_nodes(cluster)
+
+
+class OutputWriter:
+    name = ""
+
+    stream: TextIO
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def write_nodes(self, cluster):
+        raise NotImplementedError
+
+    def write_moves(self, moves: Iterable[tuple]):
+        raise NotImplementedError
+
+    # the outcome of a node removal (REMOVAL_COLUMNS)
+    def write_removal(self, removal: tuple):
+        raise NotImplementedError
+
+
+class JsonLinesWriter(OutputWriter):
+    name = "jsonl"
+
+    def _write_record(self, record: str, columns: List[str], row: tuple):
+        data = {"record": record}
+        data.update(zip(columns, row))
+        self.stream.write(json.dumps(data) + "\n")
+
+    def write_nodes(self, cluster):
+        for row in cluster.iter_node_usage():
+            self._write_record("node", NODE_USAGE_COLUMNS, row)
+
+    def write_moves(self, moves: Iterable[tuple]):
+        for row in moves:
+            self._write_record("move", MOVE_COLUMNS, row)
+
+    def write_removal(self, removal: tuple):
+        self._write_record("removal", REMOVAL_COLUMNS, removal)
+
+
+class CsvWriter(OutputWriter):
+    name = "csv"
+
+    # a single table for all records: every record only fills its own columns
+    COLUMNS = ["record"] + NODE_USAGE_COLUMNS + [column for column in MOVE_COLUMNS + REMOVAL_COLUMNS if column not in NODE_USAGE_COLUMNS]
+
+    def __init__(self, stream: TextIO):
+        super().__init__(stream)
+        self.writer = csv.writer(stream)
+        self.writer.writerow(self.COLUMNS)
+
+    def _write_record(self, record: str, columns: List[str], row: tuple):
+        values = dict(zip(columns, row))
+        values["record"] = record
+        self.writer.writerow([values.get(column, "") for column in self.COLUMNS])
+
+    def write_nodes(self, cluster):
+        for row in cluster.iter_node_usage():
+            self._write_record("node", NODE_USAGE_COLUMNS, row)
+
+    def write_moves(self, moves: Iterable[tuple]):
+        for row in moves:
+            self._write_record("move", MOVE_COLUMNS, row)
+
+    def write_removal(self, removal: tuple):
+        self._write_record("removal", REMOVAL_COLUMNS, removal)
+
+
+class PrometheusWriter(OutputWriter):
+    name = "prometheus"
+
+    # metric name: (column, column of the failed node label, help text)
+    NODE_METRICS = [
+        ("ganeti_node_primary_instances", "primary_instances", None, "Number of primary instances on the node"),
+        ("ganeti_node_secondary_instances", "secondary_instances", None, "Number of secondary instances on the node"),
+        ("ganeti_node_memory_used_percent", "memory", None, "Memory used by primary instances (percent)"),
+        ("ganeti_node_disk_used_percent", "disk", None, "Disk used by primary and secondary instances (percent)"),
+        ("ganeti_node_cpu_used_percent", "cpu", None, "vCPUs used by primary instances (percent of the over-subscribed CPUs)"),
+        ("ganeti_node_spindles_used_percent", "spindles", None, "Spindles used by primary instances (percent of the over-subscribed spindles)"),
+        ("ganeti_node_failn1_memory_used_percent", "failn1_memory", "failn1_memory_by", "Memory used after the worst case failure of another node (percent)"),
+        ("ganeti_node_failn1_cpu_used_percent", "failn1_cpu", "failn1_cpu_by", "vCPUs used after the worst case failure of another node (percent)"),
+        ("ganeti_node_failn1_spindles_used_percent", "failn1_spindles", "failn1_spindles_by", "Spindles used after the worst case failure of another node (percent)"),
+    ]
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> str:
+        return ",".join('{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"')) for name, value in labels.items())
+
+    def _write_header(self, metric: str, help_text: str):
+        self.stream.write("# HELP {} {}\n# TYPE {} gauge\n".format(metric, help_text, metric))
+
+    def _write_sample(self, metric: str, labels: Dict[str, str], value):
+        self.stream.write("{}{{{}}} {}\n".format(metric, self._labels(labels), int(value) if isinstance(value, bool) else value))
+
+    # all samples of a metric have to be written together, so the (cheap) node rows are computed once per metric
+    def write_nodes(self, cluster):
+        failn1 = cluster._get_max_failn1_used_percentages()
+        for metric, column, failed_node_column, help_text in self.NODE_METRICS:
+            self._write_header(metric, help_text)
+            position = NODE_USAGE_COLUMNS.index(column)
+            failed_node_position = NODE_USAGE_COLUMNS.index(failed_node_column) if failed_node_column else None
+            for row in cluster.iter_node_usage(failn1):
+                labels = {"node_group": row[0], "node": row[1]}
+                if failed_node_position is not None:
+                    labels["failed_node"] = row[failed_node_position]
+                self._write_sample(metric, labels, row[position])
+
+    def write_moves(self, moves: Iterable[tuple]):
+        self._write_header("ganeti_instance_move", "Instance moves necessary for the node removal")
+        for instance, kind, old_pnode, old_snode, new_pnode, new_snode in moves:
+            self._write_sample("ganeti_instance_move", {
+                "instance": instance, "move": kind, "old_pnode": old_pnode, "old_snode": old_snode, "new_pnode": new_pnode, "new_snode": new_snode
+            }, 1)
+
+    def write_removal(self, removal: tuple):
+        nodes, success, failovers, failed_instance, error = removal
+        self._write_header("ganeti_node_removal_success", "Whether the nodes can be removed from the cluster")
+        self._write_sample("ganeti_node_removal_success", {"nodes": nodes, "failed_instance": failed_instance or ""}, success)
+        self._write_header("ganeti_node_removal_failovers", "Number of failovers necessary to remove the nodes")
+        self._write_sample("ganeti_node_removal_failovers", {"nodes": nodes}, failovers or 0)
+
+
+OUTPUT_FORMATS: Dict[str, type] = {
+    JsonLinesWriter.name: JsonLinesWriter,
+    CsvWriter.name: CsvWriter,
+    PrometheusWriter.name: PrometheusWriter,
+}
@@ -1,47 +1,80 @@
 #!/usr/bin/python
 
-from ganeti_parser.GanetiCluster import GanetiCluster
+from sys import intern
+from typing import Iterator, List, TextIO, Tuple
 
+from ganeti_parser.GanetiCluster import GanetiCluster
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.GanetiProfiler import GanetiProfiler
 
-def parse_datafile(filename: str):
-    file = open(filename, 'r')
-    lines = file.readlines()
+# bump this whenever the parser produces different results for the same input (invalidates cached states)
+PARSER_VERSION = 2
 
-    cluster = GanetiCluster(allocation_tag="a")
+# sections of a `hscan` data file (separated by empty lines)
+GROUPS = 0
+NODES = 1
+INSTANCES = 2
+TAGS = 3
+POLICIES = 4
 
-    GROUPS = 0
-    NODES = 1
-    INSTANCES = 2
-    TAGS = 3
-    POLICIES = 4
+# cluster tags like "htools:iextags:service" turn instance tags like "service:database" into exclusion tags
+EXCLUSION_TAGS_PREFIX = "htools:iextags:"
+# exclusion tag prefixes assumed if the cluster does not define any (also the example used by the Ganeti man pages)
+DEFAULT_ALLOCATION_TAGS = ["a"]
 
-    SECTIONS = [
-        GROUPS,
-        NODES,
-        INSTANCES,
-        TAGS,
-        POLICIES
-    ]
 
+# lazily walk through a data file and yield the split up lines together with the section they belong to
+def iter_sections(file: TextIO) -> Iterator[Tuple[int, List[str]]]:
     current_section = GROUPS
-    for line in lines:
+    for line in file:
         line = line.strip()
         if line == "":
-            current_section = SECTIONS[current_section + 1]
+            current_section += 1
         else:
-            if current_section == GROUPS:
-                name, uuid, policy, tags, networks = line.split("|")
-                cluster.add_node_group(name, uuid, policy, tags, networks)
-            elif current_section == NODES:
-                name, total_memory, used_memory, free_memory, total_disk, free_disk, total_cpus, status, group_uuid, spindles, tags, exclusive_storage, free_spindles, node_cpus, cpu_speed = line.split("|")
-                # we will substract 4096 off the node's total memory as that amount is reserved anyways and can not be used for instances
-                cluster.add_node(name, int(total_memory) - 4096, int(used_memory), int(free_memory), int(total_disk), int(free_disk), int(total_cpus), status, group_uuid, int(spindles), tags.split(","), exclusive_storage, int(free_spindles), int(node_cpus), cpu_speed)
-            elif current_section == INSTANCES:
-                name, memory_size, disk_size, vcpus, status, auto_balance, pnode, snodes, disk_template, tags, spindles, total_spindles, forthcoming = line.split("|")
-                cluster.add_instance(name, int(memory_size), int(disk_size), int(vcpus), status, auto_balance, pnode, snodes, disk_template, tags.split(","), int(spindles), total_spindles, forthcoming)
-            elif current_section == POLICIES:
-                owner, ispec, min_max_ispec, disk_templates, vcpu_ratio, spindle_ratio = line.split("|")
-                cluster.add_policy(owner, ispec, min_max_ispec, disk_templates.split(","), float(vcpu_ratio), float(spindle_ratio))
-    
+            yield current_section, line.split("|")
+
+
+# split a comma separated list and intern its elements (tags, disk templates, ... repeat a lot)
+def _intern_list(value: str) -> List[str]:
+    return [intern(element) for element in value.split(",")]
+
+
+# add_node() arguments of a line of the NODES section
+def parse_node_fields(fields: List[str]) -> tuple:
+    name, total_memory, used_memory, free_memory, total_disk, free_disk, total_cpus, status, group_uuid, spindles, tags, exclusive_storage, free_spindles, node_cpus, cpu_speed = fields
+    # we will substract 4096 off the node's total memory as that amount is reserved anyways and can not be used for instances
+    return (intern(name), int(total_memory) - 4096, int(used_memory), int(free_memory), int(total_disk), int(free_disk), int(total_cpus), intern(status), intern(group_uuid), int(spindles), _intern_list(tags), intern(exclusive_storage), int(free_spindles), int(node_cpus), intern(cpu_speed))
+
+
+# add_instance() arguments of a line of the INSTANCES section
+def parse_instance_fields(fields: List[str]) -> tuple:
+    name, memory_size, disk_size, vcpus, status, auto_balance, pnode, snodes, disk_template, tags, spindles, total_spindles, forthcoming = fields
+    return (name, int(memory_size), int(disk_size), int(vcpus), intern(status), intern(auto_balance), intern(pnode), intern(snodes), intern(disk_template), _intern_list(tags), int(spindles), intern(total_spindles), intern(forthcoming))
+
+
+def parse_datafile(filename: str, reporter: GanetiReporter = None, profiler: GanetiProfiler = None):
+    with open(filename, 'r') as file:
+        return parse_data(file, reporter=reporter, profiler=profiler)
+
+
+# parse the contents of a data file from an already opened file (or any other stream of lines)
+def parse_data(file: TextIO, reporter: GanetiReporter = None, profiler: GanetiProfiler = None):
+    cluster = GanetiCluster(reporter=reporter, profiler=profiler)
+
+    for current_section, fields in iter_sections(file):
+        if current_section == GROUPS:
+            name, uuid, policy, tags, networks = fields
+            cluster.add_node_group(intern(name), intern(uuid), intern(policy), tags, networks)
+        elif current_section == NODES:
+            cluster.add_node(*parse_node_fields(fields))
+        elif current_section == INSTANCES:
+            cluster.add_instance(*parse_instance_fields(fields))
+        elif current_section == TAGS:
+            cluster.add_cluster_tag(intern(fields[0]))
+        elif current_section == POLICIES:
+            owner, ispec, min_max_ispec, disk_templates, vcpu_ratio, spindle_ratio = fields
+            cluster.add_policy(intern(owner), ispec, min_max_ispec, _intern_list(disk_templates), float(vcpu_ratio), float(spindle_ratio))
+
+    allocation_tags = [tag[len(EXCLUSION_TAGS_PREFIX):] for tag in cluster.tags if tag.startswith(EXCLUSION_TAGS_PREFIX)]
+    cluster.set_allocation_tags(allocation_tags if allocation_tags else DEFAULT_ALLOCATION_TAGS)
     return cluster
-                
\ No newline at end of file
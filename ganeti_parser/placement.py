@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+import bisect
+import heapq
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Set, Tuple
+
+from ganeti_parser.GanetiNode import GanetiNode
+from ganeti_parser.GanetiNodeGroup import GanetiNodeGroup
+from ganeti_parser.GanetiInstance import GanetiInstance
+
+# Placement strategies decide in which order candidate nodes are offered to the capacity checks of
+# GanetiCluster._find_new_primary_for_instance() / _find_new_secondary_for_instance(). The first candidate
+# which passes all checks wins, so a strategy only has to order the nodes (best candidate first).
+
+# keys which differ by less than this are treated as equal when deciding whether a candidate can be offered
+KEY_TOLERANCE = 1e-9
+
+# number of weight vectors (see KeyedPlacement.weights()) per node capacity for which the nodes are kept sorted
+MAX_WEIGHT_VECTORS = 8
+
+
+class PlacementStrategy:
+    name = ""
+
+    # yield the nodes of a node group which may hold the instance's disk template (see GanetiCluster._get_eligible_nodes()),
+    # best candidate first, without the excluded node names and the nodes being drained (the cluster must not change
+    # while the candidates are consumed)
+    def candidates(self, cluster, node_group: GanetiNodeGroup, instance: GanetiInstance, primary: bool, excluded: Set[str] = frozenset()) -> Iterator[GanetiNode]:
+        raise NotImplementedError
+
+    # the resources used on a node have changed (called by GanetiCluster whenever its ledger changes)
+    def node_changed(self, node_name: str):
+        pass
+
+    # nodes, eligible nodes or node capacities have changed
+    def reset(self):
+        pass
+
+
+class FirstFitPlacement(PlacementStrategy):
+    name = "first-fit"
+
+    # nodes are offered in the order they appear in the cluster state file
+    def candidates(self, cluster, node_group: GanetiNodeGroup, instance: GanetiInstance, primary: bool, excluded: Set[str] = frozenset()) -> Iterator[GanetiNode]:
+        for node in cluster._get_eligible_nodes(node_group, instance.disk_template):
+            if node.name not in excluded and node.name not in cluster._draining:
+                yield node
+
+
+def _weighted_sum(weights: Tuple[float, ...], attributes: Tuple[float, ...]) -> float:
+    return sum(weight * attribute for weight, attribute in zip(weights, attributes))
+
+
+# The utilization of the eligible nodes of a node group for one disk template, kept up to date with the
+# resource ledger. The key of a strategy is offset(demand) + sum(weights(demand) * attributes(usage)) (see
+# KeyedPlacement.attributes()), so for a given weight vector the nodes are in key order when sorted by the weighted
+# sum of their attributes. Nodes are grouped by capacity (the demand as a fraction of the capacity gives the
+# weights), per capacity there is a sorted list of (weighted sum, position, node name) for each of the most recently
+# used weight vectors (just one for best-fit/worst-fit, usually one per instance spec for the score).
+class _UtilizationIndex:
+    def __init__(self, strategy, cluster, nodes: List[GanetiNode]):
+        self.strategy = strategy
+        self.cluster = cluster
+        self.nodes = {node.name: node for node in nodes}
+        self.positions = {node.name: position for position, node in enumerate(nodes)}
+        self.capacities = {node.name: cluster._get_node_capacity(node) for node in nodes}
+        self.attributes = {node.name: self._get_attributes(node.name) for node in nodes}
+        self.members: Dict[tuple, List[str]] = {}
+        for node in nodes:
+            self.members.setdefault(self.capacities[node.name], []).append(node.name)
+        self.orders: Dict[tuple, OrderedDict] = {capacity: OrderedDict() for capacity in self.members}
+
+    def _get_attributes(self, node_name: str) -> Tuple[float, ...]:
+        capacity = self.capacities[node_name]
+        usage = self.cluster._get_node_usage(self.nodes[node_name])
+        return self.strategy.attributes(tuple(used / total if total > 0 else 1.0 for used, total in zip(usage, capacity)))
+
+    def update(self, node_name: str):
+        old_attributes = self.attributes[node_name]
+        attributes = self._get_attributes(node_name)
+        self.attributes[node_name] = attributes
+        position = self.positions[node_name]
+        for weights, order in self.orders[self.capacities[node_name]].items():
+            del order[bisect.bisect_left(order, (_weighted_sum(weights, old_attributes), position, node_name))]
+            bisect.insort(order, (_weighted_sum(weights, attributes), position, node_name))
+
+    # the nodes of a capacity sorted for a weight vector (sorted from scratch when they are not kept yet)
+    def _get_order(self, capacity: tuple, weights: Tuple[float, ...]) -> list:
+        orders = self.orders[capacity]
+        order = orders.get(weights)
+        if order is None:
+            order = sorted(
+                (_weighted_sum(weights, self.attributes[node_name]), self.positions[node_name], node_name)
+                for node_name in self.members[capacity]
+            )
+            orders[weights] = order
+            if len(orders) > MAX_WEIGHT_VECTORS:
+                orders.popitem(last=False)
+        else:
+            orders.move_to_end(weights)
+        return order
+
+    # The sorted lists of all capacities are read side by side and every node which comes up is scored with the
+    # strategy's key. No node which has not come up yet can have a key below the lowest offset + weighted sum at the
+    # heads of the lists, so the scored nodes up to that threshold are offered right away (in the same order as a
+    # sort of all nodes by key, ties by position).
+    def candidates(self, instance: GanetiInstance, primary: bool, excluded: Set[str]) -> Iterator[GanetiNode]:
+        cluster = self.cluster
+        demand = (instance.memory_size if primary else 0, instance.local_disk_size(), instance.vcpus, instance.spindles)
+        readers = []
+        for capacity in self.members:
+            fractions = tuple(needed / total if total > 0 else 0.0 for needed, total in zip(demand, capacity))
+            iterator = iter(self._get_order(capacity, self.strategy.weights(fractions)))
+            readers.append([self.strategy.offset(fractions), iterator, next(iterator, None)])
+
+        scored = []
+        while True:
+            threshold = None
+            best_reader = None
+            for reader in readers:
+                offset, _, head = reader
+                if head is not None and (threshold is None or offset + head[0] < threshold):
+                    threshold = offset + head[0]
+                    best_reader = reader
+
+            while scored and (threshold is None or scored[0][0] <= threshold + KEY_TOLERANCE):
+                yield self.nodes[heapq.heappop(scored)[2]]
+            if best_reader is None:
+                return
+
+            node_name = best_reader[2][2]
+            best_reader[2] = next(best_reader[1], None)
+            if node_name in excluded or node_name in cluster._draining:
+                continue
+            usage, fractions = cluster._get_node_utilization(self.nodes[node_name], instance, primary)
+            heapq.heappush(scored, (self.strategy.key(usage, fractions), self.positions[node_name], node_name))
+
+
+class KeyedPlacement(PlacementStrategy):
+    # utilization indexes by (node group uuid, disk template) and the indexes every node (by name) is part of
+    _indexes: Dict[Tuple[str, str], _UtilizationIndex]
+    _indexes_by_node: Dict[str, List[_UtilizationIndex]]
+
+    def __init__(self):
+        self._indexes = {}
+        self._indexes_by_node = {}
+
+    # lower keys are better candidates
+    def key(self, usage: Tuple[float, float, float, float], demand: Tuple[float, float, float, float]) -> float:
+        raise NotImplementedError
+
+    # The key split up into node attributes (depending on the node's utilization only, lower is better), weights
+    # and an offset (depending on the instance's demand, as fractions of the node's capacity):
+    # key(usage, demand) == offset(demand) + sum(weights(demand)[i] * attributes(usage)[i]), weights are not negative
+    def attributes(self, usage: Tuple[float, float, float, float]) -> Tuple[float, ...]:
+        raise NotImplementedError
+
+    def weights(self, demand: Tuple[float, float, float, float]) -> Tuple[float, ...]:
+        raise NotImplementedError
+
+    def offset(self, demand: Tuple[float, float, float, float]) -> float:
+        raise NotImplementedError
+
+    # the nodes are kept in utilization indexes which follow every change of the resource ledger, so a search
+    # only scores the nodes it looks at instead of all nodes of the group (see _UtilizationIndex.candidates())
+    def candidates(self, cluster, node_group: GanetiNodeGroup, instance: GanetiInstance, primary: bool, excluded: Set[str] = frozenset()) -> Iterator[GanetiNode]:
+        key = (node_group.uuid, instance.disk_template)
+        index = self._indexes.get(key)
+        if index is None:
+            index = _UtilizationIndex(self, cluster, cluster._get_eligible_nodes(node_group, instance.disk_template))
+            self._indexes[key] = index
+            for node_name in index.nodes:
+                self._indexes_by_node.setdefault(node_name, []).append(index)
+        return index.candidates(instance, primary, excluded)
+
+    def node_changed(self, node_name: str):
+        for index in self._indexes_by_node.get(node_name, ()):
+            index.update(node_name)
+
+    def reset(self):
+        self._indexes = {}
+        self._indexes_by_node = {}
+
+
+class BestFitPlacement(KeyedPlacement):
+    name = "best-fit"
+
+    # prefer the node with the least capacity left over after placing the instance (tightest packing)
+    def key(self, usage, demand) -> float:
+        return sum(1.0 - used - needed for used, needed in zip(usage, demand))
+
+    def attributes(self, usage) -> Tuple[float, ...]:
+        return (-sum(usage),)
+
+    def weights(self, demand) -> Tuple[float, ...]:
+        return (1.0,)
+
+    def offset(self, demand) -> float:
+        return sum(1.0 - needed for needed in demand)
+
+
+class WorstFitPlacement(KeyedPlacement):
+    name = "worst-fit"
+
+    # prefer the node with the most capacity left over after placing the instance (least loaded node)
+    def key(self, usage, demand) -> float:
+        return -sum(1.0 - used - needed for used, needed in zip(usage, demand))
+
+    def attributes(self, usage) -> Tuple[float, ...]:
+        return (sum(usage),)
+
+    def weights(self, demand) -> Tuple[float, ...]:
+        return (1.0,)
+
+    def offset(self, demand) -> float:
+        return sum(needed - 1.0 for needed in demand)
+
+
+class ScoredPlacement(KeyedPlacement):
+    name = "score"
+
+    weights_by_resource: Tuple[float, float, float, float]
+
+    # weights for memory, disk, CPUs and spindles (not negative)
+    def __init__(self, weights: Tuple[float, float, float, float] = (1.0, 1.0, 1.0, 1.0)):
+        super().__init__()
+        if any(weight < 0 for weight in weights):
+            raise Exception("Placement weights must not be negative")
+        self.weights_by_resource = weights
+
+    # similar to the cluster score of hbal: placing the instance on a node increases the sum of squared
+    # utilizations (and thus the standard deviation across nodes) by ((u + d)^2 - u^2), prefer the node where
+    # this increase is smallest
+    def key(self, usage, demand) -> float:
+        return sum(weight * ((used + needed) ** 2 - used ** 2) for weight, used, needed in zip(self.weights_by_resource, usage, demand))
+
+    # ((u + d)^2 - u^2) == 2 * d * u + d^2
+    def attributes(self, usage) -> Tuple[float, ...]:
+        return tuple(usage)
+
+    def weights(self, demand) -> Tuple[float, ...]:
+        return tuple(2.0 * weight * needed for weight, needed in zip(self.weights_by_resource, demand))
+
+    def offset(self, demand) -> float:
+        return sum(weight * needed * needed for weight, needed in zip(self.weights_by_resource, demand))
+
+
+PLACEMENT_STRATEGIES: Dict[str, type] = {
+    FirstFitPlacement.name: FirstFitPlacement,
+    BestFitPlacement.name: BestFitPlacement,
+    WorstFitPlacement.name: WorstFitPlacement,
+    ScoredPlacement.name: ScoredPlacement,
+}
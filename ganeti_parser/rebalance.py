@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+from math import sqrt
+from typing import Dict, List, Tuple
+
+from ganeti_parser.GanetiInstance import GanetiInstance
+from ganeti_parser.GanetiNodeGroup import GanetiNodeGroup
+
+# moves which improve the score by less than this are not worth a migration
+MIN_SCORE_IMPROVEMENT = 1e-9
+
+
+class GanetiRebalanceMove:
+    node_group: str
+    instance: str
+    kind: str
+    old_pnode: str
+    old_snode: str
+    new_pnode: str
+    new_snode: str
+    score_before: float
+    score_after: float
+
+    def __init__(self, node_group, instance, kind, old_pnode, old_snode, new_pnode, new_snode, score_before, score_after):
+        self.node_group = node_group
+        self.instance = instance
+        self.kind = kind
+        self.old_pnode = old_pnode
+        self.old_snode = old_snode
+        self.new_pnode = new_pnode
+        self.new_snode = new_snode
+        self.score_before = score_before
+        self.score_after = score_after
+
+    # the Ganeti commands carrying out this move
+    def commands(self) -> List[str]:
+        if self.kind == "failover":
+            return ["gnt-instance migrate -f {}".format(self.instance)]
+        if self.kind == "replace-secondary":
+            return ["gnt-instance replace-disks -n {} {}".format(self.new_snode, self.instance)]
+        # a new primary node: move the secondary there, migrate onto it and move the secondary back
+        return [
+            "gnt-instance replace-disks -n {} {}".format(self.new_pnode, self.instance),
+            "gnt-instance migrate -f {}".format(self.instance),
+            "gnt-instance replace-disks -n {} {}".format(self.new_snode, self.instance),
+        ]
+
+
+# Keeps the utilization (per resource: memory, disk, vCPUs, spindles) of every node of a node group together
+# with the sum and the sum of squares per resource, so the score of a trial move (which only touches two
+# nodes) is computed from these totals in constant time.
+class _BalanceState:
+    def __init__(self, cluster, nodes):
+        self.cluster = cluster
+        self.count = len(nodes)
+        self.capacity = {node.name: cluster._get_node_capacity(node) for node in nodes}
+        self.utilization = {}
+        self.sums = [0.0, 0.0, 0.0, 0.0]
+        self.squares = [0.0, 0.0, 0.0, 0.0]
+        for node in nodes:
+            self.utilization[node.name] = self._utilization(node.name)
+            for resource, value in enumerate(self.utilization[node.name]):
+                self.sums[resource] += value
+                self.squares[resource] += value * value
+
+    def _utilization(self, node_name: str) -> Tuple[float, ...]:
+        usage = self.cluster._get_node_usage(self.cluster.get_node_by_name(node_name))
+        return tuple(used / total if total > 0 else 0.0 for used, total in zip(usage, self.capacity[node_name]))
+
+    # sum of the standard deviations of the node utilization per resource (0.0 is a perfectly balanced group, like
+    # a group without nodes)
+    def score(self, sums=None, squares=None) -> float:
+        if not self.count:
+            return 0.0
+        sums = self.sums if sums is None else sums
+        squares = self.squares if squares is None else squares
+        return sum(sqrt(max(0.0, square / self.count - (total / self.count) ** 2)) for total, square in zip(sums, squares))
+
+    # score after adding the given (absolute) resource changes to the given nodes
+    def trial_score(self, changes: Dict[str, Tuple[float, ...]]) -> float:
+        sums = list(self.sums)
+        squares = list(self.squares)
+        for node_name, delta in changes.items():
+            capacity = self.capacity[node_name]
+            for resource, old in enumerate(self.utilization[node_name]):
+                if delta[resource]:
+                    new = old + (delta[resource] / capacity[resource] if capacity[resource] > 0 else 0.0)
+                    sums[resource] += new - old
+                    squares[resource] += new * new - old * old
+        return self.score(sums, squares)
+
+    # re-read the utilization of the given nodes from the cluster's ledger after a move has been applied
+    def update(self, node_names: List[str]):
+        for node_name in node_names:
+            new = self._utilization(node_name)
+            for resource, old in enumerate(self.utilization[node_name]):
+                self.sums[resource] += new[resource] - old
+                self.squares[resource] += new[resource] * new[resource] - old * old
+            self.utilization[node_name] = new
+
+
+def _primary_demand(instance: GanetiInstance) -> Tuple[int, int, int, int]:
+    return (instance.memory_size, instance.disk_size, instance.vcpus, instance.spindles)
+
+
+# memory is only accounted for on the primary node
+def _secondary_demand(instance: GanetiInstance) -> Tuple[int, int, int, int]:
+    return (0, instance.disk_size, instance.vcpus, instance.spindles)
+
+
+def _negate(demand: Tuple[int, ...]) -> Tuple[int, ...]:
+    return tuple(-value for value in demand)
+
+
+# all moves of a single instance as (kind, new primary, new secondary, resource changes per node)
+def _candidate_moves(instance: GanetiInstance, node_names: List[str]):
+    pnode, snode = instance.pnode, instance.snodes
+    primary = _primary_demand(instance)
+    secondary = _secondary_demand(instance)
+    yield "failover", snode, pnode, {
+        pnode: tuple(s - p for p, s in zip(primary, secondary)),
+        snode: tuple(p - s for p, s in zip(primary, secondary)),
+    }
+    for node_name in node_names:
+        if node_name == pnode or node_name == snode:
+            continue
+        yield "replace-secondary", pnode, node_name, {snode: _negate(secondary), node_name: secondary}
+        yield "replace-primary", node_name, snode, {pnode: _negate(primary), node_name: primary}
+
+
+# check the capacity of the node(s) an instance would move to
+def _move_is_possible(cluster, instance: GanetiInstance, kind: str, new_pnode: str, new_snode: str) -> bool:
+    if kind == "failover":
+        # the disks are already there, only the memory (and exclusion tags) matter
+        node = cluster.get_node_by_name(new_pnode)
+        return cluster._node_has_enough_memory(node, instance) and cluster._node_has_no_conflicting_migration_tags(node, instance)
+    if kind == "replace-secondary":
+        return cluster._node_accepts_secondary(cluster.get_node_by_name(new_snode), instance)
+    return cluster._node_accepts_primary(cluster.get_node_by_name(new_pnode), instance)
+
+
+# Greedily improve the balance of a node group (like `hbal`): in every round, evaluate every possible failover,
+# secondary replacement and primary replacement of every DRBD instance in the group and apply the one which
+# lowers the score the most, until no move improves the score any more or max_moves moves have been planned.
+# The moves are applied to the cluster (so they can be inspected with dump_cluster()), wrap the call in
+# begin()/rollback() to keep the cluster unchanged.
+def plan_rebalance(cluster, node_group: GanetiNodeGroup, max_moves: int = 50) -> Tuple[float, List[GanetiRebalanceMove]]:
+    nodes = [node for node in cluster.get_nodes_by_group(node_group) if node.name not in cluster._draining]
+    # target nodes per disk template
+    node_names: Dict[str, List[str]] = {}
+    state = _BalanceState(cluster, nodes)
+    initial_score = state.score()
+    moves = []
+
+    with cluster.silenced():
+        while len(moves) < max_moves:
+            score = state.score()
+            instances = [
+                instance for instance in cluster.get_instances_by_nodes(nodes)
+                if instance.is_mirrored() and instance.snodes in state.capacity
+            ]
+
+            # cheap score deltas first, the capacity checks only run for moves which would be the best so far
+            best = None
+            best_score = score - MIN_SCORE_IMPROVEMENT
+            for instance in instances:
+                if instance.disk_template not in node_names:
+                    node_names[instance.disk_template] = [
+                        node.name for node in cluster._get_eligible_nodes(node_group, instance.disk_template) if node.name in state.capacity
+                    ]
+                for kind, new_pnode, new_snode, changes in _candidate_moves(instance, node_names[instance.disk_template]):
+                    trial_score = state.trial_score(changes)
+                    if trial_score < best_score and _move_is_possible(cluster, instance, kind, new_pnode, new_snode):
+                        best = (instance, kind, new_pnode, new_snode)
+                        best_score = trial_score
+            if not best:
+                break
+
+            instance, kind, new_pnode, new_snode = best
+            old_pnode, old_snode = instance.pnode, instance.snodes
+            cluster._set_instance_nodes(instance, new_pnode, new_snode)
+            state.update(list({old_pnode, old_snode, new_pnode, new_snode}))
+            moves.append(GanetiRebalanceMove(node_group.name, instance.name, kind, old_pnode, old_snode, new_pnode, new_snode, score, state.score()))
+
+    return initial_score, moves
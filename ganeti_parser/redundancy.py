@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+from itertools import combinations
+from typing import Dict, List, Tuple
+
+from ganeti_parser.GanetiNodeGroup import GanetiNodeGroup
+
+# resources which are taken over by the secondary node when a primary node fails
+FAILOVER_RESOURCES = ["memory", "cpu", "spindles"]
+
+
+class GanetiRedundancyViolation:
+    node_group: str
+    failed_nodes: Tuple[str, ...]
+    node: str
+    resource: str
+    load: float
+    capacity: float
+
+    def __init__(self, node_group, failed_nodes, node, resource, load, capacity):
+        self.node_group = node_group
+        self.failed_nodes = failed_nodes
+        self.node = node
+        self.resource = resource
+        self.load = load
+        self.capacity = capacity
+
+
+# Simulate the failure of every node (or every combination of up to `failures` nodes) of a node group and
+# check whether the surviving secondaries are able to take over all DRBD instances of the failed nodes.
+# Everything is computed from the primary->secondary failover aggregates of the resource ledger, so no
+# instance has to be looked at. Only minimal violating sets of failed nodes are reported (if a single node
+# failure already overloads a node, the combinations containing that node are not reported again).
+def verify_group_redundancy(cluster, node_group: GanetiNodeGroup, failures: int = 1) -> List[GanetiRedundancyViolation]:
+    violations = []
+    nodes = cluster.get_nodes_by_group(node_group)
+    group_node_names = {node.name for node in nodes}
+
+    for node in nodes:
+        ledger = cluster._get_ledger(node.name)
+        _, _, cpu_capacity, spindle_capacity = cluster._get_node_capacity(node)
+        capacities = (node.total_memory, cpu_capacity, spindle_capacity)
+        base_load = (ledger.primary_memory, ledger.primary_vcpus, ledger.primary_spindles)
+
+        # only primary nodes this node is a secondary for add load when they fail
+        failover: Dict[str, Tuple[int, int, int]] = {}
+        for pnode, memory in ledger.failover_memory.items():
+            if pnode in group_node_names and pnode != node.name:
+                load = (memory, ledger.failover_vcpus[pnode], ledger.failover_spindles[pnode])
+                if any(load):
+                    failover[pnode] = load
+
+        # shortcut: if even the worst combination of failures fits for every resource, there is nothing to report
+        worst_case = []
+        for resource in range(len(FAILOVER_RESOURCES)):
+            largest = sorted((load[resource] for load in failover.values()), reverse=True)[:failures]
+            worst_case.append(base_load[resource] + sum(largest))
+        if all(load <= capacity for load, capacity in zip(worst_case, capacities)):
+            continue
+
+        violating_sets = []
+        for size in range(1, min(failures, len(failover)) + 1):
+            for failed_nodes in combinations(sorted(failover), size):
+                if any(set(violating).issubset(failed_nodes) for violating in violating_sets):
+                    continue
+                violated = False
+                for resource, name in enumerate(FAILOVER_RESOURCES):
+                    load = base_load[resource] + sum(failover[failed_node][resource] for failed_node in failed_nodes)
+                    if load > capacities[resource]:
+                        violations.append(GanetiRedundancyViolation(node_group.name, failed_nodes, node.name, name, load, capacities[resource]))
+                        violated = True
+                if violated:
+                    violating_sets.append(failed_nodes)
+
+    return violations
+
+
+def verify_redundancy(cluster, failures: int = 1) -> List[GanetiRedundancyViolation]:
+    violations = []
+    for node_group in cluster.node_groups:
+        violations.extend(verify_group_redundancy(cluster, node_group, failures))
+    return violations
@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+import json
+import multiprocessing
+from typing import List
+
+# PyYAML is optional, scenario files can always be written in JSON
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from ganeti_parser.GanetiCluster import GanetiCluster
+from ganeti_parser.GanetiEvacuationError import GanetiEvacuationError
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.redundancy import verify_redundancy
+
+# Scenario files describe what-if changes to the parsed cluster state:
+#
+#   scenarios:
+#     - name: replace rack 1
+#       policies:                      # override the over-subscription ratios of node group ("" = cluster) policies
+#         default: {vcpu_ratio: 8.0}
+#       add_nodes:                     # "{}" in the name is replaced by a counter if count is given
+#         - {name: "new{}.example.com", count: 4, group: default, memory: 524288, disk: 8388608, cpus: 64, spindles: 12}
+#       add_instances:
+#         - {name: db01.example.com, memory: 65536, disk: 512000, vcpus: 16, pnode: new1.example.com, snode: new2.example.com}
+#       remove_nodes: [node01.example.com, node02.example.com]
+#
+# The changes are applied in this order (policies, added nodes, added instances, removed nodes).
+# Added nodes and instances need names which are not used by the cluster or earlier in the scenario.
+SCENARIO_KEYS = ["name", "policies", "add_nodes", "add_instances", "remove_nodes"]
+
+# the parsed base state is handed to the worker processes through fork(), every scenario is applied on top of it
+# inside a transaction and rolled back afterwards
+_scenario_cluster: GanetiCluster = None
+
+
+class GanetiScenarioResult:
+    name: str
+    success: bool
+    failovers: int
+    failed_instance: str
+    error: str
+    violations: int
+
+    def __init__(self, name, success, failovers, failed_instance, error, violations):
+        self.name = name
+        self.success = success
+        self.failovers = failovers
+        self.failed_instance = failed_instance
+        self.error = error
+        self.violations = violations
+
+
+def load_scenarios(filename: str) -> List[dict]:
+    with open(filename) as file:
+        if filename.endswith(".yaml") or filename.endswith(".yml"):
+            if yaml is None:
+                raise Exception("Reading {} requires PyYAML, use a JSON scenario file instead".format(filename))
+            document = yaml.safe_load(file)
+        else:
+            document = json.load(file)
+
+    scenarios = document.get("scenarios") if isinstance(document, dict) else document
+    if not isinstance(scenarios, list):
+        raise Exception("Scenario file {} does not contain a list of scenarios".format(filename))
+    for number, scenario in enumerate(scenarios, 1):
+        unknown_keys = set(scenario) - set(SCENARIO_KEYS)
+        if unknown_keys:
+            raise Exception("Unknown keys in scenario {}: {}".format(scenario.get("name", number), ", ".join(sorted(unknown_keys))))
+        scenario.setdefault("name", "scenario {}".format(number))
+    return scenarios
+
+
+def _get_node_group_by_name(cluster: GanetiCluster, name: str):
+    for node_group in cluster.node_groups:
+        if node_group.name == name:
+            return node_group
+    raise Exception("Node group {} not found".format(name))
+
+
+def _add_nodes(cluster: GanetiCluster, spec: dict):
+    node_group = _get_node_group_by_name(cluster, spec.get("group", "default"))
+    count = spec.get("count")
+    if count and count > 1 and "{}" not in spec["name"]:
+        raise Exception("Node name {} needs a {{}} placeholder to add {} nodes".format(spec["name"], count))
+    names = [spec["name"].format(number) for number in range(1, count + 1)] if count else [spec["name"]]
+    for name in names:
+        cluster.add_empty_node(name, node_group, spec["memory"], spec["disk"], spec["cpus"], spec.get("spindles", 1), spec.get("tags", []))
+
+
+def _add_instance(cluster: GanetiCluster, spec: dict):
+    # a second instance of the same name would take over the position of the first one (and lose it on rollback)
+    if spec["name"] in cluster._instance_positions:
+        raise Exception("Instance {} already exists".format(spec["name"]))
+    pnode = cluster.get_node_by_name(spec["pnode"]).name
+    snode = cluster.get_node_by_name(spec["snode"]).name if spec.get("snode") else ""
+    cluster.add_instance(
+        spec["name"], spec["memory"], spec["disk"], spec["vcpus"], "running", "Y", pnode, snode,
+        spec.get("disk_template", "drbd" if snode else "plain"), spec.get("tags", []), spec.get("spindles", 1), "-", "N"
+    )
+
+
+# apply a single scenario to the cluster, which has to be wrapped in a transaction by the caller
+def apply_scenario(cluster: GanetiCluster, scenario: dict) -> GanetiScenarioResult:
+    try:
+        for owner, ratios in scenario.get("policies", {}).items():
+            cluster.update_policy(owner, ratios.get("vcpu_ratio"), ratios.get("spindle_ratio"))
+        for spec in scenario.get("add_nodes", []):
+            _add_nodes(cluster, spec)
+        for spec in scenario.get("add_instances", []):
+            _add_instance(cluster, spec)
+        failovers = cluster.remove_nodes(scenario["remove_nodes"]) if scenario.get("remove_nodes") else 0
+    except GanetiEvacuationError as e:
+        return GanetiScenarioResult(scenario["name"], False, None, e.instance_name, str(e), None)
+    except KeyError as e:
+        return GanetiScenarioResult(scenario["name"], False, None, None, "Missing key {}".format(e), None)
+    except Exception as e:
+        return GanetiScenarioResult(scenario["name"], False, None, None, str(e), None)
+
+    return GanetiScenarioResult(scenario["name"], True, failovers, None, None, len(verify_redundancy(cluster)))
+
+
+def _init_worker():
+    _scenario_cluster.reporter = GanetiReporter(level=GanetiReporter.SILENT)
+
+
+# run a single scenario on top of the base state (runs inside a worker process)
+def _run_single_scenario(scenario: dict) -> GanetiScenarioResult:
+    cluster = _scenario_cluster
+    cluster.begin()
+    try:
+        return apply_scenario(cluster, scenario)
+    finally:
+        cluster.rollback()
+
+
+# run all scenarios in parallel on top of the same parsed cluster state, results are returned in scenario order
+def run_scenarios(cluster: GanetiCluster, scenarios: List[dict], processes: int = None) -> List[GanetiScenarioResult]:
+    global _scenario_cluster
+    _scenario_cluster = cluster
+
+    context = multiprocessing.get_context("fork")
+    try:
+        with context.Pool(processes=processes, initializer=_init_worker) as pool:
+            return pool.map(_run_single_scenario, scenarios, chunksize=1)
+    finally:
+        _scenario_cluster = None
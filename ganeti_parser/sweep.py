@@ -0,0 +1,152 @@
+#!/usr/bin/python3
+import io
+import multiprocessing
+from contextlib import redirect_stdout
+from typing import List, Tuple
+
+from ganeti_parser.GanetiCluster import GanetiCluster
+from ganeti_parser.GanetiEvacuationError import GanetiEvacuationError
+from ganeti_parser.GanetiReporter import GanetiReporter
+
+# the parsed cluster is handed to the worker processes through fork(): every worker owns a copy-on-write copy
+# of the parent's state and rolls back each simulation before starting the next one
+_sweep_cluster: GanetiCluster = None
+
+
+class GanetiRemovalResult:
+    node_group: str
+    node: str
+    success: bool
+    failovers: int
+    failed_instance: str
+    error: str
+
+    def __init__(self, node_group, node, success, failovers, failed_instance, error):
+        self.node_group = node_group
+        self.node = node
+        self.success = success
+        self.failovers = failovers
+        self.failed_instance = failed_instance
+        self.error = error
+
+
+def _init_worker():
+    _sweep_cluster.reporter = GanetiReporter(level=GanetiReporter.SILENT)
+
+
+# simulate the removal of a single node (runs inside a worker process)
+def _remove_single_node(node_name: str) -> GanetiRemovalResult:
+    cluster = _sweep_cluster
+    node = cluster.get_node_by_name(node_name)
+    node_group = cluster.node_groups_by_uuid[node.group_uuid].name
+
+    cluster.begin()
+    try:
+        failovers = cluster.remove_node(node_name)
+        return GanetiRemovalResult(node_group, node_name, True, failovers, None, None)
+    except GanetiEvacuationError as e:
+        return GanetiRemovalResult(node_group, node_name, False, None, e.instance_name, str(e))
+    except Exception as e:
+        return GanetiRemovalResult(node_group, node_name, False, None, None, str(e))
+    finally:
+        cluster.rollback()
+
+
+# simulate the removal of every node (one at a time) in parallel, results are returned in node group order
+def remove_each_node(cluster: GanetiCluster, processes: int = None) -> List[GanetiRemovalResult]:
+    global _sweep_cluster
+    _sweep_cluster = cluster
+
+    node_names = []
+    for node_group in cluster.node_groups:
+        for node in cluster.get_nodes_by_group(node_group):
+            node_names.append(node.name)
+
+    context = multiprocessing.get_context("fork")
+    try:
+        with context.Pool(processes=processes, initializer=_init_worker) as pool:
+            return pool.map(_remove_single_node, node_names, chunksize=1)
+    finally:
+        _sweep_cluster = None
+
+
+class GanetiGroupRemovalResult(GanetiRemovalResult):
+    log: str
+    moves: List[Tuple[str, str, str]]
+    dump: str
+
+    def __init__(self, node_group, node, success, failovers, failed_instance, error, log, moves):
+        super().__init__(node_group, node, success, failovers, failed_instance, error)
+        self.log = log
+        self.moves = moves
+        self.dump = None
+
+
+# keep the log level and format of the parent, the messages of every task are collected and returned
+def _init_logging_worker():
+    reporter = _sweep_cluster.reporter
+    _sweep_cluster.reporter = GanetiReporter(level=reporter.level, json_lines=reporter.json_lines)
+
+
+# remove the first node of a node group and keep the instance moves (runs inside a worker process)
+def _remove_first_node(node_group_position: int) -> GanetiGroupRemovalResult:
+    cluster = _sweep_cluster
+    node_group = cluster.node_groups[node_group_position]
+    node_name = cluster.get_nodes_by_group(node_group)[0].name
+    cluster.reporter.stream = io.StringIO()
+
+    cluster.begin()
+    try:
+        failovers = cluster.remove_node(node_name)
+        return GanetiGroupRemovalResult(node_group.name, node_name, True, failovers, None, None, cluster.reporter.stream.getvalue(), cluster.get_instance_moves())
+    except GanetiEvacuationError as e:
+        return GanetiGroupRemovalResult(node_group.name, node_name, False, None, e.instance_name, str(e), cluster.reporter.stream.getvalue(), [])
+    except Exception as e:
+        return GanetiGroupRemovalResult(node_group.name, node_name, False, None, None, str(e), cluster.reporter.stream.getvalue(), [])
+    finally:
+        cluster.rollback()
+
+
+# dump the cluster after applying the given removals (runs inside a worker process)
+def _dump_after_removals(removals: List[Tuple[str, List[Tuple[str, str, str]]]]) -> str:
+    cluster = _sweep_cluster
+    output = io.StringIO()
+    cluster.begin()
+    try:
+        for node_name, moves in removals:
+            cluster.apply_removal([node_name], moves)
+        with redirect_stdout(output):
+            cluster.dump_cluster()
+    finally:
+        cluster.rollback()
+    return output.getvalue()
+
+
+# Remove the first node of every node group, one after another, and dump the cluster after every successful
+# removal. Node groups never share instances, so all groups are evacuated in parallel on the same initial state;
+# the dump after the removal in a group (which includes the removals in all groups before it) is then rendered
+# in parallel as well by replaying the instance moves found for these groups. Results (with the collected log
+# messages and dumps) are returned in node group order and match removing the nodes one after another.
+def remove_first_node_of_each_group(cluster: GanetiCluster, processes: int = None) -> List[GanetiGroupRemovalResult]:
+    global _sweep_cluster
+    _sweep_cluster = cluster
+
+    node_group_positions = [
+        position for position, node_group in enumerate(cluster.node_groups) if cluster.get_nodes_by_group(node_group)
+    ]
+    context = multiprocessing.get_context("fork")
+    try:
+        with context.Pool(processes=processes, initializer=_init_logging_worker) as pool:
+            results = pool.map(_remove_first_node, node_group_positions, chunksize=1)
+
+            dumps = []
+            removals = []
+            for result in results:
+                if result.success:
+                    removals.append((result.node, result.moves))
+                    dumps.append((result, pool.apply_async(_dump_after_removals, (list(removals),))))
+            for result, dump in dumps:
+                result.dump = dump.get()
+        return results
+    finally:
+        _sweep_cluster = None
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import re
+from datetime import datetime
+from sys import intern
+from typing import List, TextIO, Tuple
+
+from ganeti_parser.cache import load_datafile
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.output import NODE_USAGE_COLUMNS
+
+NODE_TREND_COLUMNS = ["snapshot", "timestamp"] + NODE_USAGE_COLUMNS
+GROUP_TREND_COLUMNS = [
+    "snapshot", "timestamp", "node_group", "nodes", "instances", "memory", "disk", "cpu", "spindles",
+    "failn1_memory", "failn1_cpu", "failn1_spindles"
+]
+
+# date (and optionally time) in a snapshot file name, e.g. 2026-01-31.data, LOCAL-20260131-0300.data or
+# cluster_2026-01-31T03:00:00.data
+SNAPSHOT_TIMESTAMP_PATTERN = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})(?:[T_ -]?(\d{2})[:-]?(\d{2})(?:[:-]?(\d{2}))?)?")
+
+
+# all cluster state files of a directory or matching a glob pattern, in the order of their names (daily
+# snapshots are usually named by date)
+def find_snapshots(path: str) -> List[str]:
+    if os.path.isdir(path):
+        filenames = [os.path.join(path, entry) for entry in os.listdir(path)]
+    else:
+        filenames = glob.glob(path)
+    return sorted(filename for filename in filenames if os.path.isfile(filename))
+
+
+# the time a snapshot was taken: the date and time in its file name, the modification time of the file if the
+# name does not contain a valid one (copying snapshots around changes their modification time)
+def get_snapshot_timestamp(filename: str) -> str:
+    for match in SNAPSHOT_TIMESTAMP_PATTERN.finditer(os.path.basename(filename)):
+        try:
+            return datetime(*(int(field) for field in match.groups() if field is not None)).isoformat(timespec="seconds")
+        except ValueError:
+            continue
+    return datetime.fromtimestamp(os.path.getmtime(filename)).isoformat(timespec="seconds")
+
+
+# utilization of every node and node group of a single snapshot (runs inside a worker process)
+def _snapshot_rows(task: Tuple[str, bool]) -> Tuple[List[tuple], List[tuple]]:
+    filename, use_cache = task
+    cluster = load_datafile(filename, reporter=GanetiReporter(level=GanetiReporter.SILENT), use_cache=use_cache)
+    snapshot = os.path.basename(filename)
+    timestamp = get_snapshot_timestamp(filename)
+    failn1 = cluster._get_max_failn1_used_percentages()
+
+    node_rows = []
+    group_rows = []
+    for node_group in cluster.node_groups:
+        nodes = cluster.get_nodes_by_group(node_group)
+        for node in nodes:
+            node_rows.append((snapshot, timestamp) + cluster._get_node_usage_row(node_group, node, failn1))
+
+        usage, capacity, worst_failn1 = cluster._get_node_group_usage(node_group, failn1)
+        group_rows.append(tuple(
+            [snapshot, timestamp, node_group.name, len(nodes), len(cluster.get_instances_by_nodes(nodes))] +
+            [int(used / total * 100) if total else 0 for used, total in zip(usage, capacity)] +
+            worst_failn1
+        ))
+    return node_rows, group_rows
+
+
+# Parse all snapshots in parallel and collect the node and node group utilization over time. The parsed state
+# of a snapshot is thrown away right after its rows are computed, the parent only keeps the rows and shares a
+# single copy of every node and node group name between all snapshots. Every snapshot is a different file which
+# is parsed once per run, so the cache is not used unless use_cache is set (it would get an entry per snapshot).
+def collect_trend(filenames: List[str], processes: int = None, use_cache: bool = False) -> Tuple[List[tuple], List[tuple]]:
+    node_rows = []
+    group_rows = []
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes=processes) as pool:
+        for snapshot_node_rows, snapshot_group_rows in pool.imap(_snapshot_rows, [(filename, use_cache) for filename in filenames]):
+            for row in snapshot_node_rows:
+                node_rows.append(tuple(intern(value) if isinstance(value, str) else value for value in row))
+            for row in snapshot_group_rows:
+                group_rows.append(tuple(intern(value) if isinstance(value, str) else value for value in row))
+    return node_rows, group_rows
+
+
+def write_trend_csv(stream: TextIO, node_rows: List[tuple], group_rows: List[tuple]):
+    writer = csv.writer(stream)
+    # a single table: group rows leave the node specific columns empty
+    writer.writerow(["scope"] + NODE_TREND_COLUMNS + ["nodes", "instances"])
+    group_columns = {column: position for position, column in enumerate(GROUP_TREND_COLUMNS)}
+    for row in group_rows:
+        writer.writerow(["group"] + [row[group_columns[column]] if column in group_columns else "" for column in NODE_TREND_COLUMNS] + [row[3], row[4]])
+    for row in node_rows:
+        writer.writerow(["node"] + list(row) + ["", ""])
+
+
+def write_trend_json(stream: TextIO, node_rows: List[tuple], group_rows: List[tuple]):
+    json.dump({
+        "node_groups": [dict(zip(GROUP_TREND_COLUMNS, row)) for row in group_rows],
+        "nodes": [dict(zip(NODE_TREND_COLUMNS, row)) for row in node_rows],
+    }, stream, indent=2)
+    stream.write("\n")
@@ -1,42 +1,303 @@
 #!/usr/bin/python3
 
 import argparse
+import atexit
+import sys
+from contextlib import nullcontext
 from sys import exit
-from ganeti_parser.parser import parse_datafile
+from ganeti_parser.cache import clear_cache, load_datafile
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.GanetiProfiler import GanetiProfiler
+from ganeti_parser.placement import PLACEMENT_STRATEGIES
+from ganeti_parser.evacuation import EVACUATION_ORDERS
+from tabulate import tabulate
+
+# the modules of the single modes are imported by the modes using them, so every run only loads what it needs
 
 
 parser = argparse.ArgumentParser(description="Parse Ganeti cluster state and simulate removing of nodes")
-parser.add_argument("filename", type=str, help="Cluster state file as generated by `hscan`")
-parser.add_argument("--mode", type=str, default="dump", help="Set operation mode: [dump|remove-first-of-group|remove-node]")
-parser.add_argument("--node", type=str, default=None, help="Specify node to remove with --mode remove")
+parser.add_argument("filename", type=str, nargs="?", help="Cluster state file as generated by `hscan` (the file to write with --mode generate, the JSON baseline to write with --mode bench, a directory or glob pattern of snapshots with --mode trend, of the data files of all clusters with --mode fleet)")
+parser.add_argument("--mode", type=str, default="dump", help="Set operation mode: [dump|remove-first-of-group|remove|remove-nodes|remove-each|max-removable|verify-n1|allocate|expand|rebalance|scenarios|serve|trend|fleet|generate|bench]")
+parser.add_argument("--node", type=str, default=None, help="Specify node to remove with --mode remove (comma separated list of nodes with --mode remove-nodes, --mode rebalance and --mode expand)")
+parser.add_argument("--failures", type=int, default=1, help="Number of simultaneously failing nodes to verify with --mode verify-n1, --mode expand and --mode fleet (N+k redundancy)")
+parser.add_argument("--max-evaluations", type=int, default=500, help="Maximum number of simulated node removals per node group with --mode max-removable")
+parser.add_argument("--allocation-tags", type=str, default=None, help="Comma separated list of exclusion tag prefixes (overrides the htools:iextags:* cluster tags, defaults to \"a\" if the cluster has none)")
+parser.add_argument("--node-profile", type=str, default=None, help="Hardware of the nodes to add with --mode expand as memory,disk,cpus[,spindles] (defaults to the first node of the node group)")
+parser.add_argument("--max-new-nodes", type=int, default=None, help="Maximum number of nodes to add per node group with --mode expand (defaults to 64)")
+parser.add_argument("--max-moves", type=int, default=50, help="Maximum number of instance moves per node group with --mode rebalance")
+parser.add_argument("--scenarios", type=str, default=None, help="Scenario file (JSON or YAML) to run with --mode scenarios")
+parser.add_argument("--ispec", type=str, default=None, help="Instance spec to allocate with --mode allocate as memory,vcpus,disk[,spindles] (defaults to the standard spec of each node group's policy)")
+parser.add_argument("--disk-template", type=str, default="drbd", help="Disk template of the instances to allocate with --mode allocate")
+parser.add_argument("--max-instances", type=int, default=None, help="Stop allocating after this many instances per node group with --mode allocate (the number of instances which have to fit with --mode expand)")
+parser.add_argument("--placement", type=str, default="first-fit", choices=PLACEMENT_STRATEGIES.keys(), help="Strategy to pick new primary/secondary nodes: [first-fit|best-fit|worst-fit|score]")
+parser.add_argument("--evacuation-order", type=str, default="file", choices=EVACUATION_ORDERS.keys(), help="Order in which instances are moved away from a node: [file|memory|disk|dominant]")
+parser.add_argument("--processes", type=int, default=None, help="Number of worker processes for --mode remove-each, --mode remove-first-of-group, --mode scenarios, --mode trend and --mode fleet (defaults to the number of CPUs)")
+parser.add_argument("--format", type=str, default=None, choices=["table", "csv", "json", "jsonl", "prometheus"], help="Output format of --mode dump, remove, remove-nodes and remove-first-of-group: [table|csv|jsonl|prometheus] (defaults to table), of --mode trend: [csv|json] (defaults to csv), of --mode fleet: [table|csv|json] (defaults to table)")
+parser.add_argument("--output", type=str, default=None, help="Write the output of --mode trend and --mode fleet (or the --format output of the other modes) to this file instead of stdout")
+parser.add_argument("--listen", type=str, default="127.0.0.1:8080", help="Address to answer queries on with --mode serve: host:port or unix:/path/to/socket")
+parser.add_argument("--watch-interval", type=float, default=1.0, help="Seconds between checks of the data file for changes with --mode serve")
+parser.add_argument("--no-cache", action="store_true", help="Always parse the data file instead of using (and updating) the parsed state cache")
+parser.add_argument("--clear-cache", action="store_true", help="Remove all cached parsed states before running")
+parser.add_argument("--groups", type=int, default=1, help="Number of node groups to generate with --mode generate")
+parser.add_argument("--nodes-per-group", type=int, default=10, help="Number of nodes per node group to generate with --mode generate")
+parser.add_argument("--instances-per-node", type=int, default=8, help="Average number of primary instances per node to generate with --mode generate")
+parser.add_argument("--disk-templates", type=str, default="drbd", help="Comma separated list of disk templates to generate instances with in --mode generate")
+parser.add_argument("--tag-ratio", type=float, default=0.1, help="Share of generated instances with an allocation tag in --mode generate")
+parser.add_argument("--fill", type=float, default=0.6, help="Approximate memory/disk fill level (0.0 - 1.0) of the generated nodes in --mode generate")
+parser.add_argument("--seed", type=int, default=0, help="Random seed for --mode generate and --mode bench")
+parser.add_argument("--sizes", type=str, default=None, help="Comma separated list of cluster sizes to run with --mode bench: [small|medium|large] (defaults to all of them)")
+parser.add_argument("--repeat", type=int, default=3, help="Number of runs per phase with --mode bench (the fastest run counts)")
+parser.add_argument("--baseline", type=str, default=None, help="JSON baseline of an earlier --mode bench run to compare against")
+parser.add_argument("--profile", action="store_true", help="Count calls and time spent per phase (parsing, lookups, capacity checks, output, ...) and print a summary at the end")
+parser.add_argument("--profile-output", type=str, default=None, help="Also write cProfile statistics to this file (readable with the pstats module, implies --profile)")
+parser.add_argument("--verbosity", type=str, default="trace", choices=GanetiReporter.LEVELS.keys(), help="Set log verbosity: [silent|summary|decision|trace]")
+parser.add_argument("--json-log", action="store_true", help="Emit log messages as JSON lines instead of coloured text")
 args = parser.parse_args()
 
-cluster = parse_datafile(args.filename)
+reporter = GanetiReporter(level=GanetiReporter.LEVELS[args.verbosity], json_lines=args.json_log)
+if args.clear_cache:
+    clear_cache()
+
+# modes which do not work on an existing cluster state file
+if args.mode == "generate":
+    from ganeti_parser.generator import generate_datafile
+
+    if not args.filename:
+        print()
+        print("Error: Please specify the file to write the generated cluster state to")
+        exit(1)
+
+    generate_datafile(
+        args.filename, groups=args.groups, nodes_per_group=args.nodes_per_group, instances_per_node=args.instances_per_node,
+        disk_templates=args.disk_templates.split(","), tag_ratio=args.tag_ratio, fill=args.fill, seed=args.seed
+    )
+    reporter.summary("generated", "Generated cluster state file {filename}", filename=args.filename)
+    exit(0)
+
+elif args.mode == "bench":
+    from ganeti_parser.benchmark import BENCHMARK_SIZES, compare_benchmark, load_baseline, run_benchmark, write_baseline
+
+    sizes = args.sizes.split(",") if args.sizes else list(BENCHMARK_SIZES)
+    for size in sizes:
+        if size not in BENCHMARK_SIZES:
+            print()
+            print("Error: Unknown benchmark size {}".format(size))
+            exit(1)
+
+    benchmark = run_benchmark(sizes=sizes, repeat=args.repeat, processes=args.processes, seed=args.seed)
+    lines = [["Size", "Nodes", "Instances", "Peak memory"] + ["{} (ops/s)".format(phase) for phase in ["Parse", "Dump", "Evacuate", "Sweep"]]]
+    for size, result in benchmark["results"].items():
+        reporter.decision("benchmark", "Benchmarked size {size}", size=size, **result)
+        lines.append(
+            [size, result["nodes"], result["instances"], "{:.1f} MB".format(result["peak_memory"] / 1048576)] +
+            ["{:.3f}s ({:.1f})".format(phase["seconds"], phase["ops_per_sec"]) for phase in result["phases"].values()]
+        )
+    print()
+    print(tabulate(lines, headers="firstrow", tablefmt="github"))
+    print()
+
+    regressions = []
+    if args.baseline:
+        lines = [["Size", "Phase", "Baseline", "Now", "Change"]]
+        for size, phase, before, after, ratio, regression in compare_benchmark(benchmark, load_baseline(args.baseline)):
+            lines.append([size, phase, "{:.3f}s".format(before), "{:.3f}s".format(after), "{:+.0f}%{}".format((ratio - 1) * 100, " (regression)" if regression else "")])
+            if regression:
+                regressions.append((size, phase))
+        print(tabulate(lines, headers="firstrow", tablefmt="github"))
+        print()
+        reporter.summary("regressions", "Found {count} regressions compared to {baseline}", count=len(regressions), baseline=args.baseline, ok=not regressions)
+
+    if args.filename:
+        write_baseline(args.filename, benchmark)
+        reporter.summary("baseline", "Wrote benchmark baseline {filename}", filename=args.filename)
+    exit(1 if regressions else 0)
 
-print("Found {} Node-Groups, {} Nodes, {} Instances, {} Allocation Policies".format(len(cluster.node_groups), len(cluster.nodes), len(cluster.instances), len(cluster.policies)))
+elif args.mode == "trend":
+    from ganeti_parser.trend import collect_trend, find_snapshots, write_trend_csv, write_trend_json
+
+    filenames = find_snapshots(args.filename) if args.filename else []
+    if not filenames:
+        print()
+        print("Error: Please specify a directory or glob pattern matching cluster state files")
+        exit(1)
+
+    if args.format not in (None, "csv", "json"):
+        print()
+        print("Error: --mode trend only supports --format csv or json")
+        exit(1)
+
+    reporter.summary("trend", "Found {snapshots} snapshots", snapshots=len(filenames))
+    node_rows, group_rows = collect_trend(filenames, processes=args.processes)
+    write_trend = write_trend_json if args.format == "json" else write_trend_csv
+    if args.output:
+        with open(args.output, "w", newline="") as output:
+            write_trend(output, node_rows, group_rows)
+        reporter.summary("trend", "Wrote {rows} rows to {output}", rows=len(node_rows) + len(group_rows), output=args.output)
+    else:
+        write_trend(sys.stdout, node_rows, group_rows)
+    exit(0)
+
+elif args.mode == "fleet":
+    from ganeti_parser.fleet import analyse_fleet, get_fleet_rows, write_fleet_csv, write_fleet_json
+    from ganeti_parser.trend import find_snapshots
+
+    filenames = find_snapshots(args.filename) if args.filename else []
+    if not filenames:
+        print()
+        print("Error: Please specify a directory or glob pattern matching cluster state files")
+        exit(1)
+    if args.format not in (None, "table", "csv", "json"):
+        print()
+        print("Error: --mode fleet only supports --format table, csv or json")
+        exit(1)
+
+    reporter.summary("fleet", "Found {clusters} clusters", clusters=len(filenames))
+    clusters = analyse_fleet(filenames, processes=args.processes, use_cache=not args.no_cache, failures=args.failures)
+    for fleet_cluster in clusters:
+        if fleet_cluster.error:
+            reporter.summary("fleet", "Failed to analyse {cluster}: {error}", cluster=fleet_cluster.name, error=fleet_cluster.error, ok=False)
+    rows = get_fleet_rows(clusters)
+
+    if args.format in ("csv", "json"):
+        output = open(args.output, "w", newline="") if args.output else sys.stdout
+        if args.format == "json":
+            write_fleet_json(output, rows, clusters)
+        else:
+            write_fleet_csv(output, rows)
+        output.flush()
+        exit(0)
+
+    lines = [[
+        "Cluster", "Node-Group", "Nodes", "Instances", "Memory", "Disk", "CPUs", "Spindles",
+        "Fail-N-1 Memory", "Fail-N-1 CPUs", "Fail-N-1 Spindles", "N+{} violations".format(args.failures)
+    ]]
+    for scope, cluster_name, node_group, nodes, instances, memory, disk, cpu, spindles, failn1_memory, failn1_cpu, failn1_spindles, violations in rows:
+        lines.append([
+            cluster_name if scope != "fleet" else "Fleet ({} clusters)".format(len(clusters)),
+            node_group if scope == "group" else "(all)",
+            nodes,
+            instances,
+            "{}%".format(memory),
+            "{}%".format(disk),
+            "{}%".format(cpu),
+            "{}%".format(spindles),
+            "{}%".format(failn1_memory),
+            "{}%".format(failn1_cpu),
+            "{}%".format(failn1_spindles),
+            violations
+        ])
+    print()
+    print(tabulate(lines, headers="firstrow", tablefmt="github"))
+    print()
+    exit(0)
+
+if not args.filename:
+    print()
+    print("Error: Please specify the cluster state file")
+    exit(1)
+
+# the daemon keeps its own parsed state and reloads it when the data file changes
+if args.mode == "serve":
+    from ganeti_parser.daemon import GanetiClusterDaemon, serve
+
+    daemon = GanetiClusterDaemon(
+        args.filename, reporter=reporter, placement=args.placement, evacuation_order=args.evacuation_order,
+        allocation_tags=[prefix for prefix in args.allocation_tags.split(",") if prefix] if args.allocation_tags is not None else None
+    )
+    serve(daemon, args.listen, watch_interval=args.watch_interval)
+    exit(0)
+
+# machine readable output of the node usage and removal results, the log goes to stderr to keep stdout parsable
+writer = None
+if args.format not in (None, "table"):
+    from ganeti_parser.output import OUTPUT_FORMATS, write_node_removal
+
+    if args.mode not in ("dump", "remove", "remove-nodes", "remove-first-of-group", "remove-first") or args.format not in OUTPUT_FORMATS:
+        print()
+        print("Error: --format {} is not supported with --mode {}".format(args.format, args.mode))
+        exit(1)
+    if args.format == "prometheus" and args.mode in ("remove-first-of-group", "remove-first"):
+        # every metric may only appear once in the exposition
+        print()
+        print("Error: --format prometheus only supports a single removal, use --mode remove or remove-nodes")
+        exit(1)
+    reporter.stream = sys.stderr
+    writer = OUTPUT_FORMATS[args.format](open(args.output, "w", newline="") if args.output else sys.stdout)
+
+
+profiler = None
+if args.profile or args.profile_output:
+    profiler = GanetiProfiler(profile_output=args.profile_output)
+
+    # the summary is printed however the selected mode ends
+    def print_profile():
+        profiler.stop()
+        profiler.print_summary()
+    atexit.register(print_profile)
+
+with profiler.phase("parse") if profiler else nullcontext():
+    cluster = load_datafile(args.filename, reporter=reporter, use_cache=not args.no_cache, profiler=profiler)
+cluster.placement = PLACEMENT_STRATEGIES[args.placement]()
+if args.allocation_tags is not None:
+    cluster.set_allocation_tags([prefix for prefix in args.allocation_tags.split(",") if prefix])
+cluster.evacuation_order = args.evacuation_order
+
+reporter.summary(
+    "cluster", "Found {node_groups} Node-Groups, {nodes} Nodes, {instances} Instances, {policies} Allocation Policies",
+    node_groups=len(cluster.node_groups), nodes=len(cluster.nodes), instances=len(cluster.instances), policies=len(cluster.policies)
+)
 
 for node_group in cluster.node_groups:
     filtered_nodes = cluster.get_nodes_by_group(node_group)
     filtered_instances = cluster.get_instances_by_nodes(filtered_nodes)
-    print("  {}: {} Nodes with {} Instances".format(node_group.name, len(filtered_nodes), len(filtered_instances)))
+    reporter.summary(
+        "node_group", "  {node_group}: {nodes} Nodes with {instances} Instances",
+        node_group=node_group.name, nodes=len(filtered_nodes), instances=len(filtered_instances)
+    )
+
+if writer:
+    if args.mode == "dump":
+        writer.write_nodes(cluster)
+    elif args.mode in ("remove-first-of-group", "remove-first"):
+        # one transaction per node group, so every removal only reports its own moves
+        # (node groups without nodes are skipped, like in the table output)
+        for node_group in cluster.node_groups:
+            nodes = cluster.get_nodes_by_group(node_group)
+            if not nodes:
+                continue
+            cluster.begin()
+            write_node_removal(writer, cluster, [nodes[0].name])
+            cluster.commit()
+    elif not args.node:
+        print()
+        print("Error: Please specify nodes to remove")
+        exit(1)
+    else:
+        cluster.begin()
+        write_node_removal(writer, cluster, args.node.split(","))
+        cluster.commit()
+    writer.stream.flush()
+    exit(0)
 
 if args.mode == "dump":
     cluster.dump_cluster()
     exit(0)
 
 elif (args.mode == "remove-first-of-group") or (args.mode == 'remove-first'):
-    for node_group in cluster.node_groups:
-        print("Working on node group {}".format(node_group.name))
-        first_node_from_group = cluster.get_nodes_by_group(node_group)[0].name
-        print("Trying to remove first node {}".format(first_node_from_group))
-        print()
-        try:
-            cluster.remove_node(first_node_from_group)
-            print("Successfully removed first node from cluster")
-            cluster.dump_cluster()
-        except:
-            print("Failed to remove first node")
-        print()
+    from ganeti_parser.sweep import remove_first_node_of_each_group
+
+    # the node groups are evacuated in parallel, the log of every group is printed once all of them are done
+    for result in remove_first_node_of_each_group(cluster, processes=args.processes):
+        reporter.summary("node_group", "Working on node group {node_group}", node_group=result.node_group)
+        reporter.summary("remove", "Trying to remove first node {node}", node=result.node)
+        reporter.newline()
+        (reporter.stream if reporter.stream else sys.stdout).write(result.log)
+        if result.success:
+            reporter.summary("removed", "Successfully removed first node from cluster", node=result.node, ok=True)
+            sys.stdout.write(result.dump)
+        else:
+            reporter.summary("removed", "Failed to remove first node", node=result.node, ok=False)
+        reporter.newline()
 
 elif args.mode == "remove":
     if not args.node:
@@ -46,7 +307,251 @@ elif args.mode == "remove":
     
     try:
         cluster.remove_node(args.node)
-        print("Successfully removed {} from cluster".format(args.node))
+        reporter.summary("removed", "Successfully removed {node} from cluster", node=args.node, ok=True)
+        cluster.dump_cluster()
+    except:
+        reporter.summary("removed", "Failed to remove {node}", node=args.node, ok=False)
+
+elif args.mode == "remove-each":
+    from ganeti_parser.sweep import remove_each_node
+
+    results = remove_each_node(cluster, processes=args.processes)
+    lines = [["Node-Group", "Node", "Result", "Failovers", "First failing instance"]]
+    for result in results:
+        reporter.decision(
+            "removed", "Removal of {node}: {status}", node=result.node, node_group=result.node_group, status="ok" if result.success else "failed",
+            ok=result.success, failovers=result.failovers, failed_instance=result.failed_instance, error=result.error
+        )
+        lines.append([
+            result.node_group,
+            result.node.split(".")[0],
+            "ok" if result.success else "failed",
+            result.failovers if result.success else "",
+            result.failed_instance if result.failed_instance else (result.error or "")
+        ])
+    print()
+    print(tabulate(lines, headers="firstrow", tablefmt="github"))
+    print()
+
+elif args.mode == "remove-nodes":
+    if not args.node:
+        print()
+        print("Error: Please specify nodes to remove")
+        exit(1)
+
+    node_names = args.node.split(",")
+    try:
+        cluster.remove_nodes(node_names)
+        reporter.summary("removed", "Successfully removed {nodes} from cluster", nodes=", ".join(node_names), ok=True)
         cluster.dump_cluster()
     except:
-        print("Failed to remove {}".format(args.node))
\ No newline at end of file
+        reporter.summary("removed", "Failed to remove {nodes}", nodes=", ".join(node_names), ok=False)
+
+elif args.mode == "max-removable":
+    from ganeti_parser.capacity import find_max_removable_nodes
+
+    lines = [["Node-Group", "Nodes", "Greedy", "Best", "Simulations", "Search", "Removable nodes"]]
+    for node_group in cluster.node_groups:
+        result = find_max_removable_nodes(cluster, node_group, max_evaluations=args.max_evaluations)
+        reporter.decision(
+            "max_removable", "{node_group}: {count} nodes can be removed", node_group=result.node_group, count=len(result.best_nodes),
+            nodes=result.best_nodes, greedy_nodes=result.greedy_nodes, evaluations=result.evaluations, complete=result.complete
+        )
+        lines.append([
+            result.node_group,
+            len(cluster.get_nodes_by_group(node_group)),
+            len(result.greedy_nodes),
+            len(result.best_nodes),
+            result.evaluations,
+            "complete" if result.complete else "limit reached",
+            ", ".join(node.split(".")[0] for node in result.best_nodes)
+        ])
+    print()
+    print(tabulate(lines, headers="firstrow", tablefmt="github"))
+    print()
+
+elif args.mode == "verify-n1":
+    from ganeti_parser.redundancy import verify_redundancy
+
+    violations = verify_redundancy(cluster, failures=args.failures)
+    lines = [["Node-Group", "Failed node(s)", "Node", "Resource", "Load after failover", "Capacity"]]
+    for violation in violations:
+        reporter.decision(
+            "redundancy_violation", "{node} is overloaded ({resource}) if {failed_nodes} fail(s)", node_group=violation.node_group,
+            failed_nodes=", ".join(violation.failed_nodes), node=violation.node, resource=violation.resource, load=violation.load, capacity=violation.capacity
+        )
+        lines.append([
+            violation.node_group,
+            ", ".join(failed_node.split(".")[0] for failed_node in violation.failed_nodes),
+            violation.node.split(".")[0],
+            violation.resource,
+            "{} ({}%)".format(violation.load, int(violation.load / violation.capacity * 100) if violation.capacity else "-"),
+            violation.capacity
+        ])
+    reporter.summary(
+        "redundancy", "Found {count} N+{failures} redundancy violations", count=len(violations), failures=args.failures, ok=not violations
+    )
+    if violations:
+        print()
+        print(tabulate(lines, headers="firstrow", tablefmt="github"))
+        print()
+        exit(1)
+
+elif args.mode == "allocate":
+    from ganeti_parser.allocation import parse_ispec, simulate_allocations
+
+    ispec = parse_ispec(args.ispec) if args.ispec else None
+    results = simulate_allocations(cluster, ispec=ispec, disk_template=args.disk_template, max_instances=args.max_instances)
+    lines = [["Node-Group", "Memory", "vCPUs", "Disk", "Spindles", "Disk template", "Allocatable instances", "Limited by"]]
+    for result in results:
+        memory_size, vcpus, disk_size, spindles = result.ispec
+        reporter.decision(
+            "allocation", "{node_group}: {allocated} more instances fit", node_group=result.node_group, allocated=result.allocated,
+            memory=memory_size, vcpus=vcpus, disk=disk_size, spindles=spindles, disk_template=result.disk_template,
+            limiting_resource=result.limiting_resource, primaries=result.primaries
+        )
+        lines.append([
+            result.node_group,
+            "{}MB".format(memory_size),
+            vcpus,
+            "{}MB".format(disk_size),
+            spindles,
+            result.disk_template,
+            result.allocated,
+            result.limiting_resource if result.limiting_resource else "--max-instances"
+        ])
+    print()
+    print(tabulate(lines, headers="firstrow", tablefmt="github"))
+    print()
+
+elif args.mode == "expand":
+    from ganeti_parser.allocation import parse_ispec
+    from ganeti_parser.expansion import DEFAULT_MAX_NEW_NODES, get_group_node_profile, parse_node_profile, plan_node_additions
+
+    if not args.node and not args.ispec:
+        print()
+        print("Error: Please specify nodes to remove (--node) and/or instances to allocate (--ispec and --max-instances)")
+        exit(1)
+    if args.ispec and not args.max_instances:
+        print()
+        print("Error: Please specify the number of instances to allocate with --max-instances")
+        exit(1)
+
+    node_names = args.node.split(",") if args.node else []
+    ispec = parse_ispec(args.ispec) if args.ispec else None
+    max_new_nodes = args.max_new_nodes if args.max_new_nodes is not None else DEFAULT_MAX_NEW_NODES
+    if node_names:
+        # the nodes to remove decide about the node group
+        node_group_uuids = {cluster.get_node_by_name(node_name).group_uuid for node_name in node_names}
+        if len(node_group_uuids) > 1:
+            print()
+            print("Error: The nodes to remove have to be in the same node group")
+            exit(1)
+        node_groups = [cluster.node_groups_by_uuid[node_group_uuids.pop()]]
+    else:
+        node_groups = [node_group for node_group in cluster.node_groups if cluster.get_nodes_by_group(node_group)]
+
+    goals = []
+    if node_names:
+        goals.append("remove {}".format(", ".join(node_name.split(".")[0] for node_name in node_names)))
+    if ispec:
+        goals.append("allocate {} x {}MB/{} vCPUs/{}MB".format(args.max_instances, ispec[0], ispec[1], ispec[2]))
+
+    # new nodes do not take over any of the existing instances, so they can not fix violations which exist already
+    lines = [["Node-Group", "Goal", "Node profile", "Nodes to add", "Probes", "Existing N+{} violations (ignored)".format(args.failures)]]
+    for node_group in node_groups:
+        profile = parse_node_profile(args.node_profile) if args.node_profile else get_group_node_profile(cluster, node_group)
+        result = plan_node_additions(
+            cluster, node_group, profile, node_names=node_names, ispec=ispec, disk_template=args.disk_template,
+            instances=args.max_instances, failures=args.failures, max_new_nodes=max_new_nodes
+        )
+        reporter.summary(
+            "expansion", "{node_group}: {nodes} nodes have to be added", node_group=result.node_group,
+            nodes=result.nodes_needed if result.nodes_needed is not None else "more than {}".format(max_new_nodes),
+            profile=result.profile, probes=result.probes, violations_before=result.violations_before, ok=result.nodes_needed is not None
+        )
+        if result.violations_before:
+            reporter.summary(
+                "ignored_violations", "{node_group}: {violations} existing N+{failures} violations are ignored, adding nodes does not fix them (see --mode verify-n1)",
+                node_group=result.node_group, violations=result.violations_before, failures=args.failures, ok=False
+            )
+        memory, disk, cpus, spindles = result.profile
+        lines.append([
+            result.node_group,
+            "; ".join(goals),
+            "{}MB/{}MB/{} CPUs/{} spindles".format(memory, disk, cpus, spindles),
+            result.nodes_needed if result.nodes_needed is not None else "> {}".format(max_new_nodes),
+            result.probes,
+            result.violations_before
+        ])
+    print()
+    print(tabulate(lines, headers="firstrow", tablefmt="github"))
+    print()
+
+elif args.mode == "rebalance":
+    from ganeti_parser.rebalance import plan_rebalance
+
+    # optionally rebalance what is left after removing some nodes
+    if args.node:
+        node_names = args.node.split(",")
+        try:
+            cluster.remove_nodes(node_names)
+            reporter.summary("removed", "Successfully removed {nodes} from cluster", nodes=", ".join(node_names), ok=True)
+        except:
+            reporter.summary("removed", "Failed to remove {nodes}", nodes=", ".join(node_names), ok=False)
+            exit(1)
+
+    lines = [["Node-Group", "#", "Instance", "Move", "Primary", "Secondary", "Score before", "Score after", "Commands"]]
+    for node_group in cluster.node_groups:
+        initial_score, moves = plan_rebalance(cluster, node_group, max_moves=args.max_moves)
+        reporter.summary(
+            "rebalance", "{node_group}: {count} moves improve the score from {before:.4f} to {after:.4f}", node_group=node_group.name,
+            count=len(moves), before=initial_score, after=moves[-1].score_after if moves else initial_score
+        )
+        for number, move in enumerate(moves, 1):
+            reporter.decision(
+                "move", "  {instance}: {kind} ({old_pnode}:{old_snode} -> {new_pnode}:{new_snode})", node_group=move.node_group,
+                instance=move.instance, kind=move.kind, old_pnode=move.old_pnode, old_snode=move.old_snode, new_pnode=move.new_pnode,
+                new_snode=move.new_snode, score_before=move.score_before, score_after=move.score_after, commands=move.commands()
+            )
+            lines.append([
+                move.node_group,
+                number,
+                move.instance,
+                move.kind,
+                "{} -> {}".format(move.old_pnode.split(".")[0], move.new_pnode.split(".")[0]) if move.old_pnode != move.new_pnode else move.new_pnode.split(".")[0],
+                "{} -> {}".format(move.old_snode.split(".")[0], move.new_snode.split(".")[0]) if move.old_snode != move.new_snode else move.new_snode.split(".")[0],
+                "{:.4f}".format(move.score_before),
+                "{:.4f}".format(move.score_after),
+                "; ".join(move.commands())
+            ])
+    print()
+    print(tabulate(lines, headers="firstrow", tablefmt="github"))
+    print()
+    cluster.dump_cluster()
+
+elif args.mode == "scenarios":
+    from ganeti_parser.scenario import load_scenarios, run_scenarios
+
+    if not args.scenarios:
+        print()
+        print("Error: Please specify the scenario file")
+        exit(1)
+
+    results = run_scenarios(cluster, load_scenarios(args.scenarios), processes=args.processes)
+    lines = [["Scenario", "Result", "Failovers", "N+1 violations", "First failing instance"]]
+    for result in results:
+        reporter.decision(
+            "scenario", "Scenario {scenario}: {status}", scenario=result.name, status="ok" if result.success else "failed", ok=result.success,
+            failovers=result.failovers, violations=result.violations, failed_instance=result.failed_instance, error=result.error
+        )
+        lines.append([
+            result.name,
+            "ok" if result.success else "failed",
+            result.failovers if result.success else "",
+            result.violations if result.success else "",
+            result.failed_instance if result.failed_instance else (result.error or "")
+        ])
+    print()
+    print(tabulate(lines, headers="firstrow", tablefmt="github"))
+    print()
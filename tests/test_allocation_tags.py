@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from ganeti_parser.GanetiInstance import GanetiInstance
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.generator import generate_datafile
+from ganeti_parser.parser import parse_datafile
+
+START = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "start.py")
+
+# every node runs an instance tagged "a:web", so node1 can only be removed if "a" is no exclusion tag prefix
+DATAFILE = """default|00000000-0000-4000-8000-000000000000|preferred||
+
+node1.example.com|36864|4096|32768|1048576|1048576|32|N|00000000-0000-4000-8000-000000000000|12||N|12|32|1.0
+node2.example.com|36864|4096|32768|1048576|1048576|32|N|00000000-0000-4000-8000-000000000000|12||N|12|32|1.0
+node3.example.com|36864|4096|32768|1048576|1048576|32|N|00000000-0000-4000-8000-000000000000|12||N|12|32|1.0
+
+instance1.example.com|4096|10240|2|running|Y|node1.example.com||plain|a:web|1|-|N
+instance2.example.com|4096|10240|2|running|Y|node2.example.com||plain|a:web,b:db|1|-|N
+instance3.example.com|4096|10240|2|running|Y|node3.example.com||plain|a:web|1|-|N
+
+{tags}
+|128,1,1024,1,1,1|128,1,1024,1,1,1;32768,8,1048576,16,8,12|drbd,plain|4.0|32.0
+default|128,1,1024,1,1,1|128,1,1024,1,1,1;32768,8,1048576,16,8,12|drbd,plain|4.0|32.0
+"""
+
+
+class AllocationTagsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.reporter = GanetiReporter(level=GanetiReporter.SILENT)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def datafile(self, cluster_tags: list = None) -> str:
+        filename = os.path.join(self.directory.name, "LOCAL.data")
+        with open(filename, "w") as file:
+            file.write(DATAFILE.format(tags="".join(tag + "\n" for tag in cluster_tags or [])))
+        return filename
+
+    def instance(self, tags: list) -> GanetiInstance:
+        return GanetiInstance("new.example.com", 1024, 1024, 1, "running", "Y", "", "", "plain", tags, 1, "-", "N")
+
+    def allowed(self, cluster, tags: list) -> list:
+        return [node.name.split(".")[0] for node in cluster.nodes if cluster._node_has_no_conflicting_migration_tags(node, self.instance(tags))]
+
+    def test_tag_index_counts_the_primary_instances(self):
+        filename = os.path.join(self.directory.name, "GENERATED.data")
+        generate_datafile(filename, nodes_per_group=5, instances_per_node=6, tag_ratio=0.8, seed=9)
+        cluster = parse_datafile(filename, reporter=self.reporter)
+
+        def expected():
+            tags_by_node = {}
+            for instance in cluster.instances:
+                for tag in instance.tags:
+                    if tag:
+                        node_tags = tags_by_node.setdefault(instance.pnode, {})
+                        node_tags[tag] = node_tags.get(tag, 0) + 1
+            return tags_by_node
+
+        def actual():
+            return {node_name: tags for node_name, tags in cluster.tags_by_node.items() if tags}
+
+        self.assertEqual(actual(), expected())
+        cluster.begin()
+        node_names = [node.name for node in cluster.nodes]
+        for number, instance in enumerate(cluster.instances[::3]):
+            pnode, snode = node_names[number % 5], node_names[(number + 1) % 5]
+            cluster._set_instance_nodes(instance, pnode, snode if instance.snodes else "")
+        self.assertEqual(actual(), expected())
+        cluster.rollback()
+        self.assertEqual(actual(), expected())
+
+    def test_exclusion_prefixes(self):
+        cluster = parse_datafile(self.datafile(), reporter=self.reporter)
+        # without htools:iextags:* cluster tags "a" is assumed
+        self.assertEqual(cluster.allocation_tags, ["a"])
+        self.assertEqual(self.allowed(cluster, ["a:web"]), [])
+        self.assertEqual(self.allowed(cluster, ["a:mail", "b:db"]), ["node1", "node2", "node3"])
+        # prefixes have to match up to the colon
+        self.assertEqual(self.allowed(cluster, ["ab:web"]), ["node1", "node2", "node3"])
+
+        cluster.set_allocation_tags(["a", "b"])
+        self.assertEqual(self.allowed(cluster, ["b:db"]), ["node1", "node3"])
+        cluster.set_allocation_tags(["b"])
+        self.assertEqual(self.allowed(cluster, ["a:web"]), ["node1", "node2", "node3"])
+        # no prefixes at all: nothing is excluded
+        cluster.set_allocation_tags([])
+        self.assertEqual(self.allowed(cluster, ["a:web", "b:db"]), ["node1", "node2", "node3"])
+
+    def test_exclusion_prefixes_from_cluster_tags(self):
+        cluster = parse_datafile(self.datafile(["htools:iextags:b", "other"]), reporter=self.reporter)
+        self.assertEqual(cluster.allocation_tags, ["b"])
+        self.assertEqual(self.allowed(cluster, ["a:web", "b:db"]), ["node1", "node3"])
+
+    def test_allocation_tags_option(self):
+        filename = self.datafile()
+        for option, removed in ((None, False), ("a", False), ("", True), ("b", True), ("b,,a", False)):
+            with self.subTest(allocation_tags=option):
+                command = [sys.executable, START, filename, "--mode", "remove", "--node", "node1.example.com", "--no-cache", "--verbosity", "summary"]
+                if option is not None:
+                    command.append("--allocation-tags={}".format(option))
+                result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+                self.assertEqual("Successfully removed node1.example.com" in result.stdout, removed)
+                self.assertEqual("Failed to remove node1.example.com" in result.stdout, not removed)
+
+
+if __name__ == "__main__":
+    unittest.main()
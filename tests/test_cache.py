@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from ganeti_parser import cache
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.generator import generate_datafile
+from ganeti_parser.parser import parse_datafile
+
+
+class DatafileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+        self.filename = os.path.join(self.directory.name, "LOCAL.data")
+        generate_datafile(self.filename, nodes_per_group=5, instances_per_node=4, disk_templates=["drbd", "plain", "rbd"], tag_ratio=0.5, seed=4)
+        self.reporter = GanetiReporter(level=GanetiReporter.SILENT)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self):
+        return cache.load_datafile(self.filename, reporter=self.reporter, cache_dir=self.cache_dir)
+
+    def cache_files(self) -> list:
+        return sorted(os.listdir(self.cache_dir))
+
+    # everything the parser builds, in a comparable form
+    def state(self, cluster) -> dict:
+        return {
+            "allocation_tags": cluster.allocation_tags,
+            "tags": cluster.tags,
+            "node_groups": [[getattr(node_group, column) for column in cache.NODE_GROUP_COLUMNS] for node_group in cluster.node_groups],
+            "nodes": [[getattr(node, column) for column in cache.NODE_COLUMNS] for node in cluster.nodes],
+            "instances": [[getattr(instance, column) for column in cache.INSTANCE_COLUMNS] for instance in cluster.instances],
+            "policies": [[getattr(policy, column) for column in cache.POLICY_COLUMNS] for policy in cluster.policies],
+            "ledger": {
+                node_name: [getattr(ledger, column) for column in cache.LEDGER_COLUMNS + cache.LEDGER_FAILOVER_COLUMNS]
+                for node_name, ledger in cluster.ledger.items()
+            },
+            "positions": dict(cluster._instance_positions),
+            "by_pnode": {key: [instance.name for instance in value] for key, value in cluster.instances_by_pnode.items()},
+            "by_snode": {key: [instance.name for instance in value] for key, value in cluster.instances_by_snode.items()},
+            "tags_by_node": cluster.tags_by_node,
+            "nodes_by_name": {key: node.name for key, node in cluster.nodes_by_name.items()},
+        }
+
+    def test_cached_state_matches_a_fresh_parse(self):
+        expected = self.state(parse_datafile(self.filename, reporter=self.reporter))
+        self.assertEqual(self.state(self.load()), expected)
+        self.assertEqual(len(self.cache_files()), 1)
+        # the second load must come from the cache
+        with mock.patch.object(cache, "parse_datafile", side_effect=AssertionError("data file parsed again")):
+            cluster = self.load()
+        self.assertEqual(self.state(cluster), expected)
+
+    def test_new_cache_format_version_invalidates(self):
+        self.load()
+        files = self.cache_files()
+        with mock.patch.object(cache, "CACHE_FORMAT_VERSION", cache.CACHE_FORMAT_VERSION + 1):
+            with mock.patch.object(cache, "parse_datafile", wraps=cache.parse_datafile) as parse:
+                self.load()
+        parse.assert_called_once()
+        self.assertEqual(len(self.cache_files()), 2)
+        self.assertNotEqual(self.cache_files(), files)
+
+    def test_changed_file_invalidates(self):
+        self.load()
+        generate_datafile(self.filename, nodes_per_group=5, instances_per_node=4, disk_templates=["drbd", "plain", "rbd"], tag_ratio=0.5, seed=5)
+        expected = self.state(parse_datafile(self.filename, reporter=self.reporter))
+        with mock.patch.object(cache, "parse_datafile", wraps=cache.parse_datafile) as parse:
+            cluster = self.load()
+        parse.assert_called_once()
+        self.assertEqual(self.state(cluster), expected)
+        self.assertEqual(len(self.cache_files()), 2)
+
+    def test_broken_cache_file_is_parsed_again(self):
+        self.load()
+        path = os.path.join(self.cache_dir, self.cache_files()[0])
+        with open(path, "wb") as file:
+            file.write(b"broken")
+        expected = self.state(parse_datafile(self.filename, reporter=self.reporter))
+        self.assertEqual(self.state(self.load()), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
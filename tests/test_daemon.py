@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+import json
+import os
+import tempfile
+import threading
+import unittest
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.daemon import GanetiClusterDaemon, _HTTPServer, _RequestHandler
+from ganeti_parser.generator import generate_datafile
+
+
+class GanetiClusterDaemonQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        filename = os.path.join(self.directory.name, "LOCAL.data")
+        generate_datafile(filename, nodes_per_group=4, instances_per_node=4)
+        self.server = _HTTPServer(("127.0.0.1", 0), _RequestHandler)
+        self.server.daemon = GanetiClusterDaemon(filename, reporter=GanetiReporter(level=GanetiReporter.SILENT))
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05})
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    # status code and decoded JSON body of a query
+    def query(self, path: str):
+        url = "http://127.0.0.1:{}{}".format(self.server.server_address[1], path)
+        try:
+            with urlopen(url) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_status(self):
+        status, body = self.query("/status")
+        self.assertEqual(status, 200)
+        self.assertEqual(body["nodes"], 4)
+
+    def test_bad_queries_are_client_errors(self):
+        for path in (
+            "/allocate?ispec=8192,four,102400",
+            "/allocate?ispec=8192,4",
+            "/allocate?max_instances=many",
+            "/dump?format=xml",
+            "/remove?nodes=node-00-0000.example.com&format=table",
+            "/remove",
+            "/remove?nodes=no-such-node.example.com",
+        ):
+            with self.subTest(path=path):
+                status, body = self.query(path)
+                self.assertEqual(status, 400)
+                self.assertTrue(body["error"])
+
+    def test_valid_allocation(self):
+        status, body = self.query("/allocate?ispec=8192,4,102400&max_instances=2")
+        self.assertEqual(status, 200)
+        self.assertEqual(body[0]["allocated"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
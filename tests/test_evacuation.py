@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+import os
+import tempfile
+import unittest
+
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.evacuation import plan_evacuation
+from ganeti_parser.generator import generate_datafile
+from ganeti_parser.parser import parse_datafile
+
+
+class PlanEvacuationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        filename = os.path.join(self.directory.name, "LOCAL.data")
+        generate_datafile(filename, nodes_per_group=4, instances_per_node=8, disk_templates=["drbd", "rbd"], seed=5)
+        self.cluster = parse_datafile(filename, reporter=GanetiReporter(level=GanetiReporter.SILENT))
+        self.node_name = self.cluster.nodes[0].name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # instances on shared storage do not use any disk space of the node, whatever their disk size
+    def test_disk_orders_use_the_local_disk_size(self):
+        instances = plan_evacuation(self.cluster, self.node_name, "disk")
+        self.assertTrue(any(not instance.is_mirrored() and instance.disk_size for instance in instances))
+        sizes = [instance.local_disk_size() for instance in instances]
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+
+        node_group = self.cluster.node_groups[0]
+        totals = [sum(values) for values in zip(*(self.cluster._get_node_capacity(node) for node in self.cluster.get_nodes_by_group(node_group)))]
+        shares = [
+            max(needed / total for needed, total in zip((instance.memory_size, instance.local_disk_size(), instance.vcpus, instance.spindles), totals))
+            for instance in plan_evacuation(self.cluster, self.node_name, "dominant")
+        ]
+        self.assertEqual(shares, sorted(shares, reverse=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+import os
+import tempfile
+import unittest
+
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.expansion import get_group_node_profile, plan_node_additions
+from ganeti_parser.generator import generate_datafile
+from ganeti_parser.parser import parse_datafile
+from ganeti_parser.redundancy import verify_group_redundancy
+
+
+class PlanNodeAdditionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        filename = os.path.join(self.directory.name, "LOCAL.data")
+        # at 80% fill several nodes can already not take over the instances of a failed node
+        generate_datafile(filename, fill=0.8)
+        self.cluster = parse_datafile(filename, reporter=GanetiReporter(level=GanetiReporter.SILENT))
+        self.node_group = self.cluster.node_groups[0]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_removal_with_existing_violation_on_a_secondary(self):
+        node_name = "node-00-0000.example.com"
+        violating_nodes = {violation.node for violation in verify_group_redundancy(self.cluster, self.node_group)}
+        secondaries = {instance.snodes for instance in self.cluster.instances_by_pnode[node_name]}
+        self.assertTrue(secondaries & violating_nodes)
+
+        result = plan_node_additions(
+            self.cluster, self.node_group, get_group_node_profile(self.cluster, self.node_group), node_names=[node_name]
+        )
+        self.assertEqual(result.nodes_needed, 1)
+        # the probes are rolled back
+        self.assertIn(node_name, self.cluster.nodes_by_name)
+        self.assertFalse(self.cluster.keep_redundancy)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from ganeti_parser.fleet import analyse_fleet, get_cluster_names, get_fleet_rows, write_fleet_json
+from ganeti_parser.generator import generate_datafile
+
+
+class FleetClusterNamesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # a LOCAL.data file (as written by `hscan -L`) in its own directory per cluster
+    def datafile(self, cluster: str, seed: int = None) -> str:
+        os.mkdir(os.path.join(self.directory.name, cluster))
+        filename = os.path.join(self.directory.name, cluster, "LOCAL.data")
+        if seed is None:
+            with open(filename, "w") as file:
+                file.write("broken\n")
+        else:
+            generate_datafile(filename, nodes_per_group=4, instances_per_node=4, seed=seed)
+        return filename
+
+    def test_flat_directory_keeps_file_names(self):
+        self.assertEqual(get_cluster_names(["/data/one.data", "/data/two.data"]), ["one.data", "two.data"])
+        self.assertEqual(get_cluster_names(["/data/one.data"]), ["one.data"])
+
+    def test_same_file_names_in_different_directories(self):
+        filenames = [self.datafile("alpha", 1), self.datafile("beta", 2), self.datafile("gamma"), self.datafile("delta")]
+        clusters = analyse_fleet(filenames, processes=1, use_cache=False)
+        names = [cluster.name for cluster in clusters]
+        self.assertEqual(names, [os.path.join(cluster, "LOCAL.data") for cluster in ("alpha", "beta", "gamma", "delta")])
+
+        rows = get_fleet_rows(clusters)
+        self.assertEqual({row[1] for row in rows if row[0] == "cluster"}, set(names[:2]))
+
+        stream = io.StringIO()
+        write_fleet_json(stream, rows, clusters)
+        self.assertEqual(set(json.loads(stream.getvalue())["errors"]), set(names[2:]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+import os
+import tempfile
+import unittest
+
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.generator import generate_datafile
+from ganeti_parser.parser import parse_datafile
+
+
+class GanetiNodeLedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        filename = os.path.join(self.directory.name, "LOCAL.data")
+        generate_datafile(filename, nodes_per_group=6, instances_per_node=6, disk_templates=["drbd", "plain", "rbd"], seed=11)
+        self.cluster = parse_datafile(filename, reporter=GanetiReporter(level=GanetiReporter.SILENT))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # the ledger of every node, recomputed from the instance list (failover entries which dropped to 0 are left out)
+    def expected_ledgers(self) -> dict:
+        ledgers = {node.name: [0] * 10 + [{}, {}, {}] for node in self.cluster.nodes}
+        for instance in self.cluster.instances:
+            demand = (1, instance.memory_size, instance.local_disk_size(), instance.vcpus, instance.spindles)
+            for offset, node_name in ((0, instance.pnode), (5, instance.snodes)):
+                if node_name:
+                    for resource, value in enumerate(demand):
+                        ledgers[node_name][offset + resource] += value
+            if instance.snodes:
+                for failover, value in zip(ledgers[instance.snodes][10:], (instance.memory_size, instance.vcpus, instance.spindles)):
+                    failover[instance.pnode] = failover.get(instance.pnode, 0) + value
+        return ledgers
+
+    def actual_ledgers(self) -> dict:
+        ledgers = {}
+        for node in self.cluster.nodes:
+            ledger = self.cluster._get_ledger(node.name)
+            ledgers[node.name] = [
+                ledger.primary_instances, ledger.primary_memory, ledger.primary_disk, ledger.primary_vcpus, ledger.primary_spindles,
+                ledger.secondary_instances, ledger.secondary_memory, ledger.secondary_disk, ledger.secondary_vcpus, ledger.secondary_spindles,
+            ] + [
+                {node_name: value for node_name, value in failover.items() if value}
+                for failover in (ledger.failover_memory, ledger.failover_vcpus, ledger.failover_spindles)
+            ]
+        return ledgers
+
+    def assert_ledgers(self):
+        self.assertEqual(self.actual_ledgers(), self.expected_ledgers())
+
+    def test_totals_after_parsing(self):
+        self.assert_ledgers()
+        # shared storage does not use disk space of the nodes
+        ledger_disk = sum(self.cluster._get_ledger(node.name).used_disk() for node in self.cluster.nodes)
+        raw_disk = sum(instance.disk_size * (2 if instance.snodes else 1) for instance in self.cluster.instances)
+        self.assertLess(ledger_disk, raw_disk)
+
+    def test_totals_after_placement_and_removal(self):
+        node_names = [node.name for node in self.cluster.nodes]
+        self.cluster.begin()
+        self.cluster.add_instance(
+            "new.example.com", 1024, 10240, 2, "running", "Y", node_names[0], node_names[1], "drbd", [], 1, "-", "N"
+        )
+        self.assert_ledgers()
+        self.cluster.remove_node(node_names[2])
+        self.assertNotIn(node_names[2], self.cluster.nodes_by_name)
+        self.assertFalse(self.cluster.instances_by_pnode.get(node_names[2]))
+        self.assert_ledgers()
+        self.cluster.rollback()
+        self.assert_ledgers()
+        self.assertNotIn("new.example.com", self.cluster._instance_positions)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+import os
+import random
+import tempfile
+import unittest
+
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.generator import generate_datafile
+from ganeti_parser.parser import parse_datafile
+from ganeti_parser.placement import PLACEMENT_STRATEGIES, FirstFitPlacement
+
+
+class KeyedPlacementIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        filename = os.path.join(self.directory.name, "LOCAL.data")
+        generate_datafile(filename, nodes_per_group=8, instances_per_node=6, disk_templates=["drbd", "plain"], seed=3)
+        self.cluster = parse_datafile(filename, reporter=GanetiReporter(level=GanetiReporter.SILENT))
+        self.node_group = self.cluster.node_groups[0]
+        # nodes with another capacity than the generated ones
+        for number in range(2):
+            self.cluster.add_node(
+                "big-{}.example.com".format(number), 512 * 1024, 0, 512 * 1024, 8 * 1024 * 1024, 8 * 1024 * 1024, 64, "N",
+                self.node_group.uuid, 4, [], "N", 4, 64, "1.0"
+            )
+        self.random = random.Random(7)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # all eligible nodes sorted by the strategy's key (ties by position), like a search without an index
+    def expected_candidates(self, instance, primary, excluded):
+        nodes = [
+            node for node in self.cluster._get_eligible_nodes(self.node_group, instance.disk_template)
+            if node.name not in excluded and node.name not in self.cluster._draining
+        ]
+        keys = [self.cluster.placement.key(*self.cluster._get_node_utilization(node, instance, primary)) for node in nodes]
+        return [node.name for _, _, node in sorted(zip(keys, range(len(nodes)), nodes), key=lambda entry: entry[:2])]
+
+    def assert_candidates(self):
+        for instance in self.cluster.instances[::5]:
+            for primary in (True, False):
+                excluded = {instance.pnode, instance.snodes} if instance.snodes else {instance.pnode}
+                candidates = self.cluster.placement.candidates(self.cluster, self.node_group, instance, primary, excluded)
+                self.assertEqual([node.name for node in candidates], self.expected_candidates(instance, primary, excluded))
+
+    def move_instances(self, count):
+        node_names = [node.name for node in self.cluster.get_nodes_by_group(self.node_group)]
+        for instance in self.random.sample(self.cluster.instances, count):
+            pnode, snode = self.random.sample(node_names, 2)
+            self.cluster._set_instance_nodes(instance, pnode, snode if instance.snodes else "")
+
+    def test_index_follows_the_ledger(self):
+        for name, strategy in PLACEMENT_STRATEGIES.items():
+            if strategy is FirstFitPlacement:
+                continue
+            with self.subTest(placement=name):
+                self.cluster.placement = strategy()
+                self.assert_candidates()
+                self.cluster.begin()
+                self.move_instances(10)
+                self.assert_candidates()
+
+                self.cluster.begin()
+                self.move_instances(10)
+                self.cluster.remove_node("big-0.example.com")
+                self.cluster.update_policy("", vcpu_ratio=1.0)
+                self.assert_candidates()
+                self.cluster.rollback()
+                self.assert_candidates()
+
+                self.cluster.rollback()
+                self.assert_candidates()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+import os
+import tempfile
+import unittest
+
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.generator import generate_datafile
+from ganeti_parser.parser import parse_datafile
+from ganeti_parser.rebalance import plan_rebalance
+
+
+class PlanRebalanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        filename = os.path.join(self.directory.name, "LOCAL.data")
+        generate_datafile(filename, nodes_per_group=4, instances_per_node=4)
+        self.cluster = parse_datafile(filename, reporter=GanetiReporter(level=GanetiReporter.SILENT))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_group_without_nodes(self):
+        self.cluster.add_node_group("empty", "00000000-0000-4000-8000-999999999999", "preferred", [], [])
+        self.assertEqual(plan_rebalance(self.cluster, self.cluster.node_groups[-1]), (0.0, []))
+
+    def test_group_with_all_nodes_draining(self):
+        node_group = self.cluster.node_groups[0]
+        self.cluster._draining = {node.name for node in self.cluster.get_nodes_by_group(node_group)}
+        self.assertEqual(plan_rebalance(self.cluster, node_group), (0.0, []))
+
+    def test_moves_improve_the_score(self):
+        self.cluster.begin()
+        initial_score, moves = plan_rebalance(self.cluster, self.cluster.node_groups[0], max_moves=5)
+        self.cluster.rollback()
+        self.assertTrue(moves)
+        self.assertEqual(moves[0].score_before, initial_score)
+        for move in moves:
+            self.assertLess(move.score_after, move.score_before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.parser import parse_datafile
+from ganeti_parser.redundancy import verify_redundancy
+
+START = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "start.py")
+
+# three nodes with 32768MB usable memory each (the parser reserves 4096MB):
+# - node1 fails: node2 has to run 16384MB + 20480MB (violation), node3 8192MB + 20480MB
+# - node2 fails: node3 has to run 8192MB + 16384MB
+# - node1 and node2 fail: node3 has to run 8192MB + 20480MB + 16384MB (violation)
+# - node3 fails: nothing to take over, instance4 is not mirrored
+DATAFILE = """default|00000000-0000-4000-8000-000000000000|preferred||
+
+node1.example.com|36864|4096|32768|1048576|1048576|32|N|00000000-0000-4000-8000-000000000000|12||N|12|32|1.0
+node2.example.com|36864|4096|32768|1048576|1048576|32|N|00000000-0000-4000-8000-000000000000|12||N|12|32|1.0
+node3.example.com|36864|4096|32768|1048576|1048576|32|N|00000000-0000-4000-8000-000000000000|12||N|12|32|1.0
+
+instance1.example.com|20480|10240|2|running|Y|node1.example.com|node3.example.com|drbd||1|-|N
+instance2.example.com|16384|10240|2|running|Y|node2.example.com|node3.example.com|drbd||1|-|N
+instance3.example.com|20480|10240|2|running|Y|node1.example.com|node2.example.com|drbd||1|-|N
+instance4.example.com|8192|10240|2|running|Y|node3.example.com||plain||1|-|N
+
+
+|128,1,1024,1,1,1|128,1,1024,1,1,1;32768,8,1048576,16,8,12|drbd,plain|4.0|32.0
+default|128,1,1024,1,1,1|128,1,1024,1,1,1;32768,8,1048576,16,8,12|drbd,plain|4.0|32.0
+"""
+
+
+class VerifyRedundancyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "LOCAL.data")
+        with open(self.filename, "w") as file:
+            file.write(DATAFILE)
+        self.cluster = parse_datafile(self.filename, reporter=GanetiReporter(level=GanetiReporter.SILENT))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def violations(self, failures: int) -> list:
+        return [
+            (violation.node_group, violation.failed_nodes, violation.node, violation.resource, violation.load, violation.capacity)
+            for violation in verify_redundancy(self.cluster, failures)
+        ]
+
+    def test_single_failures(self):
+        self.assertEqual(self.violations(1), [
+            ("default", ("node1.example.com",), "node2.example.com", "memory", 36864, 32768),
+        ])
+
+    def test_double_failures_report_minimal_sets_only(self):
+        self.assertEqual(self.violations(2), [
+            ("default", ("node1.example.com",), "node2.example.com", "memory", 36864, 32768),
+            ("default", ("node1.example.com", "node2.example.com"), "node3.example.com", "memory", 45056, 32768),
+        ])
+
+    def test_no_violations_without_the_secondary(self):
+        self.cluster._set_instance_nodes(self.cluster.instances[2], "node1.example.com", "")
+        self.assertEqual(self.violations(1), [])
+        self.assertEqual(len(self.violations(2)), 1)
+
+    def test_verify_n1_mode(self):
+        result = subprocess.run(
+            [sys.executable, START, self.filename, "--mode", "verify-n1", "--no-cache", "--verbosity", "silent"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        )
+        self.assertEqual(result.returncode, 1)
+        rows = [[cell.strip() for cell in line.strip("|").split("|")] for line in result.stdout.splitlines() if line.startswith("| default")]
+        self.assertEqual(rows, [["default", "node1", "node2", "memory", "36864 (112%)", "32768"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+import os
+import tempfile
+import unittest
+
+from ganeti_parser.GanetiReporter import GanetiReporter
+from ganeti_parser.generator import generate_datafile
+from ganeti_parser.parser import parse_datafile
+
+
+class GanetiClusterTransactionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        filename = os.path.join(self.directory.name, "LOCAL.data")
+        generate_datafile(filename, groups=2, nodes_per_group=5, instances_per_node=4, tag_ratio=0.5, fill=0.3, seed=2)
+        self.cluster = parse_datafile(filename, reporter=GanetiReporter(level=GanetiReporter.SILENT))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # everything a change can touch, in a comparable form (orders included)
+    def state(self) -> dict:
+        cluster = self.cluster
+        ledgers = {}
+        for node_name, ledger in cluster.ledger.items():
+            ledgers[node_name] = (
+                ledger.primary_instances, ledger.secondary_instances, ledger.primary_memory, ledger.primary_disk,
+                ledger.secondary_disk, ledger.primary_vcpus, ledger.secondary_vcpus, ledger.primary_spindles, ledger.secondary_spindles,
+                {key: value for key, value in ledger.failover_memory.items() if value}
+            )
+        return {
+            "nodes": [node.name for node in cluster.nodes],
+            "nodes_by_group": {uuid: [node.name for node in nodes] for uuid, nodes in cluster.nodes_by_group.items()},
+            "nodes_by_name": {key: node.name for key, node in cluster.nodes_by_name.items()},
+            "instances": [(instance.name, instance.pnode, instance.snodes) for instance in cluster.instances],
+            "positions": dict(cluster._instance_positions),
+            "by_pnode": {key: [instance.name for instance in value] for key, value in cluster.instances_by_pnode.items() if value},
+            "by_snode": {key: [instance.name for instance in value] for key, value in cluster.instances_by_snode.items() if value},
+            "tags": {key: dict(value) for key, value in cluster.tags_by_node.items() if value},
+            "policies": [(policy.owner, policy.vcpu_ratio, policy.spindle_ratio) for policy in cluster.policies],
+            "ledgers": {key: value for key, value in ledgers.items() if any(value)},
+        }
+
+    def change(self, suffix: str):
+        node_group = self.cluster.node_groups[1]
+        self.cluster.add_empty_node("added-{}.example.com".format(suffix), node_group, 262144, 4194304, 32, 12)
+        node_names = [node.name for node in self.cluster.get_nodes_by_group(node_group)]
+        self.cluster.add_instance(
+            "added-{}.example.com".format(suffix), 2048, 20480, 2, "running", "Y", node_names[0], node_names[-1], "drbd",
+            ["a:service1"], 1, "-", "N"
+        )
+        self.cluster.update_policy(node_group.name, vcpu_ratio=8.0)
+        self.cluster.remove_node(node_names[1])
+
+    def test_nested_rollback_restores_the_state(self):
+        initial = self.state()
+        self.cluster.begin()
+        self.cluster.remove_node(self.cluster.nodes[0].name)
+        outer = self.state()
+        self.assertNotEqual(outer, initial)
+
+        self.cluster.begin()
+        self.change("inner")
+        self.assertNotEqual(self.state(), outer)
+        self.cluster.rollback()
+        self.assertEqual(self.state(), outer)
+
+        # changes committed by a nested transaction are still undone by the outer rollback
+        self.cluster.begin()
+        self.change("committed")
+        self.cluster.commit()
+        self.cluster.rollback()
+        self.assertEqual(self.state(), initial)
+        self.assertEqual(self.cluster._journal, [])
+
+    def test_commit_keeps_the_changes(self):
+        self.cluster.begin()
+        self.cluster.begin()
+        self.change("kept")
+        changed = self.state()
+        self.cluster.commit()
+        self.cluster.commit()
+        self.assertEqual(self.state(), changed)
+        self.assertEqual(self.cluster._journal, [])
+        self.assertIn("added-kept.example.com", self.cluster._instance_positions)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from ganeti_parser.generator import generate_datafile
+from ganeti_parser.trend import collect_trend, get_snapshot_timestamp
+
+
+class TrendSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def snapshot(self, name: str, mtime: float = None) -> str:
+        filename = os.path.join(self.directory.name, name)
+        generate_datafile(filename, nodes_per_group=3, instances_per_node=2)
+        if mtime is not None:
+            os.utime(filename, (mtime, mtime))
+        return filename
+
+    def test_timestamp_from_the_file_name(self):
+        # copied snapshots all have the same modification time
+        mtime = 1767225600
+        self.assertEqual(get_snapshot_timestamp(self.snapshot("2026-01-31.data", mtime)), "2026-01-31T00:00:00")
+        self.assertEqual(get_snapshot_timestamp(self.snapshot("LOCAL-20260131-0315.data", mtime)), "2026-01-31T03:15:00")
+        self.assertEqual(get_snapshot_timestamp(self.snapshot("cluster_2026-01-31T03:15:42.data", mtime)), "2026-01-31T03:15:42")
+
+    def test_timestamp_falls_back_to_the_modification_time(self):
+        for name in ("LOCAL.data", "LOCAL-20261399.data"):
+            filename = self.snapshot(name, 1767225600)
+            with self.subTest(name=name):
+                self.assertEqual(get_snapshot_timestamp(filename), get_snapshot_timestamp(self.snapshot("copy.data", 1767225600)))
+
+    def test_snapshots_are_not_cached(self):
+        filenames = [self.snapshot("2026-01-0{}.data".format(day)) for day in (1, 2)]
+        cache_home = os.path.join(self.directory.name, "cache")
+        with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": cache_home}):
+            node_rows, group_rows = collect_trend(filenames, processes=1)
+        self.assertEqual([row[1] for row in group_rows], ["2026-01-01T00:00:00", "2026-01-02T00:00:00"])
+        self.assertEqual(len(node_rows), 6)
+        self.assertFalse(os.path.exists(cache_home))
+
+
+if __name__ == "__main__":
+    unittest.main()